@@ -1,14 +1,29 @@
+# The Telegram and Agents SDKs are imported on first use (create_updater,
+# get_agent) so the bot starts quickly; most messages never need the agent.
+# PREWARM=1 loads them in the background right after startup.
+from __future__ import annotations
 import logging
-from telegram.ext import Updater, CommandHandler, MessageHandler, Filters
-from telegram import Update
-from agents import Agent, Runner, function_tool, RunContextWrapper
+import threading
+from typing import TYPE_CHECKING
 from typing_extensions import Any
 from dotenv import load_dotenv
 import os
 import datetime
-import gspread
-import re
-from oauth2client.service_account import ServiceAccountCredentials
+import time
+import asyncio
+import metrics
+from met_catalog import catalog, Workout, INTENSITY_WORDS
+from state_store import create_store, PendingWorkout
+import sheets_client
+from async_runtime import runtime, Coalescer
+from storage import storage
+import analytics
+from user_profiles import profiles
+import openai_pool
+
+if TYPE_CHECKING:
+    from telegram import Update
+    from agents import RunContextWrapper
 
 # In chat mode, GPT is using natural language understanding (NLU) 
 # and semantic similarity to interpret that "low" likely means "light" in the context of intensity.
@@ -22,40 +37,33 @@ from oauth2client.service_account import ServiceAccountCredentials
 # === SETUP ===
 load_dotenv()
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+PREWARM = os.getenv("PREWARM", "0") == "1"
+# Longer workouts are only logged after the user confirmed the duration (typos, "10000 steps")
+MAX_WORKOUT_MINUTES = int(os.getenv("MAX_WORKOUT_MINUTES", "600"))
+CONFIRM_WORDS = {"yes", "y", "yes please", "confirm", "ok"}
 api_key = os.getenv("OPENAI_API_KEY_HW")
 
-logging.basicConfig(level=logging.INFO)
-
 # === GOOGLE SHEETS SETUP ===
-def log_to_google_sheets(date, exercise_type, intensity, duration_minutes, calories):
-    # Authorize and log the entry to Google Sheets
-    scope = [
-        "https://spreadsheets.google.com/feeds",
-        "https://www.googleapis.com/auth/drive"
-    ]
-    creds = ServiceAccountCredentials.from_json_keyfile_name("modular-ethos-460803-c1-e860424b6219.json", scope)
-    client = gspread.authorize(creds)
-    sheet = client.open("Fitness_log").sheet1
-    sheet.append_row([date, exercise_type, intensity, duration_minutes, round(calories)])
-
-def get_daily_summary():
+# Location for json Google sheets
+secret_path = "modular-ethos-460803-c1-e860424b6219.json"
+
+def get_fitness_sheet():
+    # Shared, already-authorized worksheet handle (see sheets_client.py)
+    return sheets_client.get_worksheet(secret_path, "Fitness_log")
+
+# Sum the calories column per day and chat (see storage.py); column F holds
+# the chat id so every user's rows can be told apart, column G the entry id
+# that keeps re-sent rows from being appended twice
+storage.register("Fitness", get_fitness_sheet, {"calories": 4}, chat_column=5, id_column=6)
+
+def log_to_google_sheets(date, exercise_type, intensity, duration_minutes, calories, chat_id=""):
+    # Store the entry (locally first; Google Sheets is updated in the background)
+    storage.append("Fitness", [[date, exercise_type, intensity, duration_minutes, round(calories), str(chat_id)]])
+
+def get_daily_summary(chat_id):
     try:
         today = datetime.date.today().isoformat()
-        scope = [
-            "https://spreadsheets.google.com/feeds",
-            "https://www.googleapis.com/auth/drive"
-        ]
-        creds = ServiceAccountCredentials.from_json_keyfile_name("modular-ethos-460803-c1-e860424b6219.json", scope)
-        client = gspread.authorize(creds)
-        sheet = client.open("Fitness_log").sheet1
-        rows = sheet.get_all_values()
-        total = 0.0
-        for row in rows[1:]:
-            if row[0] == today:
-                try:
-                    total += float(row[4])  # calories
-                except:
-                    continue
+        total = storage.totals("Fitness", today, chat_id)["calories"]
         return f"📊 *Today's Summary:*\n🔥 Total calories burned: {round(total)} kcal"
 
     except Exception as e:
@@ -63,7 +71,7 @@ def get_daily_summary():
         return f"❌ Could not retrieve summary. Error: {str(e)}"
 
 def summary(update: Update, context):
-    message = get_daily_summary()
+    message = get_daily_summary(update.message.chat_id)
     update.message.reply_text(message, parse_mode="Markdown")
 
 
@@ -71,170 +79,249 @@ def summary(update: Update, context):
 def reset_day(update: Update, context):
     try:
         today = datetime.date.today().isoformat()
-        scope = [
-            "https://spreadsheets.google.com/feeds",
-            "https://www.googleapis.com/auth/drive"
-        ]
-        creds = ServiceAccountCredentials.from_json_keyfile_name("modular-ethos-460803-c1-e860424b6219.json", scope)
-        client = gspread.authorize(creds)
-        sheet = client.open("Fitness_log").sheet1
-        rows = sheet.get_all_values()
-        to_delete = [i for i, row in enumerate(rows) if row[0] == today]
-        for i in reversed(to_delete):
-            sheet.delete_rows(i + 1)  # gspread is 1-indexed
+        # Only this chat's rows, queued ones included, removed in one all-or-nothing step
+        storage.reset_day("Fitness", today, update.message.chat_id)
         update.message.reply_text("✅ Today's workout entries have been reset.")
     except Exception as e:
         logging.exception("Failed to reset the day")
         update.message.reply_text(f"❌ Could not reset today's data. Error: {str(e)}")
 
-# === FITNESS LOGGING TOOL ===
-@function_tool
-def log_exercise(ctx: RunContextWrapper[Any], user_input: str) -> str:
-    """
-    Parses freeform text like '50 minutes weight training moderate' and logs to Google Sheets.
-    """
-    alias_map = {
-        "weights": "fitness (weights)",
-        "weight": "fitness (weights)",
-        "weight training": "fitness (weights)",
-        "cardio": "fitness (cardio)"
-    }
-
-    MET_table = {
-        "swimming": {"light": 6.0, "moderate": 8.0, "intense": 10.0},
-        "walking": {"light": 2.8, "moderate": 3.5, "intense": 4.5},
-        "fitness (weights)": {"light": 3.5, "moderate": 4.5, "intense": 6.0},
-        "fitness (cardio)": {"light": 5.5, "moderate": 7.0, "intense": 9.0}
-    }
-
-    # Extract data from user input
-    user_input = user_input.lower()
-
-    # Duration
-    duration_match = re.search(r"(\d+)\s*(min|minutes)?", user_input)
-    duration_minutes = int(duration_match.group(1)) if duration_match else None
-
-    # Intensity
-    intensity = None
-    for level in ["light", "moderate", "intense"]:
-        if level in user_input:
-            intensity = level
-            break
-
-    # Exercise type
-    exercise_type = None
-    for keyword in list(alias_map.keys()) + list(MET_table.keys()):
-        if keyword in user_input:
-            exercise_type = alias_map.get(keyword, keyword)
-            break
-
-    if not all([exercise_type, duration_minutes, intensity]):
-        missing = []
-        if not exercise_type: missing.append("exercise type")
-        if not duration_minutes: missing.append("duration")
-        if not intensity: missing.append("intensity (light/moderate/intense)")
-        return f"⚠️ Still missing: {', '.join(missing)}. Please send it."
-
-    # Estimate calories
-    weight_kg = 80
-    calories = MET_table[exercise_type][intensity] * weight_kg * (duration_minutes / 60)
-
-    log_to_google_sheets(
-        datetime.date.today().isoformat(),
-        exercise_type,
-        intensity,
-        duration_minutes,
-        calories
-    )
+# === REBUILD SUMMARY INDEX ===
+def rebuild_index(update: Update, context):
+    try:
+        count = storage.rebuild("Fitness")
+        update.message.reply_text(f"🔄 Summary index rebuilt from {count} sheet rows.")
+    except Exception as e:
+        logging.exception("Failed to rebuild the index")
+        update.message.reply_text(f"❌ Could not rebuild the index. Error: {str(e)}")
+
+# === BODY WEIGHT ===
+def weight(update: Update, context):
+    # Show or set the body weight used for calorie estimates: /weight 72
+    try:
+        if context.args:
+            profile = profiles.update(update.message.chat_id, weight_kg=float(context.args[0].replace(",", ".")))
+        else:
+            profile = profiles.get(update.message.chat_id)
+        update.message.reply_text(f"⚖️ Calories are estimated for a body weight of {profile['weight_kg']:g} kg.")
+    except ValueError as e:
+        update.message.reply_text(f"❌ Could not set your weight. {str(e)}")
+
+# === CALORIE ESTIMATE + LOGGING ===
+async def record_exercise(chat_id, exercise_type, duration_minutes, intensity):
+    # Estimate calories with the MET catalog (data/met_catalog.csv) and log the workout; no LLM involved
+    weight_kg = profiles.get(chat_id)["weight_kg"]
+    calories = catalog.met(exercise_type, intensity) * weight_kg * (duration_minutes / 60)
+
+    # Storage write, kept off the shared event loop
+    with metrics.span("fitness_store"):
+        await asyncio.to_thread(
+            log_to_google_sheets,
+            datetime.date.today().isoformat(),
+            exercise_type,
+            intensity,
+            duration_minutes,
+            calories,
+            chat_id
+        )
 
     return (
         f"✅ I've logged your {duration_minutes}-minute {exercise_type} session at {intensity} intensity.\n"
         f"Approximately {round(calories)} kcal were burned. Keep up the great work!"
     )
 
-@function_tool
-def resume_logging(ctx: RunContextWrapper[Any], intensity: str) -> str:
-    # Resume pending logging if intensity was missing initially
-    pending = ctx.user_state.get("pending_exercise")
-    if not pending:
-        return "I don't have an exercise to complete. Try again with a full message."
-    return log_exercise(ctx, pending["exercise_type"], pending["duration_minutes"], intensity)
+# === FITNESS LOGGING TOOL ===
+async def log_exercise(ctx: RunContextWrapper[Any], user_input: str) -> str:
+    """
+    Parses freeform text like '50 minutes weight training moderate' and logs to Google Sheets.
+    """
+    with metrics.span("fitness_log_tool"):
+        # Extract activity, duration and intensity in one pass over the input
+        metrics.increment("fitness_log_tool_calls_total")
+        exercise_type, duration_minutes, intensity = catalog.parse(user_input)
+
+        if not all([exercise_type, duration_minutes, intensity]):
+            missing = []
+            if not exercise_type: missing.append("exercise type")
+            if not duration_minutes: missing.append("duration")
+            if not intensity: missing.append("intensity (light/moderate/intense)")
+            return f"⚠️ Still missing: {', '.join(missing)}. Please send it."
+        if duration_minutes > MAX_WORKOUT_MINUTES:
+            return (f"⚠️ Not logged: {duration_minutes} minutes is longer than {MAX_WORKOUT_MINUTES} minutes. "
+                    "Ask the user to check the duration.")
+
+        return await record_exercise(ctx.context, exercise_type, duration_minutes, intensity)
+
+async def resume_logging(ctx: RunContextWrapper[Any], intensity: str) -> str:
+    """
+    Completes the chat's pending workout with the given intensity (light/moderate/intense) and logs it.
+    """
+    # Resume pending logging if intensity was missing initially (ctx.context is the chat id)
+    level = INTENSITY_WORDS.get(intensity.strip().lower())
+    if level is None:
+        return "⚠️ Intensity must be light, moderate or intense."
+    pending = await asyncio.to_thread(pending_workouts.merge, ctx.context, Workout(None, None, level))
+    if not pending.complete():
+        if pending.exercise_type is None and pending.duration is None:
+            await asyncio.to_thread(pending_workouts.clear, ctx.context)
+            return "I don't have an exercise to complete. Try again with a full message."
+        return f"⚠️ Still missing: {', '.join(pending.missing())}. Please send it."
+    return await record_exercise(ctx.context, pending.exercise_type, pending.duration, pending.intensity)
 
 # === AGENT CONFIGURATION ===
-agent = Agent(
-    name="FitCoach",
-    instructions="You are a Telegram-based fitness coach. Help the user log exercise, ask for missing info, and record into Google Sheets.",
-    tools=[log_exercise, resume_logging]
-)
-
-user_memories = {}  # To store partial user inputs per chat
+_agent = None
+_agent_lock = threading.Lock()
+
+def get_agent():
+    # Built on first use: importing the Agents SDK is the slowest part of startup
+    global _agent
+    with _agent_lock:
+        if _agent is None:
+            from agents import Agent, RunContextWrapper, function_tool
+            openai_pool.use_for_agents()
+            # RunContextWrapper is only imported for type checking; function_tool needs the real type
+            for tool in (log_exercise, resume_logging):
+                tool.__annotations__["ctx"] = RunContextWrapper[Any]
+            _agent = Agent(
+                name="FitCoach",
+                instructions="You are a Telegram-based fitness coach. Help the user log exercise, ask for missing info, and record into Google Sheets.",
+                tools=[function_tool(log_exercise), function_tool(resume_logging)]
+            )
+        return _agent
+
+def get_runner():
+    from agents import Runner
+    return Runner
+
+def prewarm():
+    # Import the Agents SDK, load the MET catalog and open the Sheets connection in the background
+    started = time.perf_counter()
+    try:
+        get_agent()
+        len(catalog)
+        get_fitness_sheet()
+        logging.info("Fitness agent pre-warmed in %.2fs", time.perf_counter() - started)
+    except Exception:
+        logging.exception("Pre-warming the fitness agent failed; continuing lazily")
+
+# Partial workouts per chat, bounded and expiring (see state_store.py)
+pending_workouts = create_store()
+
+def completes_workout(chat_id, messages):
+    # A batch that already completes the pending workout is handled at once:
+    # no reason to wait for more follow-ups. Runs on the event loop, so it
+    # starts from the pending workout handle_message read, not the store.
+    pending = messages[0][3]
+    workout = PendingWorkout(pending.exercise_type, pending.duration, pending.intensity)
+    for _, _, parsed, _ in messages:
+        workout.merge(parsed)
+    return workout.complete()
+
+# Messages waiting for their chat to go quiet (see async_runtime.py)
+incoming = Coalescer(runtime, lambda chat_id, messages: handle_batch(chat_id, messages), ready=completes_workout)
 
 # === TELEGRAM COMMANDS ===
 def handle_message(update: Update, context):
-    import asyncio
-
     if update.message is None or update.message.text is None:
         return  # Ignore non-text updates
 
-    chat_id = update.message.chat_id
-    user_input = update.message.text.strip().lower()
-
-    # Initialize memory per user if not yet created
-    if chat_id not in user_memories:
-        user_memories[chat_id] = {"exercise_type": None, "duration": None, "intensity": None}
-    memory = user_memories[chat_id]
-
-    # Match exercise types
-    for option in ["swimming", "walking", "fitness (weights)", "fitness (cardio)"]:
-        if option in user_input:
-            memory["exercise_type"] = option
-
-    # Match duration in minutes
-    if any(unit in user_input for unit in ["minutes", "min"]):
-        try:
-            memory["duration"] = int(''.join(filter(str.isdigit, user_input)))
-        except:
-            pass
-
-    # Match intensity levels
-    intensity_map = {
-        "low": "light",
-        "light": "light",
-        "moderate": "moderate",
-        "medium": "moderate",
-        "high": "intense",
-        "intense": "intense"
-    }
-
-    for word in user_input.split():
-        if word in intensity_map:
-            memory["intensity"] = intensity_map[word]
-            break
-
-    # If all fields are present, log the workout
-    if all(memory.values()):
-        full_prompt = f"log {memory['exercise_type']} for {memory['duration']} minutes at {memory['intensity']} intensity"
-        try:
-            response = asyncio.run(Runner.run(agent, full_prompt))
-            update.message.reply_text(response.final_output)
-            user_memories[chat_id] = {"exercise_type": None, "duration": None, "intensity": None}  # Reset
-        except Exception as e:
-            logging.exception("Error running agent")
-            update.message.reply_text("⚠️ Something went wrong while logging your workout. Please try again.")
-    else:
-        # ✅ NEW: Try again if something was just added and now all fields are available
-        if any(memory.values()):
-            if all(memory.values()):
-                full_prompt = f"log {memory['exercise_type']} for {memory['duration']} minutes at {memory['intensity']} intensity"
-                try:
-                    response = asyncio.run(Runner.run(agent, full_prompt))
-                    update.message.reply_text(response.final_output)
-                    user_memories[chat_id] = {"exercise_type": None, "duration": None, "intensity": None}
-                    return
-                except Exception as e:
-                    logging.exception("Error on retry")
-        missing = [k for k, v in memory.items() if not v]
-        update.message.reply_text(f"Got it! Still missing: {', '.join(missing)}. Please send it.")
+    # Quick follow-ups ("swimming", "45 min", "moderate") are answered together;
+    # the dispatcher thread only extracts exercise type, duration and intensity
+    # (same matcher as log_exercise, one pass) and queues the message
+    metrics.increment("fitness_messages_total")
+    with metrics.span("fitness_parse"):
+        parsed = catalog.parse(update.message.text)
+    # The store may block on disk, so it is read here rather than on the loop
+    pending = pending_workouts.get(update.message.chat_id)
+    incoming.add(update.message.chat_id, (update, time.perf_counter(), parsed, pending))
+
+
+async def handle_batch(chat_id, messages):
+    # Runs on the chat's lane with every (update, received, parsed, pending) the chat sent
+    # since the previous batch, oldest first
+    metrics.increment("fitness_coalesced_messages_total", len(messages) - 1)
+    memory, answered, unrecognized = None, False, []
+    for update, started, parsed, _ in messages:
+        if update.message.text.strip().lower() in CONFIRM_WORDS:
+            workout = await asyncio.to_thread(pending_workouts.confirm, chat_id)
+            if workout is not None:
+                await fast_log(update, (workout.exercise_type, workout.duration, workout.intensity), started)
+                memory, answered = None, True
+                continue
+
+        # Merge one message at a time into what is pending, so a later message
+        # ("actually 60") corrects an earlier one
+        memory = await asyncio.to_thread(pending_workouts.merge, chat_id, parsed)
+        if memory.complete() and memory.duration > MAX_WORKOUT_MINUTES:
+            # Probably a typo: keep it pending (any other message drops the long
+            # duration) and ask before logging
+            await asyncio.to_thread(pending_workouts.hold, chat_id, memory)
+            await asyncio.to_thread(
+                update.message.reply_text,
+                f"⚠️ {memory.duration} minutes of {memory.exercise_type} is more than {MAX_WORKOUT_MINUTES} minutes. "
+                "Reply 'yes' to log it anyway, or send the right duration."
+            )
+            answered = True
+        elif memory.complete():
+            # All fields are there: log directly, an LLM round trip would add nothing.
+            # The store has already dropped the workout, so the rest of the batch
+            # starts a new one and a quick follow-up can't log it twice.
+            await fast_log(update, (memory.exercise_type, memory.duration, memory.intensity), started)
+            answered = True
+        elif memory.empty():
+            unrecognized.append(update.message.text)
+
+    update, started, _, _ = messages[-1]
+    if memory is not None and not memory.empty() and not memory.complete():
+        await asyncio.to_thread(
+            update.message.reply_text, f"Got it! Still missing: {', '.join(memory.missing())}. Please send it."
+        )
+    elif unrecognized and not answered:
+        # Nothing we recognize (now or earlier): let the agent interpret the free text
+        await run_agent(update, " ".join(unrecognized), started)
+
+
+async def fast_log(update: Update, workout, started):
+    # Deterministic path: MET computation + logging, no agent run
+    try:
+        reply = await record_exercise(update.message.chat_id, *workout)
+    except Exception:
+        logging.exception("Error logging workout")
+        reply = "⚠️ Something went wrong while logging your workout. Please try again."
+    await asyncio.to_thread(update.message.reply_text, reply)
+    metrics.observe("fitness_fast_path_seconds", time.perf_counter() - started)
+
+
+async def run_agent(update: Update, user_input, started):
+    # Agent path for input the keyword matcher couldn't place; one run per chat at a time
+    try:
+        agent = get_agent()
+        with metrics.span("fitness_agent_run"):
+            response = await get_runner().run(agent, user_input, context=update.message.chat_id)
+        await asyncio.to_thread(update.message.reply_text, response.final_output)
+    except Exception as e:
+        logging.exception("Error running agent")
+        await asyncio.to_thread(
+            update.message.reply_text, "⚠️ Something went wrong while logging your workout. Please try again."
+        )
+    metrics.observe("fitness_agent_path_seconds", time.perf_counter() - started)
+
+
+def stats(update: Update, context):
+    # Per-path message latency, so the saving of the fast path is visible
+    lines = ["⏱️ *Message latency*"]
+    for label, name in [("Direct logging", "fitness_fast_path_seconds"), ("Agent (LLM)", "fitness_agent_path_seconds")]:
+        pct = metrics.percentiles(name)
+        if pct:
+            lines.append(f"- {label}: p50 {pct['p50'] * 1000:.0f} ms, p90 {pct['p90'] * 1000:.0f} ms")
+        else:
+            lines.append(f"- {label}: no messages yet")
+    counters = metrics.snapshot()["counters"]
+    received = int(counters.get("fitness_messages_total", 0))
+    if received:
+        coalesced = int(counters.get("fitness_coalesced_messages_total", 0))
+        lines.append(f"- Quick follow-ups answered together: {coalesced} of {received} messages")
+    update.message.reply_text("\n".join(lines), parse_mode="Markdown")
 
 
 def start(update: Update, context):
@@ -249,7 +336,7 @@ def help(update: Update, context):  # /help command to show usage instructions
     help_message = (
         "🏋️ *How to use FitCoachBot:*\n\n"
         "You can log your workouts in 3 simple steps:\n"
-        "1️⃣ *Choose activity:* one of `walking`, `swimming`, `fitness (cardio)`, or `fitness (weights)`\n"
+        "1️⃣ *Choose activity:* e.g. `walking`, `swimming`, `running`, `cycling`, `yoga`, `fitness (cardio)` or `fitness (weights)`\n"
         "2️⃣ *Enter duration:* e.g. `30 minutes`\n"
         "3️⃣ *Choose intensity:* `light`, `medium`, or `high` intensity\n\n"
         "Examples you can type:\n"
@@ -258,8 +345,13 @@ def help(update: Update, context):  # /help command to show usage instructions
         "- `walked 20 minutes high intensity`\n\n"
         "🧠 The bot will remember your input and ask for any missing info.\n"
         "📀 All workouts are logged to Google Sheets automatically.\n\n"
-        "🧹 `/reset_day` - Reset all workouts logged today"
-        "📊 `/summary` - Show total calories burned today"
+        "🧹 `/reset_day` - Reset all workouts logged today\n"
+        "📊 `/summary` - Show total calories burned today\n"
+        "🔄 `/rebuild_index` - Re-read the sheet after editing it by hand\n"
+        "⏱️ `/stats` - Show how long logging takes\n"
+        "📅 `/week`, `/month` - Calories in/out and days on target for the last 7 or 30 days\n"
+        "📈 `/trend` - Week-by-week calories in/out for the last 12 weeks\n"
+        "⚖️ `/weight` - Show or set your body weight, e.g. `/weight 72`\n"
     )
 
     update.message.reply_text(help_message, parse_mode="Markdown")
@@ -267,7 +359,10 @@ def help(update: Update, context):  # /help command to show usage instructions
 
 
 # === MAIN BOT LOGIC ===
-def main():
+def create_updater():
+    # Build the bot with all handlers registered (also used by bot_host.py)
+    from telegram.ext import Updater, CommandHandler, MessageHandler, Filters
+
     updater = Updater(token=TELEGRAM_TOKEN, use_context=True)
     dp = updater.dispatcher
 
@@ -275,11 +370,28 @@ def main():
     dp.add_handler(CommandHandler("help", help))
     dp.add_handler(CommandHandler("summary", summary))
     dp.add_handler(CommandHandler("reset_day", reset_day))
+    dp.add_handler(CommandHandler("rebuild_index", rebuild_index))
+    dp.add_handler(CommandHandler("stats", stats))
+    dp.add_handler(CommandHandler("weight", weight))
+    dp.add_handler(CommandHandler("week", analytics.week))
+    dp.add_handler(CommandHandler("month", analytics.month))
+    dp.add_handler(CommandHandler("trend", analytics.trend))
     dp.add_handler(MessageHandler(Filters.text & ~Filters.command, handle_message))
+    return updater
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    updater = create_updater()
 
+    runtime.start()
+    storage.start()
+    if PREWARM:
+        threading.Thread(target=prewarm, name="prewarm", daemon=True).start()
     updater.start_polling()
     print("🧰 Bot is running. Talk to it on Telegram.")
     updater.idle()
+    runtime.stop()
+    storage.stop()
 
 if __name__ == "__main__":
     main()
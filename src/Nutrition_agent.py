@@ -1,41 +1,46 @@
 # === IMPORTS ===
+# The Telegram, Agents and OpenAI SDKs are imported on first use (see
+# create_updater, get_agent and get_openai_client), not at module import,
+# so the bot starts handling updates sooner. PREWARM=1 loads them in the
+# background right after startup instead of on the first message.
+from __future__ import annotations
 import logging
-from telegram.ext import Updater, CommandHandler, MessageHandler, Filters
-from telegram import Update
-from agents import Agent, Runner, function_tool, RunContextWrapper
+import threading
+from typing import TYPE_CHECKING
 from typing_extensions import Any
 from dotenv import load_dotenv
 import os
 import datetime
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-import openai
-import json
+import sheets_client
+from storage import storage
+import analytics
+from user_profiles import profiles, DEFAULT_PROFILE
+from nutrition_cache import cache, parse_query
+from food_table import foods
 import re
+import time
+import asyncio
+import metrics
+from stream_json import ArrayItemParser, parse_json_reply
+from async_runtime import runtime
+import openai_pool
+
+if TYPE_CHECKING:
+    from telegram import Update
+    from agents import RunContextWrapper
 
 # === ENVIRONMENT SETUP ===
 load_dotenv()
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN_NUTRITION")
-openai.api_key = os.getenv("OPENAI_API_KEY_HW")
+PREWARM = os.getenv("PREWARM", "0") == "1"
 
 # Running on local (IS_LOCAL = True) or on server (IS_LOCAL = False)
 IS_LOCAL = True
 
 
 # === NUTRITION TARGETS (per day) ===
-DAILY_TARGETS = {
-    "calories": 2130.0,
-    "protein": 160.0,
-    "fat": 60.0,
-    "carbs": 240.0
-}
-
-# === LOGGING CONFIGURATION ===
-logging.basicConfig(
-    level=logging.INFO,
-    filename="nutrition_bot.log",
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
+# Defaults for users who have not set their own with /targets (see user_profiles.py)
+DAILY_TARGETS = {key: DEFAULT_PROFILE[key] for key in ("calories", "protein", "fat", "carbs")}
 
 # Location for json Google sheets
 secret_path = (
@@ -45,64 +50,42 @@ secret_path = (
 
 
 # === GOOGLE SHEETS LOGGING FUNCTION ===
-def log_food_to_google_sheets(date, item, quantity, calories, fat, carbs, protein):
-     # Connect to Google Sheets using a service account
-    scope = [
-        "https://spreadsheets.google.com/feeds",
-        "https://www.googleapis.com/auth/drive"
-    ]
-    # creds = ServiceAccountCredentials.from_json_keyfile_name(
-    # "/etc/secrets/modular-ethos-460803-c1-e860424b6219.json", scope
-    # )
-
-    creds = ServiceAccountCredentials.from_json_keyfile_name(secret_path, scope)
-
-    client = gspread.authorize(creds)
-    
-    # Append a new row to the "Calories" sheet
-    sheet = client.open("Calories_log").worksheet("Calories")
-    sheet.append_row([date, item, quantity, calories, fat, carbs, protein])
-
-def get_daily_summary():
-    import re
-
-    def parse_number(cell):
-        """Remove any non-numeric characters and return float."""
-        try:
-            return float(re.sub(r"[^\d.]", "", str(cell).strip()))
-        except:
-            return 0.0
-
-    # Connect to Google Sheets
-    scope = [
-        "https://spreadsheets.google.com/feeds",
-        "https://www.googleapis.com/auth/drive"
-    ]
-    creds = ServiceAccountCredentials.from_json_keyfile_name(secret_path, scope)
-    client = gspread.authorize(creds)
-    sheet = client.open("Calories_log").worksheet("Calories")
-    rows = sheet.get_all_values()[1:]  # Skip header
-
+def get_calories_sheet():
+    # Shared, already-authorized worksheet handle (see sheets_client.py)
+    return sheets_client.get_worksheet(secret_path, "Calories_log", "Calories")
+
+# Sum these columns per day and chat (see storage.py); column H holds the
+# chat id so every user's rows can be told apart, column I the entry id
+# that keeps re-sent rows from being appended twice
+storage.register("Calories", get_calories_sheet, {"calories": 3, "fat": 4, "carbs": 5, "protein": 6},
+                 chat_column=7, id_column=8)
+
+def log_food_to_google_sheets(date, item, quantity, calories, fat, carbs, protein, chat_id=""):
+    # Store a new row for the "Calories" sheet (locally first; Sheets is updated in the background)
+    storage.append("Calories", [[date, item, quantity, calories, fat, carbs, protein, str(chat_id)]])
+
+def log_meal_to_google_sheets(date, entries, chat_id=""):
+    # Store all items of one meal with a single write (one append_rows later)
+    storage.append("Calories", [
+        [date, e["item"], e["quantity"], e["calories"], e["fat"], e["carbs"], e["protein"], str(chat_id)]
+        for e in entries
+    ])
+
+def get_daily_summary(chat_id):
+    # Totals come from the storage backend, not from a full sheet download,
+    # and only cover this chat's rows
     today = datetime.date.today().isoformat().strip()
-    totals = {"calories": 0.0, "fat": 0.0, "carbs": 0.0, "protein": 0.0}
-
-    for row in rows:
-        if len(row) >= 7:
-            row_date = row[0].strip()
-            if row_date == today:
-                totals["calories"] += parse_number(row[3])
-                totals["fat"]      += parse_number(row[4])
-                totals["carbs"]    += parse_number(row[5])
-                totals["protein"]  += parse_number(row[6])
+    totals = storage.totals("Calories", today, chat_id)
+    targets = profiles.get(chat_id)
 
     def percent(val, target):
         return round((val / target) * 100, 1)
 
     pct = {
-        "calories": percent(totals["calories"], DAILY_TARGETS["calories"]),
-        "protein": percent(totals["protein"], DAILY_TARGETS["protein"]),
-        "fat": percent(totals["fat"], DAILY_TARGETS["fat"]),
-        "carbs": percent(totals["carbs"], DAILY_TARGETS["carbs"])
+        "calories": percent(totals["calories"], targets["calories"]),
+        "protein": percent(totals["protein"], targets["protein"]),
+        "fat": percent(totals["fat"], targets["fat"]),
+        "carbs": percent(totals["carbs"], targets["carbs"])
     }
 
     return (f"📊 *Today's Nutrition Summary*\n"
@@ -113,16 +96,18 @@ def get_daily_summary():
 
 
 
-# === JSON UTILITIES ===
-def extract_json_safe(text):
-    """Safely extract the first JSON object from a string."""
-    try:
-        match = re.search(r"\{.*\}", text, re.DOTALL)
-        if match:
-            return json.loads(match.group())
-    except json.JSONDecodeError as e:
-        raise ValueError(f"Failed to parse JSON: {e}")
-    raise ValueError("No valid JSON object found in response.")
+# === OPENAI CLIENT ===
+def get_openai_client():
+    # One rate-limited async client (and keep-alive pool) per process, shared with the Agents SDK
+    return openai_pool.get_client()
+
+
+# === REPLY VALIDATION ===
+# Upper bounds for one food item; anything above is a model error, not a meal
+ITEM_LIMITS = {"calories": 5000.0, "fat": 500.0, "carbs": 1000.0, "protein": 500.0}
+
+OPENAI_BUDGET_SECONDS = float(os.getenv("OPENAI_BUDGET_SECONDS", "30"))
+MAX_ATTEMPTS = 2
 
 def clean_numeric(val):
     """Convert string with units (e.g. '1.3g') into float."""
@@ -130,67 +115,257 @@ def clean_numeric(val):
         return float(re.sub(r"[^\d.]", "", val))
     return float(val)
 
-# === MAIN NUTRITION LOGGING FUNCTION; THIS IS A TOOL ===
-@function_tool
-def log_nutrition(ctx: RunContextWrapper[Any], food_input: str) -> str:
-    # Build prompt to get nutrition values in JSON format
-    prompt = (
-        f"You are a strict JSON API. Given this food input: '{food_input}', "
-        "respond ONLY with this exact format:\n"
-        "{ \"item\": ..., \"quantity\": ..., \"calories\": ..., \"fat\": ..., \"carbs\": ..., \"protein\": ... }"
-    )
+def validate_item(raw):
+    """Return a repaired copy of one meal item from the model, or None if it is unusable."""
+    try:
+        entry = {"item": str(raw["item"]).strip(), "quantity": str(raw.get("quantity") or "1").strip()}
+        for key, limit in ITEM_LIMITS.items():
+            value = clean_numeric(raw[key])  # repairs '1.3g', '140 kcal', "12"
+            if not 0 <= value <= limit:
+                return None
+            entry[key] = round(value, 1)
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return None
+    return entry if entry["item"] else None
+
+# === MEAL SPLITTING + STRUCTURED EXTRACTION ===
+def split_meal(food_input):
+    """Split '2 eggs, toast, coffee with milk and a banana' into one string per item.
+
+    Only used to look the parts up locally: it also splits dishes like 'mac and
+    cheese', so a meal with any unknown part goes to the model as a whole.
+    A comma between digits ('1,5 kg potatoes') is a decimal comma, not a separator.
+    """
+    parts = re.split(r"(?<!\d),|,(?!\d)|;|\+|&|\band\b", food_input)
+    return [p.strip() for p in parts if p.strip()]
+
+# Function schema the model must fill in: one object per food item of the meal
+MEAL_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "record_meal",
+        "description": "Record the nutrition values of every food item in a meal.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "items": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "item": {"type": "string", "description": "Food name"},
+                            "quantity": {"type": "string", "description": "Amount as given, e.g. '2' or '200g'"},
+                            "calories": {"type": "number", "description": "kcal"},
+                            "fat": {"type": "number", "description": "grams"},
+                            "carbs": {"type": "number", "description": "grams"},
+                            "protein": {"type": "number", "description": "grams"}
+                        },
+                        "required": ["item", "quantity", "calories", "fat", "carbs", "protein"],
+                        "additionalProperties": False
+                    }
+                }
+            },
+            "required": ["items"],
+            "additionalProperties": False
+        }
+    }
+}
 
+class ItemFeed:
+    # Valid items of a completion as they stream in. The (possibly shared) request
+    # only appends to it; the caller's on_item runs in follow(), in the caller's own
+    # task, so a slow or failing callback never holds up or fails the request.
+    def __init__(self):
+        self.items = []
+        self.closed = False
+        self._changed = asyncio.Event()
+
+    def push(self, entry):
+        self.items.append(entry)
+        self._changed.set()
+
+    def close(self):
+        self.closed = True
+        self._changed.set()
+
+    async def follow(self, on_item):
+        seen = 0
+        while True:
+            self._changed.clear()
+            while seen < len(self.items):
+                entry = self.items[seen]
+                seen += 1
+                try:
+                    await on_item(entry)
+                except Exception:
+                    logging.warning("Showing a parsed item failed; continuing", exc_info=True)
+            if self.closed:
+                return
+            await self._changed.wait()
+
+async def stream_items(meal, on_item=None):
+    # Stream one structured completion; items are validated (and shown) as soon as each one is complete.
+    # Returns (list with one validated entry or None per returned item, tokens used).
+    started = time.perf_counter()
+    feed = ItemFeed()
+    follower = asyncio.ensure_future(feed.follow(on_item)) if on_item else None
     try:
-        # Call OpenAI API with the prompt
-        client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY_HW"))
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a nutritionist."},
-                {"role": "user", "content": prompt}
-            ]
-        )
-        reply = response.choices[0].message.content.strip()
-        print("OpenAI raw reply:", reply)
-
-         # Parse and normalize the returned JSON data
-        entry = extract_json_safe(reply)
-        entry["calories"] = clean_numeric(entry["calories"])
-        for key in ["fat", "carbs", "protein"]:
-            entry[key] = clean_numeric(entry[key])
-
-        print("Writing to sheet with:", [
-            datetime.date.today().isoformat(),
-            entry["item"],
-            entry["quantity"],
-            entry["calories"],
-            entry["fat"],
-            entry["carbs"],
-            entry["protein"]
-        ])
-
-        # Log the entry to Google Sheets
-        log_food_to_google_sheets(
-            datetime.date.today().isoformat(),
-            entry["item"],
-            entry["quantity"],
-            entry["calories"],
-            entry["fat"],
-            entry["carbs"],
-            entry["protein"]
-        )
+        with metrics.span("openai_completion"):
+            # Identical meals asked for at the same moment (several chats sending "1 apple") share one request
+            (items, tokens), shared = await openai_pool.single_flight.do(
+                ("record_meal", meal), lambda: _stream_items(meal, feed, started)
+            )
+    except BaseException:
+        if follower:
+            follower.cancel()
+        raise
+    if shared:
+        # The items were streamed to the chat that made the request; show them here now
+        for entry in items:
+            if entry:
+                feed.push(entry)
+        tokens = 0
+    feed.close()
+    if follower:
+        await follower
+    return items, tokens
+
+async def _stream_items(meal, feed, started):
+    # The request and stream handling of stream_items (timed as one openai_completion span)
+    stream = await get_openai_client().chat.completions.create(
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": "You are a nutritionist."},
+            {"role": "user", "content": (
+                "Split this meal into its food items, in the order given, and estimate calories, fat, "
+                "carbs and protein for each of them. A dish such as 'mac and cheese' or 'fish & chips' "
+                f"is one item.\nMeal: {meal}"
+            )}
+        ],
+        tools=[MEAL_TOOL],
+        tool_choice={"type": "function", "function": {"name": "record_meal"}},
+        stream=True,
+        stream_options={"include_usage": True}
+    )
 
-        # Return formatted success message (no % progress shown)
-        output = (f"✅ Logged: {entry['quantity']} {entry['item']}\n"
-                  f"Calories: {entry['calories']} kcal\n"
-                  f"Fat: {entry['fat']}g, Carbs: {entry['carbs']}g, Protein: {entry['protein']}g")
+    parser = ArrayItemParser()
+    content = []
+    items, tokens = [], 0
+    async for chunk in stream:
+        if chunk.usage:
+            tokens = chunk.usage.total_tokens
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta.tool_calls:
+            for raw in parser.feed(delta.tool_calls[0].function.arguments or ""):
+                entry = validate_item(raw)
+                if not items:
+                    metrics.observe("nutrition_first_item_seconds", time.perf_counter() - started)
+                items.append(entry)
+                if entry:
+                    feed.push(entry)
+        elif delta.content:
+            content.append(delta.content)
+
+    if not items:
+        # Nothing streamed as array elements: the model answered with a bare object or plain text
+        data = parse_json_reply(parser.text or "".join(content))
+        for raw in data.get("items", [data]):
+            entry = validate_item(raw)
+            items.append(entry)
+            if entry:
+                feed.push(entry)
+    logging.debug("OpenAI structured reply: %s", items)
+    return items, tokens
+
+async def estimate_meal(meal, on_item=None):
+    """Ask OpenAI to split `meal` into items and estimate them, retrying within OPENAI_BUDGET_SECONDS.
+
+    Returns (valid entries, number of items that stayed invalid, tokens used).
+    """
+    deadline = time.monotonic() + OPENAI_BUDGET_SECONDS
+    best, invalid, tokens = [], 0, 0
+    for attempt in range(MAX_ATTEMPTS):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        metrics.increment("nutrition_parse_attempts_total")
+        try:
+            items, used = await asyncio.wait_for(stream_items(meal, on_item), remaining)
+        except (ValueError, asyncio.TimeoutError) as e:
+            logging.warning("Nutrition reply attempt %d failed: %s", attempt + 1, e)
+            metrics.increment("nutrition_parse_failures_total")
+            continue
+        tokens += used
+        entries = [e for e in items if e]
+        if entries and len(entries) == len(items):
+            return entries, 0, tokens
+        # Some items unusable: ask again, keeping the best answer so far
+        metrics.increment("nutrition_parse_failures_total")
+        if len(entries) > len(best):
+            best, invalid = entries, len(items) - len(entries)
+    return best, invalid, tokens
 
-        return output
+# === MAIN NUTRITION LOGGING FUNCTION; THIS IS A TOOL ===
+async def log_nutrition(ctx: RunContextWrapper[Any], food_input: str) -> str:
+    """
+    Logs a whole meal, e.g. '2 eggs, toast, coffee with milk and a banana'. Pass the full meal in one call.
+    """
+    with metrics.span("nutrition_log_tool"):
+        # Optional early-reply hook from handle_message (see MealReply)
+        on_item = getattr(ctx.context, "item_ready", None)
+        try:
+            # Repeated foods ("1 banana", "2 eggs") are answered from the local cache,
+            # staple foods from the bundled food table; other meals go to OpenAI
+            parts = split_meal(food_input)
+            queries = [parse_query(part) for part in parts]
+            with metrics.span("nutrition_local_lookup"):
+                cached = [cache.get(q) for q in queries]
+                entries = [entry or foods.lookup(q) for entry, q in zip(cached, queries)]
+            metrics.increment("nutrition_cache_hits_total", sum(1 for e in cached if e))
+            metrics.increment("nutrition_food_table_hits_total", sum(1 for c, e in zip(cached, entries) if e and not c))
+            failed = 0
+            # Answered locally, the final reply follows at once: on_item (the early
+            # "⏳ logging..." message) is only worth a message while the model runs
+            if not all(entries):
+                # Some part is unknown, and the split may have cut a dish in two ("mac and
+                # cheese"): the model gets the whole meal and splits it itself
+                metrics.increment("nutrition_llm_items_total", len(parts))
+                entries, failed, tokens = await estimate_meal(food_input, on_item)
+                if not failed and len(entries) == len(parts):
+                    # Same items as the split found (in the same order): cache them per part
+                    for query, entry in zip(queries, entries):
+                        cache.put(query, entry, tokens=tokens // len(entries))
+            if not entries:
+                raise ValueError("No food items recognized.")
+
+            today = datetime.date.today().isoformat()
+            logging.debug("Writing to sheet with: %s", [[today, e["item"], e["quantity"]] for e in entries])
+
+            # Log all items (one storage write, kept off the event loop)
+            with metrics.span("nutrition_store"):
+                await asyncio.to_thread(log_meal_to_google_sheets, today, entries, getattr(ctx.context, "chat_id", ""))
+
+            # Return formatted success message (no % progress shown)
+            lines = [
+                f"✅ Logged: {e['quantity']} {e['item']}\n"
+                f"Calories: {e['calories']} kcal\n"
+                f"Fat: {e['fat']}g, Carbs: {e['carbs']}g, Protein: {e['protein']}g"
+                for e in entries
+            ]
+            if len(entries) > 1:
+                total = {k: round(sum(e[k] for e in entries), 1) for k in ["calories", "fat", "carbs", "protein"]}
+                lines.append(f"🍽️ Meal total: {total['calories']} kcal "
+                             f"(Fat: {total['fat']}g, Carbs: {total['carbs']}g, Protein: {total['protein']}g)")
+            if failed:
+                lines.append(f"⚠️ Could not estimate {failed} more item(s) of this meal. Please send them again.")
+            return "\n\n".join(lines)
 
-    except Exception as e:
-        logging.exception("Error logging nutrition data")
-        print("❌ Exception occurred:", e)
-        return f"❌ Could not log nutrition data. Error: {str(e)}"
+        except Exception as e:
+            logging.exception("Error logging nutrition data")
+            metrics.increment("nutrition_log_errors_total")
+            return f"❌ Could not log nutrition data. Error: {str(e)}"
 
 
 # === RESET COMMAND HANDLER ===
@@ -199,27 +374,8 @@ def reset_day(update: Update, context):
         # Get today's date to find rows for that day
         today = datetime.date.today().isoformat()
 
-        # Open Google Sheet and identify today's rows
-        scope = [
-            "https://spreadsheets.google.com/feeds",
-            "https://www.googleapis.com/auth/drive"
-        ]
-        # creds = ServiceAccountCredentials.from_json_keyfile_name(
-        # "/etc/secrets/modular-ethos-460803-c1-e860424b6219.json", scope
-        # )
-
-        creds = ServiceAccountCredentials.from_json_keyfile_name(secret_path, scope)
-
-        client = gspread.authorize(creds)
-        sheet = client.open("Calories_log").worksheet("Calories")
-
-        # Get all rows and find today's entries
-        rows = sheet.get_all_values()
-        row_to_delete = [index for index, row in enumerate(rows) if row[0] == today]
-
-        # Delete today's rows (if any)
-        for index in reversed(row_to_delete):  # Reverse to avoid skipping rows
-            sheet.delete_rows(index + 1)  # gspread is 1-indexed
+        # Delete this chat's rows for today (queued rows included) in one all-or-nothing step
+        storage.reset_day("Calories", today, update.message.chat_id)
 
         # Send confirmation message to the user
         update.message.reply_text(f"✅ Today's log has been reset. You can start logging again!")
@@ -227,6 +383,45 @@ def reset_day(update: Update, context):
         logging.exception("Error resetting the day")
         update.message.reply_text(f"❌ Could not reset the day. Error: {str(e)}")
 
+# === REBUILD INDEX COMMAND HANDLER ===
+def rebuild_index(update: Update, context):
+    # Re-read the whole sheet into local storage (after manual sheet edits)
+    try:
+        count = storage.rebuild("Calories")
+        update.message.reply_text(f"🔄 Summary index rebuilt from {count} sheet rows.")
+    except Exception as e:
+        logging.exception("Error rebuilding the index")
+        update.message.reply_text(f"❌ Could not rebuild the index. Error: {str(e)}")
+
+# === CACHE STATS COMMAND HANDLER ===
+def cache_stats(update: Update, context):
+    # Show how often meals were answered from the local cache instead of OpenAI
+    stats = cache.stats()
+    update.message.reply_text(
+        f"🗄️ Nutrition cache: {stats['hits']} hits, {stats['misses']} misses "
+        f"({stats['hit_rate'] * 100:.0f}% hit rate), ~{stats['tokens_saved']} OpenAI tokens saved."
+    )
+
+# === TARGETS COMMAND HANDLER ===
+def targets(update: Update, context):
+    # Show or set this user's daily targets: /targets calories=2000 protein=150
+    try:
+        values = {}
+        for arg in context.args:
+            key, _, value = arg.partition("=")
+            values[key.strip().lower()] = float(value)
+        unknown = set(values) - set(DAILY_TARGETS)
+        if unknown:
+            raise ValueError(f"Unknown target: {', '.join(sorted(unknown))}")
+        profile = profiles.update(update.message.chat_id, **values) if values else profiles.get(update.message.chat_id)
+        update.message.reply_text(
+            f"🎯 Daily targets: {profile['calories']:g} kcal, Protein: {profile['protein']:g}g, "
+            f"Fat: {profile['fat']:g}g, Carbs: {profile['carbs']:g}g\n"
+            "Change them with e.g. /targets calories=2000 protein=150"
+        )
+    except ValueError as e:
+        update.message.reply_text(f"❌ Could not set targets. {str(e)}")
+
 # === HELP COMMAND HANDLER ===
 def help(update: Update, context):
     # Send list of available commands to the user
@@ -235,7 +430,12 @@ def help(update: Update, context):
         "/start - Welcome message and bot introduction.\n"
         "/summary - Get today's nutrition summary (calories, protein, fat, carbs).\n"
         "/close_day - Finalize today's progress and get a summary.\n"
-        "/reset_day - Reset today's logged data (start fresh for the new day).\n\n"
+        "/reset_day - Reset today's logged data (start fresh for the new day).\n"
+        "/week, /month - Averages, days on target and calories in/out for the last 7 or 30 days.\n"
+        "/trend - Week-by-week calories in/out for the last 12 weeks.\n"
+        "/targets - Show or set your daily targets, e.g. /targets calories=2000 protein=150.\n"
+        "/rebuild_index - Re-read the sheet after editing it by hand.\n"
+        "/cache_stats - Show how many meals were served from the local cache.\n\n"
         "You can also log your meals by simply typing them (e.g., '1 apple', '200g chicken')."
     )
 
@@ -254,19 +454,89 @@ def get_language(update: Update):
 
 
 # === AGENT DEFINITION ===
-nutrition_agent = Agent(
-    name="NutritionBot",
-    instructions="You are a nutrition assistant. Extract calories, fat, carbs, and protein from a food item and log it to Google Sheets.",
-    tools=[log_nutrition]
-)
+_agent = None
+_agent_lock = threading.Lock()
+
+def get_agent():
+    # Build the agent on first use: importing the Agents SDK is the slowest part of startup.
+    global _agent
+    with _agent_lock:
+        if _agent is None:
+            from agents import Agent, RunContextWrapper, function_tool
+            openai_pool.use_for_agents()
+            # RunContextWrapper is only imported for type checking; function_tool needs the real type
+            log_nutrition.__annotations__["ctx"] = RunContextWrapper[Any]
+            _agent = Agent(
+                name="NutritionBot",
+                instructions=("You are a nutrition assistant. Extract calories, fat, carbs, and protein from food items and log them to Google Sheets. "
+                              "When a message lists several foods, call log_nutrition once with the whole meal."),
+                tools=[function_tool(log_nutrition)]
+            )
+        return _agent
+
+def get_runner():
+    from agents import Runner
+    return Runner
+
+def prewarm():
+    # Import the SDKs, load the food table and open the OpenAI/Sheets connections in the background
+    started = time.perf_counter()
+    try:
+        get_agent()
+        get_openai_client()
+        len(foods)
+        get_calories_sheet()
+        logging.info("Nutrition agent pre-warmed in %.2fs", time.perf_counter() - started)
+    except Exception:
+        logging.exception("Pre-warming the nutrition agent failed; continuing lazily")
 
 # === TELEGRAM HANDLERS ===
 def handle_message(update: Update, context):
-     # Handle any user input that is not a command
-    import asyncio
+    # Handle any user input that is not a command: hand it to the shared event loop and return
     user_input = update.message.text.strip().lower()
-    response = asyncio.run(Runner.run(nutrition_agent, user_input))
-    update.message.reply_text(response.final_output)
+    runtime.submit(update.message.chat_id, lambda: answer_message(update, user_input))
+
+class MealReply:
+    # Run context for the agent: when a meal goes to the model, the first parsed item
+    # is sent to the user right away, and the agent's final answer replaces that
+    # message when it is ready
+    def __init__(self, update: Update):
+        self.update = update
+        self.chat_id = update.message.chat_id
+        self.message = None
+        self._progress_sent = False
+
+    async def item_ready(self, entry):
+        # Best effort, one attempt: the meal is logged whether or not this message got through
+        if self._progress_sent:
+            return
+        self._progress_sent = True
+        try:
+            self.message = await asyncio.to_thread(
+                self.update.message.reply_text,
+                f"⏳ {entry['quantity']} {entry['item']}: {entry['calories']} kcal, logging..."
+            )
+        except Exception:
+            logging.warning("Could not send the progress message to chat %s", self.chat_id, exc_info=True)
+
+    async def finish(self, text):
+        if self.message is None:
+            await asyncio.to_thread(self.update.message.reply_text, text)
+        else:
+            await asyncio.to_thread(self.message.edit_text, text)
+
+async def answer_message(update: Update, user_input):
+    # Runs on the shared event loop, one message per chat at a time
+    reply = MealReply(update)
+    with metrics.span("nutrition_message"):
+        try:
+            agent = get_agent()
+            with metrics.span("nutrition_agent_run"):
+                response = await get_runner().run(agent, user_input, context=reply)
+            await reply.finish(response.final_output)
+        except Exception as e:
+            logging.exception("Error running the nutrition agent")
+            await reply.finish(f"❌ Could not process your message. Error: {str(e)}")
 
 def start(update: Update, context):
     # Handle /start command
@@ -275,14 +545,16 @@ def start(update: Update, context):
 def summary(update: Update, context):
     # Handle /summary command and return today's nutrition progress
     try:
-        result = get_daily_summary()
+        result = get_daily_summary(update.message.chat_id)
         update.message.reply_text(result, parse_mode="Markdown")
     except Exception as e:
         update.message.reply_text(f"❌ Could not get summary. Error: {str(e)}")
 
 # === MAIN FUNCTION ===
-def main():
-    # Initialize Telegram bot and register all command handlers
+def create_updater():
+    # Initialize Telegram bot and register all command handlers (also used by bot_host.py)
+    from telegram.ext import Updater, CommandHandler, MessageHandler, Filters
+
     updater = Updater(token=TELEGRAM_TOKEN, use_context=True)
     dp = updater.dispatcher
 
@@ -290,14 +562,36 @@ def main():
     dp.add_handler(CommandHandler("start", start))
     dp.add_handler(CommandHandler("summary", summary))
     dp.add_handler(CommandHandler("reset_day", reset_day))
+    dp.add_handler(CommandHandler("rebuild_index", rebuild_index))
+    dp.add_handler(CommandHandler("cache_stats", cache_stats))
+    dp.add_handler(CommandHandler("targets", targets))
+    dp.add_handler(CommandHandler("week", analytics.week))
+    dp.add_handler(CommandHandler("month", analytics.month))
+    dp.add_handler(CommandHandler("trend", analytics.trend))
     dp.add_handler(CommandHandler("help", help))
 
     dp.add_handler(MessageHandler(Filters.text & ~Filters.command, handle_message))
+    return updater
+
+def main():
+    # === LOGGING CONFIGURATION ===
+    logging.basicConfig(
+        level=logging.INFO,
+        filename="nutrition_bot.log",
+        format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    updater = create_updater()
 
-    # Start polling
+    # Start the agent event loop, the background storage mirroring and polling
+    runtime.start()
+    storage.start()
+    if PREWARM:
+        threading.Thread(target=prewarm, name="prewarm", daemon=True).start()
     updater.start_polling()
     print("NutritionBot is running. Talk to it on Telegram.")
     updater.idle()
+    runtime.stop()
+    storage.stop()
 
 # === SCRIPT ENTRY POINT ===
 if __name__ == "__main__":
@@ -0,0 +1,153 @@
+# === HISTORY REPORTS (/week, /month, /trend) ===
+# The storage backends keep per-day sums per chat (daily_totals), updated on
+# every append/reset, so a report never reads individual rows or the sheet:
+# a 5-year history is at most ~1,800 small per-day rows per log.
+#
+# Those sums are laid out as dense per-day columns (array('d'), one slot per
+# calendar day in the period, 0 for days without entries) and every figure is
+# a pass over those columns: averages, 4-week rolling means, target adherence
+# and the calories in/out balance, which joins the Nutrition and Fitness logs
+# of the same chat by day. Private chats have the same id in both bots.
+#
+# The /week, /month and /trend command handlers at the bottom are registered
+# by both bots.
+import datetime
+import logging
+from array import array
+
+from storage import storage
+from user_profiles import profiles
+
+NUTRITION_SHEET = "Calories"
+FITNESS_SHEET = "Fitness"
+
+# A day counts as "on target" for calories within this fraction of the target
+CALORIE_TOLERANCE = 0.10
+
+
+def day_range(last_day, days):
+    """ISO dates of the `days` calendar days ending with `last_day`, oldest first."""
+    return [(last_day - datetime.timedelta(days=offset)).isoformat() for offset in range(days - 1, -1, -1)]
+
+
+def load_columns(storage, sheet, chat_id, days, metrics):
+    """Per-day totals as {metric: array('d')} aligned with `days`, plus a 0/1 'logged' column."""
+    totals = storage.daily_totals(sheet, chat_id, days[0], days[-1])
+    columns = {metric: array("d", bytes(8 * len(days))) for metric in metrics}
+    columns["logged"] = array("d", bytes(8 * len(days)))
+    for position, day in enumerate(days):
+        values = totals.get(day)
+        if values:
+            columns["logged"][position] = 1.0
+            for metric in metrics:
+                columns[metric][position] = values.get(metric, 0.0)
+    return columns
+
+
+def rolling_mean(values, window):
+    """Trailing mean over `window` values (shorter at the start), same length as `values`."""
+    means = array("d")
+    running = 0.0
+    for position, value in enumerate(values):
+        running += value
+        if position >= window:
+            running -= values[position - window]
+        means.append(running / min(position + 1, window))
+    return means
+
+
+def _mean(values, weights=None):
+    if weights is None:
+        return sum(values) / len(values) if values else 0.0
+    count = sum(weights)
+    return sum(v * w for v, w in zip(values, weights)) / count if count else 0.0
+
+
+def _load(storage, chat_id, days):
+    eaten = load_columns(storage, NUTRITION_SHEET, chat_id, days, ("calories", "protein", "fat", "carbs"))
+    burned = load_columns(storage, FITNESS_SHEET, chat_id, days, ("calories",))
+    return eaten, burned
+
+
+def period_report(storage, chat_id, days, targets, title, today=None):
+    """Averages, adherence and balance for the `days` days up to today."""
+    period = day_range(today or datetime.date.today(), days)
+    eaten, burned = _load(storage, chat_id, period)
+    logged = eaten["logged"]
+    logged_days = int(sum(logged))
+    workout_days = int(sum(burned["logged"]))
+
+    lines = [f"📅 *{title}*"]
+    if logged_days:
+        low, high = targets["calories"] * (1 - CALORIE_TOLERANCE), targets["calories"] * (1 + CALORIE_TOLERANCE)
+        on_calories = sum(1 for kcal, seen in zip(eaten["calories"], logged) if seen and low <= kcal <= high)
+        on_protein = sum(1 for g, seen in zip(eaten["protein"], logged) if seen and g >= targets["protein"])
+        lines.append(
+            f"- Eaten: {_mean(eaten['calories'], logged):.0f} kcal/day on {logged_days} logged days "
+            f"(Protein {_mean(eaten['protein'], logged):.0f}g, Fat {_mean(eaten['fat'], logged):.0f}g, "
+            f"Carbs {_mean(eaten['carbs'], logged):.0f}g)"
+        )
+        lines.append(
+            f"- On target: calories within {CALORIE_TOLERANCE:.0%} on {on_calories}/{logged_days} days, "
+            f"protein reached on {on_protein}/{logged_days} days"
+        )
+    else:
+        lines.append("- Eaten: no meals logged")
+    lines.append(
+        f"- Burned: {sum(burned['calories']):.0f} kcal in workouts on {workout_days} days "
+        f"({_mean(burned['calories']):.0f} kcal/day)"
+    )
+    if logged_days:
+        # Only days with meals logged, otherwise unlogged days would look like fasting
+        net = array("d", (kcal - out for kcal, out in zip(eaten["calories"], burned["calories"])))
+        balance = _mean(net, logged) - targets["calories"]
+        lines.append(f"- Balance: {_mean(net, logged):.0f} kcal/day in − out, {balance:+.0f} vs your target")
+    return "\n".join(lines)
+
+
+def trend_report(storage, chat_id, targets, weeks=12, today=None):
+    """One line per week: average eaten/burned/net and the 4-week rolling average eaten."""
+    period = day_range(today or datetime.date.today(), weeks * 7)
+    eaten, burned = _load(storage, chat_id, period)
+    logged = eaten["logged"]
+    # Rolling average over logged days only: sum(kcal) / count(logged days) per 28-day window
+    rolling_kcal = rolling_mean(eaten["calories"], 28)
+    rolling_logged = rolling_mean(logged, 28)
+
+    lines = [f"📈 *Trend, last {weeks} weeks* (target {targets['calories']:.0f} kcal)"]
+    for week in range(weeks):
+        start, end = week * 7, week * 7 + 7
+        seen = logged[start:end]
+        if not sum(seen) and not sum(burned["logged"][start:end]):
+            lines.append(f"- {period[start]}: nothing logged")
+            continue
+        eaten_avg = _mean(eaten["calories"][start:end], seen)
+        burned_avg = _mean(burned["calories"][start:end])
+        four_weeks = rolling_kcal[end - 1] / rolling_logged[end - 1] if rolling_logged[end - 1] else 0.0
+        lines.append(
+            f"- {period[start]}: {eaten_avg:.0f} in, {burned_avg:.0f} out, "
+            f"net {eaten_avg - burned_avg:.0f} kcal/day (4-week avg in: {four_weeks:.0f})"
+        )
+    return "\n".join(lines)
+
+
+# --- Command handlers (both bots) ---
+def send_report(update, build):
+    try:
+        chat_id = update.message.chat_id
+        update.message.reply_text(build(chat_id, profiles.get(chat_id)), parse_mode="Markdown")
+    except Exception as e:
+        logging.exception("Failed to build the report")
+        update.message.reply_text(f"❌ Could not build the report. Error: {str(e)}")
+
+
+def week(update, context):
+    send_report(update, lambda chat_id, targets: period_report(storage, chat_id, 7, targets, "Last 7 days"))
+
+
+def month(update, context):
+    send_report(update, lambda chat_id, targets: period_report(storage, chat_id, 30, targets, "Last 30 days"))
+
+
+def trend(update, context):
+    send_report(update, lambda chat_id, targets: trend_report(storage, chat_id, targets))
@@ -0,0 +1,200 @@
+# === SHARED ASYNCIO RUNTIME ===
+# handle_message used to call asyncio.run(Runner.run(...)) inside the
+# python-telegram-bot dispatcher: a new event loop per message, and a
+# dispatcher worker blocked for the whole LLM + Sheets round trip.
+#
+# python-telegram-bot 13 is thread based, so the bots keep its dispatcher for
+# receiving updates, but all agent work now runs on one long-lived event loop
+# in a background thread. Handlers submit a coroutine and return at once.
+# Concurrency is bounded globally (MAX_CONCURRENCY agent runs at a time) and
+# per chat (one run per chat at a time, later messages wait their turn).
+#
+# A Coalescer collects the messages a chat sends in quick succession
+# ("swimming", "45 min", "moderate") and hands them over as one batch once the
+# chat has been quiet for COALESCE_SECONDS, so they cost one reply instead of
+# three. A batch that needs no more input (the workout is complete) is handed
+# over right away.
+#
+# stop() hands over the batches still waiting and lets the runs in flight
+# finish (for at most STOP_TIMEOUT seconds) before the loop stops, so a
+# restart doesn't drop messages that were already acknowledged to Telegram.
+import asyncio
+import logging
+import os
+import threading
+import time
+
+import metrics
+
+MAX_CONCURRENCY = int(os.getenv("AGENT_MAX_CONCURRENCY", "32"))
+COALESCE_SECONDS = float(os.getenv("COALESCE_SECONDS", "1.0"))
+COALESCE_MAX_SECONDS = float(os.getenv("COALESCE_MAX_SECONDS", "3.0"))
+STOP_TIMEOUT = float(os.getenv("STOP_TIMEOUT", "30"))
+
+
+class AsyncRuntime:
+    def __init__(self, max_concurrency=MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self._loop = None
+        self._thread = None
+        self._started = threading.Lock()
+        self._slots = None       # asyncio.Semaphore, created on the loop
+        self._chat_locks = {}    # chat id -> [asyncio.Lock, number of runs holding/waiting]
+        self._idle = threading.Condition()
+        self._in_flight = 0      # submitted runs that haven't finished yet
+        self._coalescers = []    # Coalescers feeding this runtime, flushed on stop
+
+    @property
+    def loop(self):
+        self.start()
+        return self._loop
+
+    def start(self):
+        with self._started:
+            if self._loop is not None:
+                return
+            self._loop = asyncio.new_event_loop()
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run_loop, args=(ready,), name="agent-loop", daemon=True)
+            self._thread.start()
+            ready.wait()
+
+    def _run_loop(self, ready):
+        asyncio.set_event_loop(self._loop)
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._loop.call_soon(ready.set)
+        self._loop.run_forever()
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        """Flush waiting batches, wait up to `timeout` seconds for runs in flight, then stop."""
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._flush_coalescers(), self._loop).result()
+        if not self.wait_idle(timeout):
+            logging.warning("Stopping with %d agent run(s) still in flight after %.0fs", self._in_flight, timeout)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+
+    # --- Submitting work ---
+    def submit(self, chat_id, coro_factory):
+        """Schedule coro_factory() for this chat and return a concurrent.futures.Future.
+
+        The coroutine is created on the loop, after the chat's previous run finished.
+        """
+        submitted = time.perf_counter()
+        self._began()
+        try:
+            return asyncio.run_coroutine_threadsafe(self._run_for_chat(chat_id, coro_factory, submitted), self.loop)
+        except Exception:
+            self._finished()
+            raise
+
+    def wait_idle(self, timeout=None):
+        """Block until every submitted run has finished; returns False on timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._in_flight == 0, timeout)
+
+    def _began(self):
+        with self._idle:
+            self._in_flight += 1
+
+    def _finished(self):
+        with self._idle:
+            self._in_flight -= 1
+            if self._in_flight == 0:
+                self._idle.notify_all()
+
+    async def _flush_coalescers(self):
+        for coalescer in self._coalescers:
+            coalescer.flush_all()
+
+    def run(self, coro):
+        """Run a coroutine on the shared loop and wait for its result (for sync callers)."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    async def _run_for_chat(self, chat_id, coro_factory, submitted):
+        entry = self._chat_locks.setdefault(chat_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0], self._slots:
+                return await coro_factory()
+        except Exception:
+            logging.exception("Agent run for chat %s failed", chat_id)
+            raise
+        finally:
+            # Includes time spent waiting behind the chat's earlier messages
+            metrics.observe("agent_run_seconds", time.perf_counter() - submitted)
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._chat_locks[chat_id]  # no unbounded growth with many chats
+            self._finished()
+
+
+class Coalescer:
+    """Batches each chat's messages that arrive within `window` seconds of each other.
+
+    add() may be called from any thread. Once a chat has been quiet for `window`
+    seconds, or `max_wait` seconds after the first message of the batch,
+    on_batch(chat_id, items) runs on the chat's lane of the runtime, so the
+    batches of one chat are handled in order and never block other chats.
+    ready(chat_id, items), if given, is asked after every add (on the loop);
+    returning True hands the batch over at once instead of waiting.
+    """
+
+    def __init__(self, runtime, on_batch, window=COALESCE_SECONDS, max_wait=COALESCE_MAX_SECONDS, ready=None):
+        self.runtime = runtime
+        self.on_batch = on_batch
+        self.window = window
+        self.max_wait = max_wait
+        self.ready = ready
+        self._batches = {}  # chat id -> [first arrival, items, timer]; only touched on the loop
+        runtime._coalescers.append(self)
+
+    def add(self, chat_id, item):
+        if self.window <= 0:
+            self.runtime.submit(chat_id, lambda: self.on_batch(chat_id, [item]))
+            return
+        self.runtime._began()  # a waiting batch counts as in flight (see wait_idle)
+        self.runtime.loop.call_soon_threadsafe(self._add, chat_id, item)
+
+    def _add(self, chat_id, item):
+        loop = self.runtime.loop
+        now = loop.time()
+        batch = self._batches.get(chat_id)
+        if batch is None:
+            batch = self._batches[chat_id] = [now, [], None]
+        else:
+            batch[2].cancel()
+            self.runtime._finished()  # only the batch as a whole stays in flight
+        batch[1].append(item)
+        if self._is_ready(chat_id, batch[1]):
+            self._flush(chat_id)
+            return
+        delay = min(self.window, batch[0] + self.max_wait - now)
+        batch[2] = loop.call_later(max(delay, 0.0), self._flush, chat_id)
+
+    def _is_ready(self, chat_id, items):
+        if self.ready is None:
+            return False
+        try:
+            return self.ready(chat_id, items)
+        except Exception:
+            logging.exception("Coalescer ready check for chat %s failed; waiting for the window", chat_id)
+            return False
+
+    def flush_all(self):
+        """Hand over every waiting batch now (on the loop)."""
+        for chat_id, (_, _, timer) in list(self._batches.items()):
+            timer.cancel()
+            self._flush(chat_id)
+
+    def _flush(self, chat_id):
+        _, items, _ = self._batches.pop(chat_id)
+        self.runtime.submit(chat_id, lambda: self.on_batch(chat_id, items))
+        self.runtime._finished()
+
+
+# One runtime per process, shared by every agent running in it
+runtime = AsyncRuntime()
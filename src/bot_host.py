@@ -0,0 +1,117 @@
+# === MULTI-BOT HOST ===
+# Runs several agents in one process instead of one script per bot.
+# Each agent keeps its own Telegram token and handler set (its module's
+# create_updater()), while the event loop, the storage backend, the Sheets
+# and OpenAI clients and the caches are module-level singletons and are
+# therefore shared by every agent loaded here.
+#
+# Usage:
+#   python3 src/bot_host.py                      # all agents, long polling
+#   python3 src/bot_host.py nutrition fitness    # a selection
+#   python3 src/bot_host.py --webhook            # one embedded webhook server for all
+# In webhook mode WEBHOOK_BASE_URL (public https URL, optional for local
+# testing), WEBHOOK_SECRET (required with WEBHOOK_BASE_URL or a non-loopback
+# WEBHOOK_LISTEN), WEBHOOK_LISTEN (default 127.0.0.1) and WEBHOOK_PORT are
+# read from the environment.
+import argparse
+import importlib
+import logging
+import os
+import signal
+import threading
+
+from async_runtime import runtime
+from storage import storage
+from metrics_server import METRICS_PORT, MetricsServer
+
+# Agent name -> module exposing create_updater(); add future agents here
+AGENTS = {
+    "nutrition": "Nutrition_agent",
+    "fitness": "Fitness_agent",
+}
+
+
+def load_modules(names):
+    modules = {}
+    for name in names:
+        if name not in AGENTS:
+            raise SystemExit(f"Unknown agent '{name}'. Choose from: {', '.join(AGENTS)}")
+        modules[name] = importlib.import_module(AGENTS[name])
+    return modules
+
+
+def prewarm_in_background(modules):
+    # Import SDKs and open connections while polling/webhooks already start
+    for name, module in modules.items():
+        prewarm = getattr(module, "prewarm", None)
+        if prewarm is not None:
+            threading.Thread(target=prewarm, name=f"prewarm-{name}", daemon=True).start()
+
+
+def wait_for_shutdown():
+    # Updater.idle() only stops its own bot, so handle the signals here for all of them
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda signum, frame: stop.set())
+    stop.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run several agents in one process.")
+    parser.add_argument("agents", nargs="*", help=f"agents to run (default: all of {', '.join(AGENTS)})")
+    parser.add_argument("--webhook", action="store_true", help="receive updates via webhook instead of polling")
+    parser.add_argument("--prewarm", action="store_true", default=os.getenv("PREWARM", "0") == "1",
+                        help="load SDKs and open connections in the background at startup (or PREWARM=1)")
+    args = parser.parse_args(argv)
+    names = args.agents or list(AGENTS)
+    if args.webhook and os.getenv("WEBHOOK_BASE_URL") and not os.getenv("WEBHOOK_SECRET"):
+        parser.error("WEBHOOK_SECRET is required to register a public webhook URL")
+
+    logging.basicConfig(
+        level=logging.INFO,
+        filename="agents.log",
+        format="%(asctime)s - %(levelname)s - %(name)s - %(message)s"
+    )
+
+    modules = load_modules(names)
+    updaters = {name: module.create_updater() for name, module in modules.items()}
+    server = None
+    if args.webhook:
+        from webhook_server import WebhookServer
+        try:
+            server = WebhookServer(updaters)  # binds the port: fails before anything else starts
+        except RuntimeError as e:
+            parser.error(str(e))
+    runtime.start()
+    storage.start()
+    if args.prewarm:
+        prewarm_in_background(modules)
+    if server is not None:
+        if os.getenv("WEBHOOK_BASE_URL"):
+            server.set_webhooks(os.getenv("WEBHOOK_BASE_URL"))
+        server.start()
+    else:
+        for name, updater in updaters.items():
+            updater.start_polling()
+            logging.info("Started %s agent", name)
+    metrics_server = None
+    if server is None and METRICS_PORT:
+        # The webhook server already serves /metrics; polling mode needs its own port
+        metrics_server = MetricsServer()
+        metrics_server.start()
+    print(f"Running agents: {', '.join(updaters)}. Press Ctrl+C to stop.")
+
+    wait_for_shutdown()
+    if metrics_server is not None:
+        metrics_server.stop()
+    if server is not None:
+        server.stop()
+    else:
+        for updater in updaters.values():
+            updater.stop()
+    runtime.stop()
+    storage.stop()
+
+
+if __name__ == "__main__":
+    main()
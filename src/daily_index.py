@@ -0,0 +1,216 @@
+# === PER-DAY AGGREGATE INDEX ===
+# get_daily_summary used to download the whole sheet with get_all_values()
+# and re-parse every row ever logged just to sum today's entries.
+#
+# This keeps a small SQLite index next to the bots instead:
+#   - entries:      one row per sheet row (row number, chat, day, parsed values)
+#                   chat is the Telegram chat id column, so each user's reads
+#                   and resets only touch that user's rows
+#   - daily_totals: running sums per (sheet, chat, day, metric)
+#   - sync_state:   how many sheet rows (header included) the index covers
+# The sheet writer reports every append with its row numbers, so the index
+# stays current without reading the sheet. If rows show up that the index
+# has not seen (e.g. someone typed into the sheet), the missing part is read
+# incrementally from the last known row offset. /rebuild_index starts over.
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+
+import metrics
+
+INDEX_PATH = os.getenv("DAILY_INDEX_PATH", "daily_index.db")
+
+
+def parse_number(cell):
+    """Remove any non-numeric characters and return float."""
+    try:
+        return float(re.sub(r"[^\d.]", "", str(cell).strip()))
+    except ValueError:
+        return 0.0
+
+
+class DailyIndex:
+    def __init__(self, path=INDEX_PATH):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._metrics = {}  # sheet name -> {metric: column index}
+        self._chat_columns = {}  # sheet name -> column index of the chat id (None: not partitioned)
+        self._dirty = set()  # sheets that need an incremental sync before reading
+        with self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    sheet TEXT PRIMARY KEY,
+                    synced_rows INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS entries (
+                    sheet TEXT NOT NULL,
+                    row INTEGER NOT NULL,
+                    chat TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    vals TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS entries_row ON entries (sheet, row);
+                CREATE INDEX IF NOT EXISTS entries_day ON entries (sheet, chat, day);
+                CREATE TABLE IF NOT EXISTS daily_totals (
+                    sheet TEXT NOT NULL,
+                    chat TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    metric TEXT NOT NULL,
+                    total REAL NOT NULL,
+                    PRIMARY KEY (sheet, chat, day, metric)
+                );
+            """)
+
+    def register(self, sheet, metrics, chat_column=None):
+        """Declare which columns of `sheet` are summed, e.g. {"calories": 3}, and where the chat id is.
+
+        Rows without a chat id (written before per-user partitioning) are kept under chat "".
+        """
+        self._metrics[sheet] = metrics
+        self._chat_columns[sheet] = chat_column
+
+    # --- Reads ---
+    def synced_rows(self, sheet):
+        row = self._conn.execute("SELECT synced_rows FROM sync_state WHERE sheet = ?", (sheet,)).fetchone()
+        return row[0] if row else None
+
+    def totals(self, sheet, day, chat=""):
+        """Return {metric: total} for one day; every registered metric is present."""
+        totals = {metric: 0.0 for metric in self._metrics[sheet]}
+        with self._lock:
+            for metric, total in self._conn.execute(
+                "SELECT metric, total FROM daily_totals WHERE sheet = ? AND chat = ? AND day = ?",
+                (sheet, chat, day)
+            ):
+                totals[metric] = total
+        return totals
+
+    def totals_between(self, sheet, chat, first_day, last_day):
+        """Return {day: {metric: total}} for the days in [first_day, last_day] that have entries."""
+        days = {}
+        with self._lock:
+            for day, metric, total in self._conn.execute(
+                "SELECT day, metric, total FROM daily_totals WHERE sheet = ? AND chat = ? AND day BETWEEN ? AND ?",
+                (sheet, chat, first_day, last_day)
+            ):
+                days.setdefault(day, {})[metric] = total
+        return days
+
+    def rows_for_day(self, sheet, day, chat=None):
+        """Sheet row numbers (1-based) holding entries for `day`, ascending."""
+        query = "SELECT row FROM entries WHERE sheet = ? AND day = ?"
+        params = [sheet, day]
+        if chat is not None:
+            query += " AND chat = ?"
+            params.append(chat)
+        with self._lock:
+            return [r for (r,) in self._conn.execute(query + " ORDER BY row", params)]
+
+    def parse_row(self, sheet, row):
+        """(chat, day, {metric: value}) of one sheet row, as the index stores it."""
+        chat_column = self._chat_columns.get(sheet)
+        day = str(row[0]).strip()
+        chat = str(row[chat_column]).strip() if chat_column is not None and chat_column < len(row) else ""
+        vals = {m: parse_number(row[col]) if col < len(row) else 0.0 for m, col in self._metrics[sheet].items()}
+        return chat, day, vals
+
+    # --- Writes ---
+    def add_rows(self, sheet, start_row, rows):
+        """Record `rows` that were appended to the sheet starting at 1-based `start_row`."""
+        with self._lock:
+            synced = self.synced_rows(sheet)
+            if synced is None or start_row != synced + 1:
+                # The sheet grew behind our back (or was never indexed); read the gap on next use
+                self._dirty.add(sheet)
+                return
+            self._insert(sheet, start_row, rows)
+
+    def remove_rows(self, sheet, row_numbers):
+        """Forget deleted sheet rows and shift the rows below them up."""
+        with self._lock, self._conn:
+            affected = set()
+            for row_number in sorted(row_numbers, reverse=True):
+                found = self._conn.execute(
+                    "SELECT chat, day FROM entries WHERE sheet = ? AND row = ?", (sheet, row_number)
+                ).fetchone()
+                if found:
+                    affected.add(found)
+                    self._conn.execute("DELETE FROM entries WHERE sheet = ? AND row = ?", (sheet, row_number))
+                self._conn.execute("UPDATE entries SET row = row - 1 WHERE sheet = ? AND row > ?", (sheet, row_number))
+            self._conn.execute(
+                "UPDATE sync_state SET synced_rows = synced_rows - ? WHERE sheet = ?", (len(row_numbers), sheet)
+            )
+            # Re-sum the touched days from their remaining entries (avoids float drift from subtracting)
+            for chat, day in affected:
+                self._conn.execute(
+                    "DELETE FROM daily_totals WHERE sheet = ? AND chat = ? AND day = ?", (sheet, chat, day)
+                )
+                for (vals,) in self._conn.execute(
+                    "SELECT vals FROM entries WHERE sheet = ? AND chat = ? AND day = ?", (sheet, chat, day)
+                ).fetchall():
+                    self._add_totals(sheet, chat, day, json.loads(vals))
+
+    def _insert(self, sheet, start_row, rows):
+        # Caller holds self._lock
+        with self._conn:
+            for offset, row in enumerate(rows):
+                row_number = start_row + offset
+                if row_number == 1 or not row:
+                    continue  # header or blank line
+                chat, day, vals = self.parse_row(sheet, row)
+                self._conn.execute(
+                    "INSERT INTO entries (sheet, row, chat, day, vals) VALUES (?, ?, ?, ?, ?)",
+                    (sheet, row_number, chat, day, json.dumps(vals))
+                )
+                self._add_totals(sheet, chat, day, vals)
+            self._conn.execute(
+                "INSERT INTO sync_state (sheet, synced_rows) VALUES (?, ?) "
+                "ON CONFLICT (sheet) DO UPDATE SET synced_rows = excluded.synced_rows",
+                (sheet, start_row + len(rows) - 1)
+            )
+
+    def _add_totals(self, sheet, chat, day, vals):
+        for metric, value in vals.items():
+            self._conn.execute(
+                "INSERT INTO daily_totals (sheet, chat, day, metric, total) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (sheet, chat, day, metric) DO UPDATE SET total = total + excluded.total",
+                (sheet, chat, day, metric, value)
+            )
+
+    # --- Reconciliation with the sheet ---
+    def sync(self, sheet, worksheet):
+        """Read only the rows after the last indexed one (one API request) and index them."""
+        with self._lock:
+            synced = self.synced_rows(sheet) or 0
+            with metrics.span("sheets_read"):
+                rows = worksheet.get_values(f"A{synced + 1}:Z")
+            if rows:
+                self._insert(sheet, synced + 1, rows)
+            else:
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT OR IGNORE INTO sync_state (sheet, synced_rows) VALUES (?, ?)", (sheet, synced)
+                    )
+            self._dirty.discard(sheet)
+            return len(rows)
+
+    def ensure_synced(self, sheet, worksheet):
+        """Sync only if the sheet was never indexed or a gap was detected."""
+        if sheet in self._dirty or self.synced_rows(sheet) is None:
+            self.sync(sheet, worksheet)
+
+    def rebuild(self, sheet, worksheet):
+        """Drop everything known about `sheet` and index it again from row 1."""
+        with self._lock, self._conn:
+            for table in ("entries", "daily_totals", "sync_state"):
+                self._conn.execute(f"DELETE FROM {table} WHERE sheet = ?", (sheet,))
+        count = self.sync(sheet, worksheet)
+        logging.info("Rebuilt daily index for %s from %d rows", sheet, count)
+        return count
+
+
+# One index per process, shared by every agent running in it
+index = DailyIndex()
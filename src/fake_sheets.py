@@ -0,0 +1,73 @@
+# === IN-MEMORY GOOGLE SHEETS ===
+# Stand-ins for gspread's Worksheet/Spreadsheet that keep the cells in a list.
+# They implement exactly the calls the bots make (append_rows, get_values,
+# get_all_values, spreadsheet.batch_update with deleteDimension), with the
+# same row numbering and response shapes, so the writer, the daily index and
+# the storage layer run unchanged without Google credentials or quota.
+import re
+import threading
+
+
+class FakeSpreadsheet:
+    def __init__(self):
+        self._worksheets = {}  # sheet id -> FakeWorksheet
+        self.api_calls = 0
+
+    def worksheet(self, title):
+        for worksheet in self._worksheets.values():
+            if worksheet.title == title:
+                return worksheet
+        worksheet = FakeWorksheet(title, len(self._worksheets), self)
+        self._worksheets[worksheet.id] = worksheet
+        return worksheet
+
+    def batch_update(self, body):
+        self.api_calls += 1
+        for request in body.get("requests", []):
+            dimension = request["deleteDimension"]["range"]
+            worksheet = self._worksheets[dimension["sheetId"]]
+            with worksheet._lock:
+                del worksheet.rows[dimension["startIndex"]:dimension["endIndex"]]
+        return {"replies": [{} for _ in body.get("requests", [])]}
+
+
+class FakeWorksheet:
+    def __init__(self, title, sheet_id=0, spreadsheet=None, header=("date",)):
+        self.title = title
+        self.id = sheet_id
+        self.spreadsheet = spreadsheet or FakeSpreadsheet()
+        # Like the real logs, row 1 is a header and entries start on row 2
+        self.rows = [list(header)] if header else []
+        self._lock = threading.Lock()
+
+    def append_rows(self, values, **kwargs):
+        self.spreadsheet.api_calls += 1
+        with self._lock:
+            first = len(self.rows) + 1
+            # Sheets stores what it was sent as text when read back (formatted values)
+            self.rows.extend([["" if cell is None else str(cell) for cell in row] for row in values])
+            last = len(self.rows)
+        return {"updates": {"updatedRange": f"'{self.title}'!A{first}:Z{last}", "updatedRows": len(values)}}
+
+    def get_values(self, range_name=None, **kwargs):
+        """Rows of an A1 range like 'A12:Z', 'A2:Z40' or 'I2:I' (one column)."""
+        self.spreadsheet.api_calls += 1
+        with self._lock:
+            if not range_name:
+                return [list(row) for row in self.rows]
+            (first_col, first), (last_col, last) = re.findall(r"([A-Z]+)(\d*)", range_name)[:2]
+            first = int(first) if first else 1
+            last = int(last) if last else len(self.rows)
+            columns = slice(_column_index(first_col), _column_index(last_col) + 1)
+            return [list(row[columns]) for row in self.rows[first - 1:last]]
+
+    def get_all_values(self, **kwargs):
+        return self.get_values()
+
+
+def _column_index(letters):
+    """A1 column letters -> 0-based index (A -> 0, I -> 8, AA -> 26)."""
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord("A") + 1
+    return index - 1
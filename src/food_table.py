@@ -0,0 +1,155 @@
+# === LOCAL FOOD-COMPOSITION TABLE ===
+# Staple foods don't need an LLM: data/foods.csv is a snapshot of common
+# foods with macros per 100 g (and the weight of one piece where that makes
+# sense), in the spirit of the public USDA/NEVO composition tables. Foods
+# eaten as a share of a bigger whole (pizza, cake) have no piece weight, so
+# "1 pizza" is never logged as one slice.
+#
+# The table is loaded lazily on the first lookup into compact column arrays,
+# and names are matched through a character-trigram index so "bananas",
+# "strawbery" or "greek yoghurt" still find their row. Every word of the
+# query has to be found in the matched name too ("chocolate bar" is not
+# "dark chocolate"). Only confident matches with a quantity we can convert to
+# grams are answered locally; anything else falls through to the OpenAI call
+# in log_nutrition.
+import csv
+import os
+import threading
+from array import array
+from collections import Counter, defaultdict
+from itertools import chain
+
+from nutrition_cache import format_quantity, normalize_name
+
+FOODS_PATH = os.getenv("FOODS_PATH", os.path.join(os.path.dirname(__file__), "data", "foods.csv"))
+MIN_SCORE = float(os.getenv("FOODS_MIN_SCORE", "0.8"))
+# How close a query word must be to a word of the name ("yoghurt" ~ "yogurt")
+MIN_WORD_SCORE = 0.6
+
+# Household measures in grams, for foods that have no piece weight of their own
+MEASURE_GRAMS = {"tsp": 5.0, "tbsp": 15.0, "cup": 240.0, "glass": 250.0}
+
+# A serving of foods with lighter pieces isn't one piece ("grapes", "butter");
+# without a count those go to the LLM for a usual portion
+MIN_SERVING_PIECE_GRAMS = 30.0
+
+MACROS = ("calories", "fat", "carbs", "protein")
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def dice(a, b):
+    return 2.0 * len(a & b) / (len(a) + len(b))
+
+
+def covers(key, words):
+    """True if every query word (with its trigrams) has a close word in `key`."""
+    key_words = key.split()
+    return all(
+        word in key_words or any(dice(grams, trigrams(other)) >= MIN_WORD_SCORE for other in key_words)
+        for word, grams in words
+    )
+
+
+class FoodTable:
+    def __init__(self, path=FOODS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _load(self):
+        # Column arrays: one float per food, no per-row dicts
+        self.names = []
+        self.piece_g = array("f")
+        self.columns = {macro: array("f") for macro in MACROS}
+        self._exact = {}                    # normalized name/alias -> food id
+        self._keys = []                     # (normalized name/alias, food id, trigram count)
+        self._postings = defaultdict(list)  # trigram -> indices into self._keys
+
+        with open(self.path, newline="", encoding="utf-8") as f:
+            for food_id, row in enumerate(csv.DictReader(f)):
+                self.names.append(row["name"])
+                self.piece_g.append(float(row["piece_g"]) if row["piece_g"] else 0.0)
+                for macro in MACROS:
+                    self.columns[macro].append(float(row[macro]))
+                for alias in [row["name"]] + [a for a in row["aliases"].split(";") if a]:
+                    key = normalize_name(alias)
+                    if key in self._exact:
+                        continue
+                    self._exact[key] = food_id
+                    grams = trigrams(key)
+                    for gram in grams:
+                        self._postings[gram].append(len(self._keys))
+                    self._keys.append((key, food_id, len(grams)))
+        self._loaded = True
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self.names)
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._load()
+
+    def match(self, name, min_score=0.0):
+        """Return (food id, score) of the best fuzzy match for a normalized name, or (None, 0.0).
+
+        Keys that can't reach `min_score` are skipped before the word check: they
+        share fewer than min_score * n / (2 - min_score) of the query's n trigrams.
+        """
+        self._ensure_loaded()
+        if name in self._exact:
+            return self._exact[name], 1.0
+
+        grams = trigrams(name)
+        shared = Counter(chain.from_iterable(self._postings.get(gram, ()) for gram in grams))
+        needed = min_score * len(grams) / (2.0 - min_score)
+
+        words = [(word, trigrams(word)) for word in name.split()]
+        best_id, best_score = None, 0.0
+        for key_id, count in shared.items():
+            if count < needed:
+                continue
+            key, food_id, size = self._keys[key_id]
+            # Dice coefficient over trigram sets
+            score = 2.0 * count / (len(grams) + size)
+            if score > best_score and covers(key, words):
+                best_id, best_score = food_id, score
+        return best_id, best_score
+
+    def grams_for(self, food_id, query):
+        """Convert the query quantity to grams for this food, or None if we can't."""
+        if query.unit in ("g", "ml"):
+            return query.quantity  # liquids are close enough to 1 g/ml for logging
+        if query.unit in ("piece", "slice") and self.piece_g[food_id]:
+            return query.quantity * self.piece_g[food_id]
+        if query.unit == "serving" and self.piece_g[food_id] >= MIN_SERVING_PIECE_GRAMS:
+            return query.quantity * self.piece_g[food_id]
+        if query.unit in MEASURE_GRAMS:
+            return query.quantity * MEASURE_GRAMS[query.unit]
+        return None
+
+    def lookup(self, query, min_score=MIN_SCORE):
+        """Return an entry dict like the LLM produces, or None if there is no confident match."""
+        if not query.name:
+            return None
+        food_id, score = self.match(query.name, min_score)
+        if food_id is None or score < min_score:
+            return None
+        grams = self.grams_for(food_id, query)
+        if grams is None:
+            return None
+
+        entry = {"item": self.names[food_id], "quantity": format_quantity(query)}
+        for macro in MACROS:
+            entry[macro] = round(self.columns[macro][food_id] * grams / 100.0, 1)
+        return entry
+
+
+# One table per process, loaded on first use
+foods = FoodTable()
@@ -0,0 +1,127 @@
+# === MET CATALOG + WORKOUT MATCHER ===
+# One place for the activities the fitness bot knows. data/met_catalog.csv
+# holds compendium-style MET values (light/moderate/intense) per activity
+# plus its aliases, and is loaded once on first use.
+#
+# All aliases are compiled into a single trie-shaped regex, together with the
+# duration and intensity patterns, so one finditer pass over a message pulls
+# out activity, duration and intensity. Because shared prefixes are merged,
+# the cost per message depends on the message length, not on how many
+# activities the catalog has.
+import csv
+import os
+import re
+import threading
+from collections import namedtuple
+
+CATALOG_PATH = os.getenv("MET_CATALOG_PATH", os.path.join(os.path.dirname(__file__), "data", "met_catalog.csv"))
+
+INTENSITIES = ("light", "moderate", "intense")
+
+# Words users type -> canonical intensity
+INTENSITY_WORDS = {
+    "low": "light", "light": "light", "easy": "light",
+    "moderate": "moderate", "medium": "moderate",
+    "high": "intense", "intense": "intense", "hard": "intense", "vigorous": "intense",
+}
+
+# Units after a bare number that mean it is not a duration ("10000 steps", "20 laps")
+NOT_MINUTES = (
+    "km", "k", "mi", "miles?", "meters?", "metres?", "yards?", "yd", "kg", "lbs?", "pounds?",
+    "sets?", "reps?", "x", "times", "steps?", "laps?", "lengths?", "floors?", "rounds?", "kcal", "cal",
+    "calories", "bpm",
+)
+
+# Workout: canonical activity name, duration in minutes, intensity (each None if not found)
+Workout = namedtuple("Workout", "exercise_type duration intensity")
+
+
+def _trie_pattern(words):
+    """Build a regex matching any of `words`, with common prefixes merged (longest match first)."""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def walk(node):
+        end = "" in node
+        branches = [re.escape(char) + walk(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if end else body
+
+    return walk(trie)
+
+
+class MetCatalog:
+    def __init__(self, path=CATALOG_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._table = None
+
+    def _load(self):
+        table, aliases = {}, {}
+        with open(self.path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                name = row["activity"].strip().lower()
+                table[name] = {level: float(row[level]) for level in INTENSITIES}
+                for alias in [name] + [a for a in row["aliases"].split(";") if a]:
+                    aliases.setdefault(alias.strip().lower(), name)
+
+        self._aliases = aliases
+        self._pattern = re.compile(
+            # "2h", "1.5 hours", "2h30", "2h30m"
+            r"(?P<hours>\d+(?:[.,]\d+)?)\s*(?:hours?|hrs?|h)(?:(?P<and_minutes>\d{1,2})\s*(?:minutes?|mins?|m)?\b|\b)"
+            r"|(?P<minutes>\d+)\s*(?:minutes?|mins?|m)\b"
+            r"|(?P<sets>\d+\s*[x×*]\s*\d+)"  # "3x10 squats": sets and reps, not a duration
+            r"|(?P<number>\d+)(?![\d.,]|\s*(?:" + "|".join(NOT_MINUTES) + r")\b)"
+            r"|(?<![\w(])(?P<activity>" + _trie_pattern(aliases) + r")(?![\w)])"
+            r"|\b(?P<intensity>" + "|".join(INTENSITY_WORDS) + r")\b"
+        )
+        self._table = table
+
+    def _ensure_loaded(self):
+        if self._table is None:
+            with self._lock:
+                if self._table is None:
+                    self._load()
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self._table)
+
+    def activities(self):
+        self._ensure_loaded()
+        return list(self._table)
+
+    def met(self, exercise_type, intensity):
+        self._ensure_loaded()
+        return self._table[exercise_type][intensity]
+
+    def parse(self, text):
+        """Extract a Workout from free text in one regex pass."""
+        self._ensure_loaded()
+        exercise_type = hours = minutes = intensity = bare_number = None
+        for match in self._pattern.finditer(text.lower()):
+            kind = match.lastgroup
+            if kind == "activity" and exercise_type is None:
+                exercise_type = self._aliases[match.group("activity")]
+            elif kind == "minutes" and minutes is None:
+                minutes = int(match.group("minutes"))
+            elif kind in ("hours", "and_minutes") and hours is None:
+                hours = round(float(match.group("hours").replace(",", ".")) * 60) + int(match.group("and_minutes") or 0)
+            elif kind == "number" and bare_number is None:
+                bare_number = int(match.group("number"))
+            elif kind == "intensity" and intensity is None:
+                intensity = INTENSITY_WORDS[match.group("intensity")]
+        # "1 hour and 15 min" adds up; a number without unit ("45") is taken
+        # as minutes if nothing better was given
+        duration = (hours or 0) + (minutes or 0)
+        return Workout(exercise_type, duration or bare_number or None, intensity)
+
+
+# One catalog per process, loaded on first use
+catalog = MetCatalog()
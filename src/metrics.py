@@ -0,0 +1,101 @@
+# === IN-PROCESS METRICS ===
+# Tiny, dependency-free counters and latency samples shared by all agents.
+# Latencies keep the most recent SAMPLE_SIZE observations per name, which
+# is enough for p50/p90/p99 without growing with uptime.
+#
+# `with metrics.span("stage"):` times one stage of a message (recorded as
+# stage_seconds, failures counted as stage_errors_total). A span costs about
+# a microsecond, against messages that take tens of milliseconds at least.
+# prometheus_text() renders everything in the Prometheus text format; it is
+# served on /metrics (see metrics_server.py).
+import threading
+import time
+from collections import defaultdict, deque
+
+SAMPLE_SIZE = 2048
+
+_lock = threading.Lock()
+_counters = defaultdict(float)
+_samples = defaultdict(lambda: deque(maxlen=SAMPLE_SIZE))
+_observed = defaultdict(lambda: [0, 0.0])  # name -> [count, sum of seconds] over the whole uptime
+_gauges = {}  # name -> callable returning the current value
+
+
+def increment(name, amount=1):
+    with _lock:
+        _counters[name] += amount
+
+
+def observe(name, seconds):
+    """Record one duration (in seconds) for `name`."""
+    with _lock:
+        _samples[name].append(seconds)
+        totals = _observed[name]
+        totals[0] += 1
+        totals[1] += seconds
+
+
+class span:
+    """Time a block: `with metrics.span("sheets_append"):` records sheets_append_seconds."""
+    __slots__ = ("name", "started")
+
+    def __init__(self, name):
+        self.name = name
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name + "_seconds", time.perf_counter() - self.started)
+        if exc_type is not None:
+            increment(self.name + "_errors_total")
+        return False
+
+
+def gauge(name, read):
+    """Report read() as the current value of `name` whenever metrics are exported."""
+    _gauges[name] = read
+
+
+def percentiles(name, points=(50, 90, 99)):
+    """Return {"p50": seconds, ...} over the recent samples of `name` (empty if none)."""
+    with _lock:
+        values = sorted(_samples.get(name, ()))
+    if not values:
+        return {}
+    last = len(values) - 1
+    return {f"p{p}": values[min(last, round(last * p / 100))] for p in points}
+
+
+def snapshot():
+    """Counters plus count/sum/percentiles for every latency, for /stats style reporting."""
+    with _lock:
+        counters = dict(_counters)
+        observed = {name: tuple(v) for name, v in _observed.items()}
+    latencies = {}
+    for name, (count, total) in observed.items():
+        latencies[name] = {"count": count, "sum": total, **percentiles(name)}
+    return {"counters": counters, "latencies": latencies}
+
+
+def prometheus_text(prefix="bot_"):
+    """All counters, gauges and latency summaries in the Prometheus text exposition format."""
+    data = snapshot()
+    lines = []
+    for name, value in sorted(data["counters"].items()):
+        lines += [f"# TYPE {prefix}{name} counter", f"{prefix}{name} {value!r}"]
+    for name, read in sorted(_gauges.items()):
+        try:
+            value = float(read())
+        except Exception:
+            continue  # e.g. a queue that was already torn down
+        lines += [f"# TYPE {prefix}{name} gauge", f"{prefix}{name} {value!r}"]
+    for name, summary in sorted(data["latencies"].items()):
+        lines.append(f"# TYPE {prefix}{name} summary")
+        for point in ("p50", "p90", "p99"):
+            if point in summary:
+                lines.append(f'{prefix}{name}{{quantile="0.{point[1:]}"}} {summary[point]!r}')
+        lines += [f"{prefix}{name}_sum {summary['sum']!r}", f"{prefix}{name}_count {summary['count']}"]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,78 @@
+# === METRICS ENDPOINT ===
+# GET /metrics                  Prometheus text format (see metrics.py)
+# GET /debug/profile?seconds=N  sample all threads for N seconds, return the report
+# GET /debug/profile/start      start sampling in the background
+# GET /debug/profile/stop       stop sampling, return the report
+#
+# In webhook mode these paths are served by the webhook server itself. In
+# polling mode bot_host.py starts this small server when METRICS_PORT is set.
+# The profile endpoints are only enabled with PROFILE_ENDPOINTS=1, because
+# anyone who can reach the port can use them.
+import logging
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import metrics
+import profiler
+
+METRICS_LISTEN = os.getenv("METRICS_LISTEN", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+PROFILE_ENDPOINTS = os.getenv("PROFILE_ENDPOINTS", "0") == "1"
+
+TEXT = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def respond(path):
+    """Return (status, content type, body bytes) for a metrics/debug path, or None if not ours."""
+    url = urlsplit(path)
+    if url.path == "/metrics":
+        return 200, TEXT, metrics.prometheus_text().encode()
+    if not url.path.startswith("/debug/profile"):
+        return None
+    if not PROFILE_ENDPOINTS:
+        return 404, TEXT, b"Profiling endpoints are disabled (set PROFILE_ENDPOINTS=1).\n"
+    if url.path == "/debug/profile/start":
+        started = profiler.sampler.start()
+        return 200, TEXT, (b"Profiling started.\n" if started else b"A profile is already running.\n")
+    if url.path == "/debug/profile/stop":
+        return 200, TEXT, profiler.sampler.stop().encode()
+    if url.path == "/debug/profile":
+        try:
+            seconds = float(parse_qs(url.query).get("seconds", ["10"])[0])
+        except ValueError:
+            return 400, TEXT, b"seconds must be a number.\n"
+        return 200, TEXT, profiler.profile_for(seconds).encode()
+    return 404, TEXT, b"Not found.\n"
+
+
+def write_response(handler, response):
+    status, content_type, body = response
+    handler.send_response(status)
+    handler.send_header("Content-Type", content_type)
+    handler.send_header("Content-Length", str(len(body)))
+    handler.end_headers()
+    handler.wfile.write(body)
+
+
+class MetricsServer:
+    def __init__(self, listen=METRICS_LISTEN, port=METRICS_PORT):
+        self._httpd = ThreadingHTTPServer((listen, port), self._handler_class())
+
+    def _handler_class(self):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                write_response(self, respond(self.path) or (404, TEXT, b"Not found.\n"))
+
+            def log_message(self, fmt, *args):
+                logging.debug("metrics: " + fmt, *args)
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self._httpd.serve_forever, name="metrics-http", daemon=True).start()
+        logging.info("Metrics endpoint listening on %s:%s", *self._httpd.server_address[:2])
+
+    def stop(self):
+        self._httpd.shutdown()
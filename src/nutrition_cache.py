@@ -0,0 +1,243 @@
+# === NUTRITION LOOKUP CACHE ===
+# log_nutrition sent a fresh OpenAI completion for every message, even for
+# the "1 banana" or "2 eggs" that get logged every single day.
+#
+# Queries are normalized first (lowercase, quantity split off, units made
+# canonical, simple plurals folded), so "2 Eggs", "2 eggs" and "3 egg" all
+# hit the same entry. Macros are stored per unit and scaled to the quantity
+# asked for. Hot entries live in an in-memory LRU, everything else in a small
+# SQLite file with TTL and LRU eviction so the cache survives restarts.
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+CACHE_PATH = os.getenv("NUTRITION_CACHE_PATH", "nutrition_cache.db")
+MAX_ENTRIES = int(os.getenv("NUTRITION_CACHE_MAX_ENTRIES", "5000"))
+MEMORY_ENTRIES = 512
+TOUCH_BATCH = 64  # memory hits whose last_used is written to SQLite together
+TTL_SECONDS = float(os.getenv("NUTRITION_CACHE_TTL_DAYS", "90")) * 86400
+
+MACROS = ("calories", "fat", "carbs", "protein")
+
+# unit word -> (canonical unit, factor to convert into that unit)
+UNITS = {
+    "g": ("g", 1.0), "gr": ("g", 1.0), "gram": ("g", 1.0), "grams": ("g", 1.0),
+    "kg": ("g", 1000.0), "kilo": ("g", 1000.0), "kilogram": ("g", 1000.0), "kilograms": ("g", 1000.0),
+    "oz": ("g", 28.35), "ounce": ("g", 28.35), "ounces": ("g", 28.35),
+    "lb": ("g", 453.6), "lbs": ("g", 453.6), "pound": ("g", 453.6), "pounds": ("g", 453.6),
+    "ml": ("ml", 1.0), "milliliter": ("ml", 1.0), "milliliters": ("ml", 1.0),
+    "cl": ("ml", 10.0), "dl": ("ml", 100.0),
+    "l": ("ml", 1000.0), "liter": ("ml", 1000.0), "liters": ("ml", 1000.0), "litre": ("ml", 1000.0),
+    "tsp": ("tsp", 1.0), "teaspoon": ("tsp", 1.0), "teaspoons": ("tsp", 1.0),
+    "tbsp": ("tbsp", 1.0), "tablespoon": ("tbsp", 1.0), "tablespoons": ("tbsp", 1.0),
+    "cup": ("cup", 1.0), "cups": ("cup", 1.0),
+    "glass": ("glass", 1.0), "glasses": ("glass", 1.0),
+    "slice": ("slice", 1.0), "slices": ("slice", 1.0),
+    "piece": ("piece", 1.0), "pieces": ("piece", 1.0), "pc": ("piece", 1.0), "pcs": ("piece", 1.0),
+    "bowl": ("bowl", 1.0), "bowls": ("bowl", 1.0),
+    "serving": ("serving", 1.0), "servings": ("serving", 1.0),
+}
+
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10, "half": 0.5, "a half": 0.5,
+}
+
+_QUANTITY_RE = re.compile(
+    r"^(?P<num>\d+/\d+|\d+(?:[.,]\d+)?|(?:" + "|".join(sorted(NUMBER_WORDS, key=len, reverse=True)) + r")\b)\s*"
+    r"(?:(?P<unit>[a-z]+)\b\.?\s*)?(?:of\s+)?"
+)
+
+# Query: food name (normalized), quantity in `unit`, canonical unit ("piece" for plain counts,
+# "serving" when no quantity was given at all: "grapes" is a portion, not one grape)
+Query = namedtuple("Query", "name quantity unit")
+
+
+def _singular(word):
+    if len(word) <= 3 or word.endswith("ss"):
+        return word
+    if word.endswith("oes") or word.endswith("ies"):
+        return word[:-3] + ("o" if word.endswith("oes") else "y")
+    if word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def parse_query(text):
+    """Split '200 Grams of Chicken Breast' into Query('chicken breast', 200.0, 'g')."""
+    text = re.sub(r"[^\w\s./,]", " ", text.lower()).strip()
+    text = re.sub(r"\s+", " ", text)
+    quantity, unit = 1.0, "serving"
+
+    match = _QUANTITY_RE.match(text)
+    if match:
+        num = match.group("num")
+        if num in NUMBER_WORDS:
+            quantity = float(NUMBER_WORDS[num])
+        elif "/" in num:
+            top, bottom = num.split("/")
+            quantity = float(top) / float(bottom) if float(bottom) else 1.0
+        else:
+            quantity = float(num.replace(",", "."))
+        word = match.group("unit")
+        if word in UNITS:
+            unit, factor = UNITS[word]
+            quantity *= factor
+            text = text[match.end():]
+        else:
+            # No unit: the word after the number is already part of the food name
+            unit = "piece"
+            text = text[match.end("num"):].strip()
+            text = re.sub(r"^of\s+", "", text)
+
+    return Query(normalize_name(text), quantity, unit)
+
+
+def normalize_name(text):
+    """Lowercase a food name and fold simple plurals ('Boiled Potatoes' -> 'boiled potato')."""
+    return " ".join(_singular(w) for w in text.lower().split())
+
+
+def is_cacheable(query):
+    # Multi-item messages can't be scaled as one unit
+    return bool(query.name) and query.quantity > 0 and not re.search(r",| and | & |\+", query.name)
+
+
+def format_quantity(query):
+    amount = f"{query.quantity:g}"
+    if query.unit == "piece":
+        return amount
+    if query.unit in ("g", "ml"):
+        return f"{amount}{query.unit}"
+    return f"{amount} {query.unit}"
+
+
+class NutritionCache:
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+        self._memory = OrderedDict()  # key -> (item, per-unit macros dict, tokens, created)
+        self._touched = {}  # key -> last memory hit not yet written to SQLite
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS nutrition_cache (
+                    key TEXT PRIMARY KEY,
+                    item TEXT NOT NULL,
+                    calories REAL, fat REAL, carbs REAL, protein REAL,
+                    tokens INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS nutrition_cache_lru ON nutrition_cache (last_used)")
+
+    @staticmethod
+    def _key(query):
+        return f"{query.name}|{query.unit}"
+
+    def get(self, query):
+        """Return a scaled entry dict (item, quantity, calories, fat, carbs, protein) or None."""
+        if not is_cacheable(query):
+            return None
+        key = self._key(query)
+        now = time.time()
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None:
+                # Hot entries must not look cold to the SQLite eviction
+                self._touched[key] = now
+                if len(self._touched) >= TOUCH_BATCH:
+                    with self._conn:
+                        self._write_touched()
+            else:
+                cached = self._load(key, now)
+            if cached is not None and now - cached[3] > self.ttl:
+                self._drop(key)
+                cached = None
+            if cached is None:
+                self.misses += 1
+                return None
+            self._memory[key] = cached
+            self._memory.move_to_end(key)
+            self._trim_memory()
+            self.hits += 1
+            self.tokens_saved += cached[2]
+
+        item, per_unit = cached[0], cached[1]
+        entry = {"item": item, "quantity": format_quantity(query)}
+        for macro in MACROS:
+            entry[macro] = round(per_unit[macro] * query.quantity, 1)
+        return entry
+
+    def put(self, query, entry, tokens=0):
+        """Store an LLM answer for `query`; macros are kept per unit of the query's quantity."""
+        if not is_cacheable(query):
+            return
+        key = self._key(query)
+        per_unit = {macro: float(entry[macro]) / query.quantity for macro in MACROS}
+        now = time.time()
+        with self._lock, self._conn:
+            self._memory[key] = (entry["item"], per_unit, tokens, now)
+            self._memory.move_to_end(key)
+            self._trim_memory()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO nutrition_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, entry["item"], *(per_unit[m] for m in MACROS), tokens, now, now)
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM nutrition_cache").fetchone()[0]
+            if count > self.max_entries:
+                self._write_touched()
+                self._conn.execute(
+                    "DELETE FROM nutrition_cache WHERE key IN "
+                    "(SELECT key FROM nutrition_cache ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "tokens_saved": self.tokens_saved,
+            "memory_entries": len(self._memory),
+        }
+
+    # Caller holds self._lock for the helpers below
+    def _load(self, key, now):
+        row = self._conn.execute(
+            "SELECT item, calories, fat, carbs, protein, tokens, created FROM nutrition_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        with self._conn:
+            self._conn.execute("UPDATE nutrition_cache SET last_used = ? WHERE key = ?", (now, key))
+        return (row[0], dict(zip(MACROS, row[1:5])), row[5], row[6])
+
+    def _write_touched(self):
+        # ... and an open transaction
+        self._conn.executemany("UPDATE nutrition_cache SET last_used = ? WHERE key = ?",
+                               [(now, key) for key, now in self._touched.items()])
+        self._touched.clear()
+
+    def _drop(self, key):
+        self._memory.pop(key, None)
+        self._touched.pop(key, None)
+        with self._conn:
+            self._conn.execute("DELETE FROM nutrition_cache WHERE key = ?", (key,))
+
+    def _trim_memory(self):
+        while len(self._memory) > MEMORY_ENTRIES:
+            self._memory.popitem(last=False)
+
+
+# One cache per process, shared by every agent running in it
+cache = NutritionCache()
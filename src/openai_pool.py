@@ -0,0 +1,165 @@
+# === SHARED OPENAI CLIENT ===
+# One AsyncOpenAI client per process, used by our own completions and (via
+# set_default_openai_client) by the Agents SDK, so every OpenAI request goes
+# over the same pool of keep-alive connections instead of a new TLS
+# handshake per client.
+#
+# Every request made through that client first takes a slot from a token
+# bucket sized to our quota (OPENAI_RPM requests and OPENAI_TPM tokens per
+# minute). Requests wait in line instead of running into 429s. Tokens are
+# estimated from the request body plus OPENAI_COMPLETION_TOKENS for the reply.
+#
+# single_flight.do(key, factory) lets concurrent callers with the same key
+# (e.g. several chats sending "1 apple" at once) share one request.
+#
+# Metrics: openai_rate_wait_seconds, openai_request_seconds (until response
+# headers), openai_quota_errors_total, openai_coalesced_total and the
+# openai_rate_queue_depth gauge.
+import asyncio
+import logging
+import os
+import threading
+import time
+import weakref
+
+import metrics
+
+OPENAI_RPM = int(os.getenv("OPENAI_RPM", "500"))
+OPENAI_TPM = int(os.getenv("OPENAI_TPM", "60000"))
+OPENAI_COMPLETION_TOKENS = int(os.getenv("OPENAI_COMPLETION_TOKENS", "400"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_KEEPALIVE_SECONDS = float(os.getenv("OPENAI_KEEPALIVE_SECONDS", "120"))
+
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.per_second = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def delay(self, amount):
+        """Seconds until `amount` is available (0 if it is available now)."""
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.per_second)
+        self.updated = now
+        missing = min(amount, self.capacity) - self.level
+        return missing / self.per_second if missing > 0 else 0.0
+
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    def __init__(self, rpm=OPENAI_RPM, tpm=OPENAI_TPM):
+        self._requests = TokenBucket(rpm)
+        self._tokens = TokenBucket(tpm)
+        self._turn = None  # first come, first served; an asyncio.Lock of the running loop
+        self._loop = None
+        self.waiting = 0
+
+    def _lock(self):
+        # Created on first use: a lock made at import time would belong to no
+        # loop (or the wrong one) once the runtime starts its own
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._turn, self._loop = asyncio.Lock(), loop
+        return self._turn
+
+    async def acquire(self, tokens):
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            async with self._lock():
+                while True:
+                    wait = max(self._requests.delay(1), self._tokens.delay(tokens))
+                    if wait <= 0:
+                        break
+                    await asyncio.sleep(wait)
+                self._requests.take(1)
+                self._tokens.take(tokens)
+        finally:
+            self.waiting -= 1
+            metrics.observe("openai_rate_wait_seconds", time.perf_counter() - started)
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}  # key -> asyncio.Task running the shared call
+
+    async def do(self, key, coro_factory):
+        """Await coro_factory() once for all concurrent callers with `key`; returns (result, shared).
+
+        shared is False for the caller that actually ran it. A caller that gives up
+        (timeout, cancellation) doesn't cancel the call for the others.
+        """
+        task = self._calls.get(key)
+        shared = task is not None
+        if shared:
+            metrics.increment("openai_coalesced_total")
+        else:
+            task = asyncio.ensure_future(coro_factory())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task), shared
+
+    def _finished(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled() and task.exception() is not None:
+            logging.debug("Shared OpenAI call %r failed: %s", key, task.exception())
+
+
+limiter = RateLimiter()
+single_flight = SingleFlight()
+metrics.gauge("openai_rate_queue_depth", lambda: limiter.waiting)
+
+_started = weakref.WeakKeyDictionary()  # httpx request -> perf_counter when it was sent
+
+
+async def _before_request(request):
+    try:
+        prompt_tokens = len(request.content) // 4  # ~4 bytes of JSON per token
+    except Exception:
+        prompt_tokens = 0  # streaming request body
+    await limiter.acquire(prompt_tokens + OPENAI_COMPLETION_TOKENS)
+    _started[request] = time.perf_counter()
+
+
+async def _after_response(response):
+    started = _started.pop(response.request, None)
+    if started is not None:
+        metrics.observe("openai_request_seconds", time.perf_counter() - started)
+    if response.status_code == 429:
+        metrics.increment("openai_quota_errors_total")
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The process-wide AsyncOpenAI client (created, and the SDK imported, on first use)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            import httpx
+            import openai
+
+            http_client = openai.DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+                    keepalive_expiry=OPENAI_KEEPALIVE_SECONDS,
+                ),
+                event_hooks={"request": [_before_request], "response": [_after_response]},
+            )
+            _client = openai.AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY_HW"), http_client=http_client)
+        return _client
+
+
+def use_for_agents():
+    """Make the Agents SDK send its model calls through the shared client too."""
+    from agents import set_default_openai_client
+
+    set_default_openai_client(get_client(), use_for_tracing=False)
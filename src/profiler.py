@@ -0,0 +1,96 @@
+# === SAMPLING PROFILER ===
+# Answers "where does the time go" in a running bot without restarting it.
+# cProfile only sees the thread that enabled it and slows every call down;
+# this sampler instead looks at the stacks of all threads (dispatcher, agent
+# loop, sheet writer, webhook workers) every SAMPLE_INTERVAL seconds and
+# counts which functions were on them. Nothing runs while it is off.
+#
+# Toggle it at runtime over HTTP (see metrics_server.py):
+#   curl 'http://localhost:8080/debug/profile?seconds=30'
+import collections
+import os
+import sys
+import threading
+import time
+
+SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+MAX_SECONDS = 300
+
+
+class Sampler:
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._samples = 0
+        self._own = collections.Counter()        # function -> samples where it was running
+        self._cumulative = collections.Counter()  # function -> samples where it was on the stack
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        """Start sampling all threads; returns False if a profile is already running."""
+        with self._lock:
+            if self._thread is not None:
+                return False
+            self._samples = 0
+            self._own.clear()
+            self._cumulative.clear()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self, top=25):
+        """Stop sampling and return a text report of the `top` hottest functions."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+        return self.report(top)
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            self._samples += 1
+            for thread_id, frame in frames.items():
+                if thread_id == me:
+                    continue
+                self._own[_describe(frame)] += 1
+                seen = set()
+                while frame is not None:
+                    name = _describe(frame)
+                    if name not in seen:
+                        seen.add(name)
+                        self._cumulative[name] += 1
+                    frame = frame.f_back
+
+    def report(self, top=25):
+        samples = max(self._samples, 1)
+        lines = [f"{self._samples} samples every {self.interval * 1000:.1f} ms (all threads)", "",
+                 "cumulative  own  function"]
+        for name, count in self._cumulative.most_common(top):
+            lines.append(f"{count / samples:9.1%} {self._own[name] / samples:5.1%}  {name}")
+        return "\n".join(lines) + "\n"
+
+
+def _describe(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def profile_for(seconds):
+    """Sample for `seconds` (capped at MAX_SECONDS) and return the report; blocks the caller."""
+    if not sampler.start():
+        return "A profile is already running.\n"
+    time.sleep(min(max(seconds, 0.1), MAX_SECONDS))
+    return sampler.stop()
+
+
+# One sampler per process
+sampler = Sampler()
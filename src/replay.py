@@ -0,0 +1,330 @@
+# === RECORD / REPLAY HARNESS ===
+# Feeds a recorded conversation through the real handlers of both bots,
+# offline and repeatably, to see what a change does to latency, API calls
+# and memory before it meets real users:
+#
+#   - updates go through each bot's dispatcher (create_updater), as in production;
+#   - replies go to a fake bot that records them instead of calling Telegram;
+#   - storage is the in-memory backend (fake_sheets.py) and every local file
+#     (index, journal, cache, profiles) lives in a temporary directory;
+#   - record_meal completions are replayed from a recordings file (keyed by the
+#     meal as sent, one item or a list of items); a meal without a recording is
+#     answered as one item with a fixed placeholder estimate;
+#   - the agent loop is replaced by ReplayRunner, which passes the message
+#     straight to the bot's logging tool. Free-form agent turns need the live
+#     model, so they are not part of a replay.
+#
+# The recording is repeated for --users simulated users (each with its own
+# chat id), one recorded message per round for all users at once. Reported:
+# latency per handler (dispatch until the chat's last reply), OpenAI / Sheets
+# / Telegram calls per message and peak RSS. --trace-memory adds the Python
+# memory retained per simulated user (tracemalloc), but slows the run down
+# several times, so don't compare its latencies with a normal run.
+#
+#   python replay.py data/replay_session.jsonl --completions data/replay_completions.json --users 200
+#
+# Recording format, one update per line: either a Telegram update as posted
+# to the webhook, {"bot": "nutrition", "update": {...}}, or the short form
+# {"bot": "fitness", "chat": 1, "text": "swimming 45 minutes"}. A burst of
+# messages sent back to back is {"bot": "fitness", "texts": ["swimming", "45 min"]};
+# its latency is measured from the last message.
+import argparse
+import asyncio
+import copy
+import importlib
+import json
+import os
+import re
+import resource
+import tempfile
+import threading
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import metrics
+
+BOT_MODULES = {"nutrition": "Nutrition_agent", "fitness": "Fitness_agent"}
+TOOLS = {"nutrition": "log_nutrition", "fitness": "log_exercise"}
+FIRST_CHAT_ID = 100000
+PLACEHOLDER_ITEM = {"quantity": "1", "calories": 100, "fat": 5, "carbs": 10, "protein": 5}
+
+
+# --- Fakes ---
+class ReplayOpenAI:
+    """Just enough of AsyncOpenAI for stream_items: chat.completions.create(stream=True)."""
+
+    def __init__(self, completions, latency=0.0, chunk_size=24):
+        self.completions = completions  # meal as sent -> recorded item dict (or list of them)
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.calls = 0
+        self.unrecorded = set()
+        self.chat = SimpleNamespace(completions=self)
+
+    async def create(self, messages, **kwargs):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        meal = re.search(r"^Meal: (.+)$", messages[-1]["content"], re.MULTILINE).group(1)
+        recorded = self.completions.get(meal)
+        if recorded is None:
+            self.unrecorded.add(meal)
+            recorded = {"item": meal, **PLACEHOLDER_ITEM}
+        items = recorded if isinstance(recorded, list) else [recorded]
+        return self._stream(json.dumps({"items": items}))
+
+    async def _stream(self, arguments):
+        # Same chunk shapes as a streamed tool call, ending with the usage chunk
+        for start in range(0, len(arguments), self.chunk_size):
+            call = SimpleNamespace(function=SimpleNamespace(arguments=arguments[start:start + self.chunk_size]))
+            delta = SimpleNamespace(tool_calls=[call], content=None)
+            yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=delta)])
+        yield SimpleNamespace(usage=SimpleNamespace(total_tokens=len(arguments) // 4), choices=[])
+
+
+class ReplayRunner:
+    """Stands in for agents.Runner: hands the whole message to the bot's logging tool."""
+
+    def __init__(self, tool):
+        self.tool = tool
+        self.runs = 0
+
+    async def run(self, agent, input, context=None):
+        self.runs += 1
+        return SimpleNamespace(final_output=await self.tool(SimpleNamespace(context=context), input))
+
+
+class ReplayBot:
+    """Receives the bot's replies (send_message / edit_text) instead of Telegram."""
+
+    # Read by python-telegram-bot itself: CommandHandler matches "/cmd@username",
+    # Message.reply_text looks at the bot's defaults
+    username = "replay_bot"
+    defaults = None
+
+    def __init__(self):
+        self.calls = 0
+        self.last_reply = {}  # chat id -> perf_counter of the latest reply or edit
+        self._lock = threading.Lock()
+
+    def send_message(self, chat_id, text, *args, **kwargs):
+        self._record(chat_id)
+        return SimpleNamespace(edit_text=lambda *a, **kw: self._record(chat_id))
+
+    def _record(self, chat_id):
+        with self._lock:
+            self.calls += 1
+            self.last_reply[chat_id] = time.perf_counter()
+
+
+# --- Recordings ---
+def load_recording(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def make_update(update_id, chat_id, text):
+    """A minimal private-chat text update, as Telegram would post it."""
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private"},
+        "from": {"id": chat_id, "is_bot": False, "first_name": "Replay"},
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
+
+
+def message_count(record):
+    return len(record.get("texts", ())) or 1
+
+
+def for_user(record, chat_id, first_update_id):
+    """The recorded update(s) as sent by one simulated user."""
+    if "texts" in record:
+        return [make_update(first_update_id + i, chat_id, text) for i, text in enumerate(record["texts"])]
+    if "update" not in record:
+        return [make_update(first_update_id, chat_id, record["text"])]
+    data = copy.deepcopy(record["update"])
+    data["update_id"] = first_update_id
+    message = data["message"]
+    message["chat"]["id"] = chat_id
+    if "from" in message:
+        message["from"]["id"] = chat_id
+    return [data]
+
+
+def handler_name(record, data):
+    if "texts" in record:
+        return f"{record['bot']}:burst"
+    text = data["message"].get("text") or ""
+    command = text.split()[0].split("@")[0] if text.startswith("/") else "message"
+    return f"{record['bot']}:{command}"
+
+
+# --- Replay ---
+def setup(completions, openai_latency):
+    """Point every local file at a temp dir, import the bots and install the fakes."""
+    workdir = tempfile.mkdtemp(prefix="bot-replay-")
+    for name, filename in [("DAILY_INDEX_PATH", "daily_index.db"), ("SHEET_JOURNAL_DIR", "sheet_journal"),
+                           ("NUTRITION_CACHE_PATH", "nutrition_cache.db"), ("USER_PROFILES_PATH", "user_profiles.db"),
+                           ("STORAGE_PATH", "bot_storage.db")]:
+        os.environ[name] = os.path.join(workdir, filename)
+    os.environ["STORAGE_BACKEND"] = "memory"
+    os.environ.pop("FITNESS_STATE_DB", None)
+    os.environ["TELEGRAM_BOT_TOKEN"] = os.environ["TELEGRAM_BOT_TOKEN_NUTRITION"] = "123456:replay"
+
+    import openai_pool
+    openai_pool._client = ReplayOpenAI(completions, openai_latency)
+
+    bots = {}
+    for bot, module_name in BOT_MODULES.items():
+        module = importlib.import_module(module_name)
+        runner = ReplayRunner(getattr(module, TOOLS[bot]))
+        module._agent, module.get_runner = object(), lambda runner=runner: runner  # no SDK needed
+        bots[bot] = SimpleNamespace(module=module, updater=module.create_updater(), runner=runner,
+                                    telegram=ReplayBot())
+    return bots, openai_pool._client
+
+
+def replay(records, users, bots):
+    """Play `records` for `users` simulated users; returns {handler: [latency seconds]} and replies missed."""
+    from telegram import Update
+    from async_runtime import runtime
+
+    latencies, missed = {}, 0
+    update_id = 0
+    for record in records:
+        bot = bots[record["bot"]]
+        dispatched = []
+        for user in range(users):
+            chat_id = FIRST_CHAT_ID + user
+            updates = for_user(record, chat_id, update_id + 1)
+            update_id += len(updates)
+            for data in updates:
+                sent = time.perf_counter()
+                bot.updater.dispatcher.process_update(Update.de_json(data, bot.telegram))
+            dispatched.append((chat_id, handler_name(record, updates[-1]), sent))
+        runtime.wait_idle()
+        for chat_id, name, sent in dispatched:
+            replied = bot.telegram.last_reply.get(chat_id, 0.0)
+            if replied < sent:
+                missed += 1
+                continue
+            latencies.setdefault(name, []).append(replied - sent)
+            metrics.observe(f"replay_{name.replace(':', '_').replace('/', '')}_seconds", replied - sent)
+    return latencies, missed
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, round((len(values) - 1) * p / 100))]
+
+
+def build_report(latencies, missed, messages, users, seconds, bots, openai, sheets_calls, memory):
+    telegram_calls = sum(b.telegram.calls for b in bots.values())
+    return {
+        "messages": messages,
+        "users": users,
+        "seconds": seconds,
+        "replies_missed": missed,
+        "handlers": {
+            name: {"count": len(values), "p50_ms": _percentile(values, 50) * 1000,
+                   "p90_ms": _percentile(values, 90) * 1000, "max_ms": max(values) * 1000}
+            for name, values in sorted(latencies.items())
+        },
+        "calls_per_message": {
+            "openai": openai.calls / messages,
+            "sheets": sheets_calls / messages,
+            "telegram": telegram_calls / messages,
+            "agent_runs": sum(b.runner.runs for b in bots.values()) / messages,
+        },
+        "coalesced_messages": int(metrics.snapshot()["counters"].get("fitness_coalesced_messages_total", 0)),
+        "unrecorded_items": sorted(openai.unrecorded),
+        "memory": memory,
+    }
+
+
+def format_report(report):
+    lines = [
+        f"Replayed {report['messages']} messages for {report['users']} users in {report['seconds']:.2f}s "
+        f"({report['messages'] / max(report['seconds'], 1e-9):.0f} msg/s)",
+        "",
+        f"{'handler':<28}{'count':>7}{'p50 ms':>10}{'p90 ms':>10}{'max ms':>10}",
+    ]
+    for name, row in report["handlers"].items():
+        lines.append(f"{name:<28}{row['count']:>7}{row['p50_ms']:>10.1f}{row['p90_ms']:>10.1f}{row['max_ms']:>10.1f}")
+    calls = report["calls_per_message"]
+    lines += [
+        "",
+        f"Calls per message: OpenAI {calls['openai']:.3f}, Sheets {calls['sheets']:.3f}, "
+        f"Telegram {calls['telegram']:.2f}, agent runs {calls['agent_runs']:.3f}",
+        f"Quick follow-ups answered together: {report['coalesced_messages']}",
+        f"Memory: {report['memory']['max_rss_bytes'] / 1e6:.1f} MB peak RSS",
+    ]
+    if "per_user_bytes" in report["memory"]:
+        lines.append(f"Python memory: {report['memory']['traced_peak_bytes'] / 1e6:.1f} MB peak, "
+                     f"~{report['memory']['per_user_bytes'] / 1e3:.1f} KB retained per simulated user")
+    if report["replies_missed"]:
+        lines.append(f"⚠️ {report['replies_missed']} messages got no reply")
+    if report["unrecorded_items"]:
+        lines.append(f"Placeholder estimates (no recorded completion): {', '.join(report['unrecorded_items'])}")
+    return "\n".join(lines)
+
+
+def run(records, completions, users=1, openai_latency=0.0, trace_memory=False):
+    """Set up the fakes, replay `records` for `users` simulated users and return the report."""
+    if trace_memory:
+        tracemalloc.start()
+    bots, openai = setup(completions, openai_latency)
+    from storage import storage
+    from async_runtime import runtime
+
+    runtime.start()
+    storage.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    try:
+        latencies, missed = replay(records, users, bots)
+    finally:
+        seconds = time.perf_counter() - started
+        storage.stop()  # flushes the queued rows, so their Sheets calls are counted
+        runtime.stop()
+    memory = {"max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}  # KB on Linux
+    if trace_memory:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        memory.update(traced_peak_bytes=peak, per_user_bytes=max(current - baseline, 0) / max(users, 1))
+    return build_report(latencies, missed, sum(map(message_count, records)) * users, users, seconds, bots, openai,
+                        storage._spreadsheet.api_calls, memory)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded Telegram updates through both bots, offline.")
+    parser.add_argument("recording", help="JSONL file with one recorded update per line")
+    parser.add_argument("--completions", help="JSON file mapping meals to recorded record_meal items")
+    parser.add_argument("--users", type=int, default=1, help="simulated users, each replaying the recording")
+    parser.add_argument("--openai-latency", type=float, default=0.0,
+                        help="seconds each replayed completion takes (default: instant)")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="measure Python memory per user with tracemalloc (slow; skews latencies)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--metrics", action="store_true", help="also print all metrics (Prometheus format)")
+    args = parser.parse_args(argv)
+
+    records = load_recording(args.recording)
+    completions = {}
+    if args.completions:
+        with open(args.completions, encoding="utf-8") as f:
+            completions = json.load(f)
+    report = run(records, completions, args.users, args.openai_latency, args.trace_memory)
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+    if args.metrics:
+        print(metrics.prometheus_text())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,409 @@
+# === WRITE-BEHIND QUEUE FOR SHEET APPENDS ===
+# Tools used to call sheet.append_row synchronously, so the user waited on a
+# Sheets write and bursts of meals ran into the per-minute write quota.
+#
+# Rows are now written to a local journal first (the tool can reply right
+# away) and a background thread flushes them with one append_rows call per
+# worksheet once BATCH_SIZE rows are waiting or FLUSH_INTERVAL seconds passed.
+# Rows stay in the journal until Sheets confirmed them, so a crash, restart
+# or Sheets outage does not lose entries: they are re-queued on the next start.
+#
+# The journal is a directory with one subdirectory per sheet, each holding
+# append-only JSONL segment files: entry lines ({"id", "sheet", "row"}) and
+# confirmation lines ({"ack": [ids]}). Nothing is rewritten; a segment is
+# deleted once every entry in it (and in all older segments) was confirmed.
+# Threads that enqueue at the same time share one fsync (group commit). A
+# sheet's journal is opened when the sheet is registered, so the two bots
+# running as separate processes never read or delete each other's segments.
+#
+# Every entry has an id. Sheets registered with an id column get it written
+# next to the row, so a batch whose append may have landed without being
+# confirmed (a timeout, a crash) is checked against the sheet before it is
+# sent again: ids that are already there are not appended twice.
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import uuid
+
+import metrics
+
+JOURNAL_DIR = os.getenv("SHEET_JOURNAL_DIR", "sheet_journal")
+SEGMENT_BYTES = int(os.getenv("SHEET_JOURNAL_SEGMENT_BYTES", str(1 << 20)))
+BATCH_SIZE = int(os.getenv("SHEET_BATCH_SIZE", "20"))
+FLUSH_INTERVAL = float(os.getenv("SHEET_FLUSH_INTERVAL", "5"))
+MAX_RETRIES = 6
+
+# Quota (429) and transient server errors are worth retrying, anything else is not
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def _status_code(error):
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def _first_row(response):
+    # append_rows returns {"updates": {"updatedRange": "'Calories'!A12:G14", ...}}
+    updated = (response or {}).get("updates", {}).get("updatedRange", "")
+    match = re.search(r"![A-Z]+(\d+)", updated)
+    return int(match.group(1)) if match else None
+
+
+def _column_letter(column):
+    """0-based column index -> A1 letters (0 -> A, 8 -> I, 26 -> AA)."""
+    letters = ""
+    column += 1
+    while column:
+        column, remainder = divmod(column - 1, 26)
+        letters = chr(ord("A") + remainder) + letters
+    return letters
+
+
+def _api_error():
+    # Only real worksheets raise gspread's APIError; the fake ones (memory backend,
+    # replays, tests) don't need gspread installed
+    try:
+        from gspread.exceptions import APIError  # not at module level: keeps startup light
+    except ImportError:
+        return ()
+    return APIError
+
+
+class _Journal:
+    """The segment files of one sheet. Caller holds the writer's lock for every method."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.live = {}      # segment number -> ids in it that are still pending
+        self.file = None    # open file of the segment being appended to
+        self.number = 0
+        self.size = 0
+        self.writes = 0     # writes so far ...
+        self.durable = 0    # ... and how many of them are known to be on disk
+
+    def path(self, number):
+        return os.path.join(self.directory, f"{number:08d}.jsonl")
+
+    def load(self):
+        """Read the segments; returns the unconfirmed entries as (segment number, entry), oldest first."""
+        entries, acked = [], set()
+        numbers = []
+        if os.path.isdir(self.directory):
+            numbers = sorted(int(name[:-6]) for name in os.listdir(self.directory)
+                             if name.endswith(".jsonl") and name[:-6].isdigit())
+        for number in numbers:
+            self.live[number] = set()
+            with open(self.path(number), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn last line from a crash mid-write; everything before it is intact
+                        logging.warning("Skipping corrupt journal line in %s", self.path(number))
+                        continue
+                    if "ack" in record:
+                        acked.update(record["ack"])
+                    else:
+                        entries.append((number, record))
+        self.number = numbers[-1] if numbers else 0
+        return [(number, entry) for number, entry in entries if entry["id"] not in acked]
+
+    def write(self, records):
+        """Append records to the current segment; returns a ticket for sync()."""
+        if self.file is None or self.size >= SEGMENT_BYTES:
+            self.roll()
+        data = "".join(json.dumps(record) + "\n" for record in records)
+        self.file.write(data)
+        self.file.flush()
+        self.size += len(data)
+        self.writes += 1
+        return self.writes
+
+    def sync(self, ticket):
+        # Group commit: one fsync covers every write made before it, so threads
+        # enqueueing at the same time (blocked on the lock meanwhile) share the next one
+        if self.durable >= ticket:
+            return
+        os.fsync(self.file.fileno())
+        self.durable = self.writes
+
+    def roll(self):
+        # Finish the current segment and start the next one
+        if self.file is not None:
+            os.fsync(self.file.fileno())
+            self.file.close()
+            self.durable = self.writes
+        else:
+            os.makedirs(self.directory, exist_ok=True)
+        self.number += 1
+        self.live.setdefault(self.number, set())
+        self.file = open(self.path(self.number), "a", encoding="utf-8")
+        self.size = 0
+
+    def drop_segments(self):
+        # Oldest first, so a confirmation is never deleted while the entry it
+        # confirms is still on disk
+        for number in sorted(self.live):
+            if number >= self.number or self.live[number]:
+                break
+            del self.live[number]
+            try:
+                os.remove(self.path(number))
+            except FileNotFoundError:
+                pass
+
+
+class SheetWriter:
+    def __init__(self, journal_dir=JOURNAL_DIR, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        # journal_dir=None keeps pending rows in memory only (fake sheets, replays)
+        self.journal_dir = journal_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.api_calls = 0
+
+        self._sheets = {}    # sheet name -> callable returning the gspread worksheet
+        self._on_append = {}  # sheet name -> callback(first_row, rows) after a confirmed append
+        self._id_columns = {}  # sheet name -> column index the entry id is written to
+        self._journals = {}  # sheet name -> its _Journal (caller holds self._lock)
+        self._pending = []   # journal entries not yet confirmed by Sheets, in order
+        self._where = {}     # id of every pending entry -> (sheet name, number of the segment holding it)
+        self._unverified = set()  # sheets whose last append may have landed without being confirmed
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    # --- Registration / enqueue ---
+    def register(self, name, get_sheet, on_append=None, id_column=None):
+        """Map a sheet name used in enqueue() to a function returning its worksheet.
+
+        on_append(first_row, rows) is called after each confirmed batch, with the
+        1-based sheet row the batch landed on (None if Sheets didn't say).
+        id_column is the 0-based column each row's entry id is written to, which
+        makes re-sending a batch after an unconfirmed append safe.
+        Rows left in the sheet's journal by the last run are re-queued here.
+        """
+        self._sheets[name] = get_sheet
+        if on_append is not None:
+            self._on_append[name] = on_append
+        if id_column is not None:
+            self._id_columns[name] = id_column
+        with self._lock:
+            self._journal(name)
+
+    def enqueue(self, name, row):
+        """Durably record a row for `name` and return its entry id. Does not touch the network."""
+        return self.enqueue_many(name, [row])[0]
+
+    def enqueue_many(self, name, rows, ids=None):
+        """Durably record several rows with one journal write; returns their entry ids.
+
+        Rows whose id (when given) is already pending are skipped, so replaying
+        the same enqueue after a crash is harmless.
+        """
+        ids = ids or [uuid.uuid4().hex for _ in rows]
+        ticket = None
+        with self._lock:
+            journal = self._journal(name)
+            entries = [{"id": entry_id, "sheet": name, "row": row}
+                       for entry_id, row in zip(ids, rows) if entry_id not in self._where]
+            if entries:
+                if journal is not None:
+                    ticket = journal.write(entries)
+                for entry in entries:
+                    self._track(name, journal, entry)
+                self._pending.extend(entries)
+            full = len(self._pending) >= self.batch_size
+        if ticket is not None:
+            self._make_durable(journal, ticket)
+        if full:
+            self._wakeup.set()
+        return list(ids)
+
+    def pending_count(self, name=None):
+        with self._lock:
+            if name is None:
+                return len(self._pending)
+            return sum(1 for entry in self._pending if entry["sheet"] == name)
+
+    def pending_rows(self, name):
+        """Rows of `name` that Sheets hasn't confirmed yet, oldest first."""
+        with self._lock:
+            return [entry["row"] for entry in self._pending if entry["sheet"] == name]
+
+    # --- Flushing ---
+    def flush(self, name=None, retry=True):
+        """Write pending rows now (all sheets, or only `name`). Returns the number of rows written.
+
+        retry=False makes a single attempt per sheet instead of backing off on
+        quota and server errors, for callers that must not block for long.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batches = {}
+                for entry in self._pending:
+                    if (name is None or entry["sheet"] == name) and entry["sheet"] in self._sheets:
+                        batches.setdefault(entry["sheet"], []).append(entry)
+
+            written = 0
+            for sheet_name, entries in batches.items():
+                try:
+                    if sheet_name in self._unverified:
+                        entries = self._skip_written(sheet_name, entries)
+                    rows = [self._with_id(sheet_name, e) for e in entries]
+                    response = self._append_with_retry(sheet_name, rows, retry) if rows else None
+                except Exception:
+                    # The append may still have landed (e.g. a timeout): check before sending it again
+                    self._unverified.add(sheet_name)
+                    logging.exception("Flushing %d rows to %s failed; keeping them journaled", len(entries), sheet_name)
+                    continue
+                self._unverified.discard(sheet_name)
+                if not rows:
+                    continue
+                self._confirm({e["id"] for e in entries})
+                written += len(entries)
+                self._appended(sheet_name, _first_row(response), rows)
+            return written
+
+    def _with_id(self, sheet_name, entry):
+        column = self._id_columns.get(sheet_name)
+        if column is None:
+            return entry["row"]
+        row = list(entry["row"]) + [""] * (column + 1 - len(entry["row"]))
+        row[column] = entry["id"]
+        return row
+
+    def _skip_written(self, sheet_name, entries):
+        # Drop (and confirm) entries whose id is already in the sheet's id column
+        column = self._id_columns.get(sheet_name)
+        if column is None:
+            return entries
+        letter = _column_letter(column)
+        with metrics.span("sheets_read"):
+            cells = self._sheets[sheet_name]().get_values(f"{letter}2:{letter}")
+        present = {row[0] for row in cells if row}
+        done = [e for e in entries if e["id"] in present]
+        if done:
+            logging.info("%d journaled rows were already in %s; not appending them again", len(done), sheet_name)
+            metrics.increment("sheets_duplicates_skipped_total", len(done))
+            self._confirm({e["id"] for e in done})
+            # Row numbers unknown: tells the index to read the new rows on its next sync
+            self._appended(sheet_name, None, [self._with_id(sheet_name, e) for e in done])
+        return [e for e in entries if e["id"] not in present]
+
+    def _appended(self, sheet_name, first_row, rows):
+        if sheet_name in self._on_append:
+            try:
+                self._on_append[sheet_name](first_row, rows)
+            except Exception:
+                logging.exception("on_append callback for %s failed", sheet_name)
+
+    def _append_with_retry(self, sheet_name, rows, retry=True):
+        APIError = _api_error()
+        attempts = MAX_RETRIES if retry else 1
+        delay = 1.0
+        for attempt in range(attempts):
+            try:
+                self.api_calls += 1
+                with metrics.span("sheets_append"):
+                    return self._sheets[sheet_name]().append_rows(rows)
+            except APIError as e:
+                if _status_code(e) == 429:
+                    metrics.increment("sheets_quota_errors_total")
+                if _status_code(e) not in RETRY_STATUS or attempt == attempts - 1:
+                    raise
+                metrics.increment("sheets_retries_total")
+                # Exponential backoff with jitter so both bots don't retry in lockstep
+                wait = delay + random.uniform(0, delay)
+                logging.warning("Sheets returned %s for %s, retrying in %.1fs", _status_code(e), sheet_name, wait)
+                time.sleep(wait)
+                delay = min(delay * 2, 60.0)
+
+    def _confirm(self, done_ids):
+        # Drop confirmed entries and journal the confirmation (no fsync needed: if it is
+        # lost, the entries are sent again and the id check skips them)
+        with self._lock:
+            self._pending = [e for e in self._pending if e["id"] not in done_ids]
+            acks = {}
+            for entry_id in done_ids:
+                sheet_name, segment = self._where.pop(entry_id, (None, None))
+                journal = self._journals.get(sheet_name)
+                if journal is not None:
+                    journal.live.get(segment, set()).discard(entry_id)
+                    acks.setdefault(sheet_name, []).append(entry_id)
+            for sheet_name, ids in acks.items():
+                journal = self._journals[sheet_name]
+                journal.write([{"ack": sorted(ids)}])
+                journal.drop_segments()
+
+    # --- Journal ---
+    def _track(self, name, journal, entry):
+        # Caller holds self._lock
+        segment = journal.number if journal is not None else None
+        self._where[entry["id"]] = (name, segment)
+        if journal is not None:
+            journal.live.setdefault(segment, set()).add(entry["id"])
+
+    def _make_durable(self, journal, ticket):
+        with self._lock:
+            journal.sync(ticket)
+
+    def _journal(self, name):
+        # Caller holds self._lock. Opened (and its leftovers re-queued) on first use
+        if self.journal_dir is None:
+            return None
+        journal = self._journals.get(name)
+        if journal is not None:
+            return journal
+        journal = self._journals[name] = _Journal(os.path.join(self.journal_dir, re.sub(r"[^\w.-]", "_", name)))
+        requeued = 0
+        for number, entry in journal.load():
+            if entry["id"] not in self._where:
+                self._pending.append(entry)
+                self._where[entry["id"]] = (name, number)
+                journal.live[number].add(entry["id"])
+                requeued += 1
+        if requeued:
+            # The last append before the restart may have landed without its confirmation
+            self._unverified.add(name)
+            logging.info("Re-queued %d unsynced rows of %s from %s", requeued, name, journal.directory)
+        journal.drop_segments()
+        return journal
+
+    # --- Background thread ---
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="sheet-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the background thread and flush whatever is still pending."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        flushed = time.monotonic()
+        while not self._stopped.is_set():
+            self._wakeup.wait(max(flushed + self.flush_interval - time.monotonic(), 0.0))
+            self._wakeup.clear()
+            # A wakeup can arrive just after a flush took the rows that caused it:
+            # only a full batch (or the interval running out) is worth a request
+            pending = self.pending_count()
+            if pending >= self.batch_size or time.monotonic() >= flushed + self.flush_interval:
+                if pending:
+                    self.flush()
+                flushed = time.monotonic()
+
+
+# One writer per process, shared by every agent running in it
+writer = SheetWriter()
+metrics.gauge("sheet_writer_pending_rows", writer.pending_count)
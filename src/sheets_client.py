@@ -0,0 +1,130 @@
+# === SHARED GOOGLE SHEETS ACCESS ===
+# Both agents used to re-read the service-account JSON, call gspread.authorize,
+# open the spreadsheet and look up the worksheet on every single operation.
+# That is four HTTPS round trips before the actual append/read even starts.
+#
+# This module authorizes once per key file and keeps the opened worksheet
+# handles around, so a log call costs exactly one API request.
+# Token refresh is handled by the authorized session gspread creates: the
+# credentials are refreshed in place shortly before they expire.
+#
+# gspread and oauth2client are only imported when the first client is
+# authorized, so starting a bot (or running it without Sheets) doesn't pay
+# for them.
+import logging
+import os
+import threading
+
+import metrics
+
+SCOPE = [
+    "https://spreadsheets.google.com/feeds",
+    "https://www.googleapis.com/auth/drive"
+]
+
+# Max keep-alive connections per host (one per dispatcher worker is plenty)
+POOL_SIZE = int(os.getenv("SHEETS_POOL_SIZE", "8"))
+
+_lock = threading.Lock()
+_clients = {}     # abs keyfile path -> authorized gspread client
+_worksheets = {}  # (abs keyfile path, spreadsheet title, worksheet title) -> worksheet
+
+
+def get_client(keyfile):
+    """Return a cached, authorized gspread client for this service-account key file."""
+    key = os.path.abspath(keyfile)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            import gspread
+            from oauth2client.service_account import ServiceAccountCredentials
+
+            creds = ServiceAccountCredentials.from_json_keyfile_name(key, SCOPE)
+            client = gspread.authorize(creds)
+            _mount_pool(client)
+            _clients[key] = client
+            logging.info("Authorized Google Sheets client for %s", key)
+        return client
+
+
+def get_worksheet(keyfile, spreadsheet, worksheet=None):
+    """Return a cached worksheet handle. worksheet=None means the first sheet (sheet1)."""
+    key = (os.path.abspath(keyfile), spreadsheet, worksheet)
+    ws = _worksheets.get(key)
+    if ws is not None:
+        return ws
+
+    client = get_client(keyfile)
+    with _lock:
+        ws = _worksheets.get(key)
+        if ws is None:
+            book = client.open(spreadsheet)
+            ws = book.worksheet(worksheet) if worksheet else book.sheet1
+            _worksheets[key] = ws
+        return ws
+
+
+def invalidate(keyfile=None):
+    """Drop cached clients/worksheets (all, or only those for one key file).
+
+    Call this after an auth error or when a worksheet was renamed/recreated.
+    """
+    with _lock:
+        if keyfile is None:
+            _clients.clear()
+            _worksheets.clear()
+            return
+        path = os.path.abspath(keyfile)
+        _clients.pop(path, None)
+        for key in [k for k in _worksheets if k[0] == path]:
+            del _worksheets[key]
+
+
+def _mount_pool(client):
+    # gspread >= 6 keeps the requests session on client.http_client, older versions on client
+    session = getattr(getattr(client, "http_client", client), "session", None)
+    if session is None:
+        return
+    from requests.adapters import HTTPAdapter
+
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+    session.mount("https://", adapter)
+
+
+# === BATCHED ROW DELETES ===
+def row_ranges(row_numbers):
+    """Group 1-based row numbers into contiguous (first, last) ranges, ascending."""
+    ranges = []
+    for row in sorted(set(row_numbers)):
+        if ranges and row == ranges[-1][1] + 1:
+            ranges[-1][1] = row
+        else:
+            ranges.append([row, row])
+    return [tuple(r) for r in ranges]
+
+
+def delete_rows_batch(worksheet, row_numbers):
+    """Delete all given rows with one batchUpdate request.
+
+    Sheets applies the requests of a batchUpdate atomically, so either every
+    row is gone or none is. Ranges are sent bottom-up so earlier deletes don't
+    shift the indices of later ones.
+    """
+    ranges = row_ranges(row_numbers)
+    if not ranges:
+        return None
+    requests = [
+        {
+            "deleteDimension": {
+                "range": {
+                    "sheetId": worksheet.id,
+                    "dimension": "ROWS",
+                    "startIndex": first - 1,  # 0-based, inclusive
+                    "endIndex": last          # 0-based, exclusive
+                }
+            }
+        }
+        for first, last in reversed(ranges)
+    ]
+    with metrics.span("sheets_delete"):
+        return worksheet.spreadsheet.batch_update({"requests": requests})
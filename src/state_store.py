@@ -0,0 +1,226 @@
+# === PER-CHAT CONVERSATION STATE (FITNESS BOT) ===
+# Partial workouts ("swimming" now, "45 min" in the next message) used to live
+# in an unbounded module-level dict of dicts: never evicted, lost on restart
+# and shared unguarded between dispatcher threads and the event loop.
+#
+# Stores here keep one compact PendingWorkout per chat, expire it after
+# STATE_TTL_SECONDS without activity, evict the least recently used chats
+# beyond STATE_MAX_CHATS, and do every read-modify-write under a lock.
+# The calls block (SQLite does disk I/O), so the async handlers run them
+# with asyncio.to_thread rather than on the shared event loop.
+# A workout whose duration looks like a typo waits in the same record for
+# the user's "yes" (hold / confirm), under the same limits.
+# Set FITNESS_STATE_DB to a file path to keep pending workouts in SQLite so
+# they survive restarts; otherwise they are held in memory.
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+STATE_TTL_SECONDS = float(os.getenv("STATE_TTL_SECONDS", "1800"))
+STATE_MAX_CHATS = int(os.getenv("STATE_MAX_CHATS", "10000"))
+
+FIELDS = ("exercise_type", "duration", "intensity")
+
+
+class PendingWorkout:
+    __slots__ = ("exercise_type", "duration", "intensity", "updated", "unconfirmed")
+
+    def __init__(self, exercise_type=None, duration=None, intensity=None, updated=0.0, unconfirmed=None):
+        self.exercise_type = exercise_type
+        self.duration = duration
+        self.intensity = intensity
+        self.updated = updated
+        self.unconfirmed = unconfirmed  # duration waiting for a "yes"
+
+    def merge(self, parsed):
+        """Take every field the new message provided (parsed has the same field names).
+
+        Any new message drops a duration that was waiting for confirmation.
+        """
+        self.unconfirmed = None
+        for field in FIELDS:
+            value = getattr(parsed, field)
+            if value:
+                setattr(self, field, value)
+
+    def complete(self):
+        return all(getattr(self, field) for field in FIELDS)
+
+    def empty(self):
+        return not any(getattr(self, field) for field in FIELDS)
+
+    def missing(self):
+        return [field for field in FIELDS if not getattr(self, field)]
+
+
+class MemoryStateStore:
+    def __init__(self, ttl=STATE_TTL_SECONDS, max_chats=STATE_MAX_CHATS):
+        self.ttl = ttl
+        self.max_chats = max_chats
+        self._lock = threading.Lock()
+        self._chats = OrderedDict()  # chat id -> PendingWorkout, least recently used first
+
+    def merge(self, chat_id, parsed):
+        """Merge a parsed message into the chat's pending workout and return it.
+
+        A workout that is complete after the merge is removed from the store, so
+        it is handed out exactly once even if messages race.
+        """
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            workout = self._chats.pop(chat_id, None) or PendingWorkout()
+            workout.merge(parsed)
+            workout.updated = now
+            if not workout.complete() and not workout.empty():
+                self._chats[chat_id] = workout
+                self._trim()
+            return workout
+
+    def hold(self, chat_id, workout):
+        """Keep a complete workout pending until confirm(): its duration is set aside."""
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            self._chats.pop(chat_id, None)
+            self._chats[chat_id] = PendingWorkout(workout.exercise_type, None, workout.intensity, now, workout.duration)
+            self._trim()
+
+    def confirm(self, chat_id):
+        """Take the chat's held workout with its duration, or None if nothing is waiting."""
+        with self._lock:
+            workout = self._chats.get(chat_id)
+            if workout is None or workout.unconfirmed is None or time.time() - workout.updated > self.ttl:
+                return None
+            del self._chats[chat_id]
+            return PendingWorkout(workout.exercise_type, workout.unconfirmed, workout.intensity, workout.updated)
+
+    def get(self, chat_id):
+        """A copy of the chat's pending workout (empty if there is none); the store is not changed."""
+        with self._lock:
+            workout = self._chats.get(chat_id)
+            if workout is None or time.time() - workout.updated > self.ttl:
+                return PendingWorkout()
+            return PendingWorkout(workout.exercise_type, workout.duration, workout.intensity, workout.updated)
+
+    def clear(self, chat_id):
+        with self._lock:
+            self._chats.pop(chat_id, None)
+
+    def __len__(self):
+        return len(self._chats)
+
+    def _trim(self):
+        while len(self._chats) > self.max_chats:
+            self._chats.popitem(last=False)
+
+    def _expire(self, now):
+        # Entries are kept in last-touched order, so expired ones are at the front
+        while self._chats:
+            chat_id, workout = next(iter(self._chats.items()))
+            if now - workout.updated <= self.ttl:
+                break
+            del self._chats[chat_id]
+
+
+class SQLiteStateStore:
+    def __init__(self, path, ttl=STATE_TTL_SECONDS, max_chats=STATE_MAX_CHATS):
+        self.ttl = ttl
+        self.max_chats = max_chats
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS pending_workouts (
+                    chat TEXT PRIMARY KEY,
+                    exercise_type TEXT,
+                    duration INTEGER,
+                    intensity TEXT,
+                    updated REAL NOT NULL,
+                    unconfirmed INTEGER
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS pending_workouts_lru ON pending_workouts (updated)")
+        # Rows in the table, kept up to date by every write below so the LRU
+        # limit doesn't need a COUNT(*) per message
+        self._count = self._conn.execute("SELECT COUNT(*) FROM pending_workouts").fetchone()[0]
+
+    def merge(self, chat_id, parsed):
+        now = time.time()
+        with self._lock, self._conn:
+            self._expire(now)
+            row = self._conn.execute(
+                "SELECT exercise_type, duration, intensity FROM pending_workouts WHERE chat = ?", (str(chat_id),)
+            ).fetchone()
+            workout = PendingWorkout(*row) if row else PendingWorkout()
+            workout.merge(parsed)
+            workout.updated = now
+            if workout.complete() or workout.empty():
+                self._delete(chat_id)
+            else:
+                self._store(chat_id, workout, new=row is None)
+            return workout
+
+    def hold(self, chat_id, workout):
+        now = time.time()
+        with self._lock, self._conn:
+            self._expire(now)
+            new = self._conn.execute("SELECT 1 FROM pending_workouts WHERE chat = ?", (str(chat_id),)).fetchone() is None
+            self._store(chat_id, PendingWorkout(workout.exercise_type, None, workout.intensity, now, workout.duration), new)
+
+    def confirm(self, chat_id):
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "DELETE FROM pending_workouts WHERE chat = ? AND updated >= ? AND unconfirmed IS NOT NULL "
+                "RETURNING exercise_type, unconfirmed, intensity, updated",
+                (str(chat_id), time.time() - self.ttl)
+            ).fetchone()
+            if row:
+                self._count -= 1
+        return PendingWorkout(*row) if row else None
+
+    def get(self, chat_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT exercise_type, duration, intensity, updated FROM pending_workouts WHERE chat = ? AND updated >= ?",
+                (str(chat_id), time.time() - self.ttl)
+            ).fetchone()
+        return PendingWorkout(*row) if row else PendingWorkout()
+
+    def clear(self, chat_id):
+        with self._lock, self._conn:
+            self._delete(chat_id)
+
+    def __len__(self):
+        with self._lock:
+            return self._count
+
+    # The helpers below expect the caller to hold self._lock and an open transaction
+
+    def _store(self, chat_id, workout, new):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO pending_workouts VALUES (?, ?, ?, ?, ?, ?)",
+            (str(chat_id), workout.exercise_type, workout.duration, workout.intensity, workout.updated,
+             workout.unconfirmed)
+        )
+        self._count += new
+        if self._count > self.max_chats:
+            self._count -= self._conn.execute(
+                "DELETE FROM pending_workouts WHERE chat IN "
+                "(SELECT chat FROM pending_workouts ORDER BY updated LIMIT ?)",
+                (self._count - self.max_chats,)
+            ).rowcount
+
+    def _delete(self, chat_id):
+        self._count -= self._conn.execute("DELETE FROM pending_workouts WHERE chat = ?", (str(chat_id),)).rowcount
+
+    def _expire(self, now):
+        self._count -= self._conn.execute("DELETE FROM pending_workouts WHERE updated < ?", (now - self.ttl,)).rowcount
+
+
+def create_store():
+    """SQLite-backed store if FITNESS_STATE_DB is set, in-memory otherwise."""
+    path = os.getenv("FITNESS_STATE_DB")
+    return SQLiteStateStore(path) if path else MemoryStateStore()
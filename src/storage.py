@@ -0,0 +1,419 @@
+# === STORAGE BACKENDS ===
+# Logging, /summary and /reset_day used to talk to Google Sheets (through the
+# write-behind queue and the daily index) directly from each agent. They now
+# go through one small interface, so where the data lives is a setting:
+#
+#   STORAGE_BACKEND=local   (default) SQLite in WAL mode is the system of
+#                           record: a log is one local insert, summaries and
+#                           resets are local queries. Google Sheets is kept as
+#                           a mirror, updated in order by a background thread
+#                           from a durable outbox, so logging and summaries keep
+#                           working while Sheets is down and catch up later
+#                           (set SHEETS_MIRROR=0 to run without Sheets at all).
+#                           On the first start with an empty store, the rows
+#                           already in Sheets are imported before anything else
+#                           is mirrored.
+#   STORAGE_BACKEND=sheets  Google Sheets is the system of record (the
+#                           previous behaviour). Rows wait in the writer's
+#                           journal while Sheets is down; summaries then come
+#                           from the local index plus that journal.
+#   STORAGE_BACKEND=memory  Like "sheets", but against in-memory fake
+#                           worksheets (fake_sheets.py): no credentials needed.
+#
+# Every backend offers register / append / totals / daily_totals / reset_day /
+# rebuild and start / stop. History can be exported to Parquet (needs pyarrow):
+#   python storage.py export Calories calories.parquet
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+
+import metrics
+import sheets_client
+from daily_index import DailyIndex, index, parse_number
+from fake_sheets import FakeSpreadsheet
+from sheet_writer import SheetWriter, writer
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+STORAGE_PATH = os.getenv("STORAGE_PATH", "bot_storage.db")
+SHEETS_MIRROR = os.getenv("SHEETS_MIRROR", "1") != "0"
+SYNC_RETRY_SECONDS = 1.0
+MAX_SYNC_RETRY_SECONDS = 60.0
+DRAIN_TIMEOUT = 30.0
+
+
+class SheetsStorage:
+    """Google Sheets as the system of record: write-behind queue + local per-day index."""
+
+    def __init__(self, writer=writer, index=index, spreadsheet=None):
+        self.writer = writer
+        self.index = index
+        self._spreadsheet = spreadsheet  # FakeSpreadsheet: ignore the real worksheets
+        self._sheets = {}  # name -> callable returning the worksheet
+        self._metrics = {}  # name -> summed metric names
+        self._locks = {}  # name -> lock held while row numbers are looked up and used
+
+    def register(self, sheet, get_sheet, metrics, chat_column=None, id_column=None):
+        """Declare a sheet: its worksheet, summed columns ({"calories": 3}), chat id and entry id columns."""
+        if self._spreadsheet is not None:
+            fake = self._spreadsheet.worksheet(sheet)
+            get_sheet = lambda: fake
+        self._sheets[sheet] = get_sheet
+        self._metrics[sheet] = list(metrics)
+        self._locks[sheet] = threading.Lock()
+        self.index.register(sheet, metrics, chat_column)
+        self.writer.register(sheet, get_sheet, id_column=id_column,
+                             on_append=lambda first_row, rows: self.index.add_rows(sheet, first_row, rows))
+
+    def append(self, sheet, rows, ids=None):
+        self.writer.enqueue_many(sheet, rows, ids)
+
+    def totals(self, sheet, day, chat):
+        totals = {metric: 0.0 for metric in self._metrics[sheet]}
+        totals.update(self.daily_totals(sheet, chat, day, day).get(day, {}))
+        return totals
+
+    def daily_totals(self, sheet, chat, first_day, last_day):
+        """Per-day sums {day: {metric: total}} for one chat over an inclusive day range."""
+        if sheet in self._sheets:
+            try:
+                with self._locks[sheet]:
+                    self.index.ensure_synced(sheet, self._sheets[sheet]())
+            except Exception:
+                # Sheets unreachable: answer from the index and the journal instead of failing
+                logging.warning("Could not sync the index of %s; using local data", sheet, exc_info=True)
+                metrics.increment("storage_offline_reads_total")
+        days = self.index.totals_between(sheet, str(chat), first_day, last_day)
+        # Rows still in the journal (Sheets slow or down) count too
+        for row in self.writer.pending_rows(sheet):
+            row_chat, day, vals = self.index.parse_row(sheet, row)
+            if row_chat == str(chat) and first_day <= day <= last_day:
+                totals = days.setdefault(day, {})
+                for metric, value in vals.items():
+                    totals[metric] = totals.get(metric, 0.0) + value
+        return days
+
+    def reset_day(self, sheet, day, chat):
+        """Delete one chat's rows for `day`; returns how many rows were removed."""
+        # Include rows still waiting in the write-behind queue; one attempt only, so
+        # an outage fails the reset right away instead of blocking on the backoff
+        self.writer.flush(sheet, retry=False)
+        # Row numbers shift with every delete: another reset (or a sync) must not
+        # run between looking them up, deleting them and updating the index
+        with self._locks[sheet]:
+            if self.writer.pending_count(sheet):
+                # They would be appended after the delete and bring the day back
+                raise RuntimeError("Google Sheets is not reachable right now; please try again later.")
+            worksheet = self._sheets[sheet]()
+            self.index.ensure_synced(sheet, worksheet)
+            to_delete = self.index.rows_for_day(sheet, day, chat=str(chat))
+            if to_delete:
+                # One batchUpdate for all of the rows: no partial resets halfway through the quota
+                sheets_client.delete_rows_batch(worksheet, to_delete)
+                self.index.remove_rows(sheet, to_delete)
+        return len(to_delete)
+
+    def rebuild(self, sheet):
+        """Re-read the whole sheet into the index (after manual edits); returns the row count."""
+        self.writer.flush(sheet)
+        with self._locks[sheet]:
+            count = self.index.rebuild(sheet, self._sheets[sheet]())
+        return max(count - 1, 0)  # row 1 is the header
+
+    def start(self):
+        self.writer.start()
+
+    def stop(self):
+        self.writer.stop()
+
+
+class LocalStorage:
+    """SQLite (WAL) as the system of record, optionally mirrored to another backend in the background."""
+
+    def __init__(self, path=STORAGE_PATH, mirror=None):
+        self.mirror = mirror
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._schemas = {}  # sheet -> (metrics, chat_column)
+        self._sync_thread = None
+        self._sync_wakeup = threading.Event()
+        self._sync_stopped = threading.Event()
+        self._synced = threading.Condition()  # notified whenever the outbox runs empty
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS records (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    sheet TEXT NOT NULL,
+                    chat TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    vals TEXT NOT NULL,
+                    row TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS records_day ON records (sheet, chat, day);
+                CREATE TABLE IF NOT EXISTS daily_totals (
+                    sheet TEXT NOT NULL,
+                    chat TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    metric TEXT NOT NULL,
+                    total REAL NOT NULL,
+                    PRIMARY KEY (sheet, chat, day, metric)
+                );
+                CREATE TABLE IF NOT EXISTS outbox (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    operation TEXT NOT NULL,
+                    args TEXT NOT NULL,
+                    sheet TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS imported (
+                    sheet TEXT PRIMARY KEY
+                );
+            """)
+        if mirror is not None:
+            metrics.gauge("storage_sync_backlog", self.backlog)
+
+    def register(self, sheet, get_sheet, metrics, chat_column=None, id_column=None):
+        self._schemas[sheet] = (metrics, chat_column)
+        if self.mirror is None:
+            return
+        self.mirror.register(sheet, get_sheet, metrics, chat_column, id_column)
+        with self._lock, self._conn:
+            # A new store (e.g. after switching from STORAGE_BACKEND=sheets) starts
+            # from the history in Sheets; queued first, so it's applied before any
+            # operation of this run
+            if not self._conn.execute(
+                "SELECT 1 FROM records WHERE sheet = ? UNION ALL SELECT 1 FROM imported WHERE sheet = ? "
+                "UNION ALL SELECT 1 FROM outbox WHERE sheet = ? AND operation = 'import_history'",
+                (sheet, sheet, sheet)
+            ).fetchone():
+                self._queue_mirror("import_history", sheet)
+
+    def _record(self, sheet, row):
+        metrics, chat_column = self._schemas[sheet]
+        chat = str(row[chat_column]).strip() if chat_column is not None and chat_column < len(row) else ""
+        vals = {m: parse_number(row[col]) if col < len(row) else 0.0 for m, col in metrics.items()}
+        return (sheet, chat, str(row[0]).strip(), json.dumps(vals), json.dumps(row))
+
+    def _add_totals(self, records):
+        # Caller holds self._lock and an open transaction
+        self._conn.executemany(
+            "INSERT INTO daily_totals (sheet, chat, day, metric, total) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (sheet, chat, day, metric) DO UPDATE SET total = total + excluded.total",
+            [(sheet, chat, day, metric, value)
+             for sheet, chat, day, vals in records
+             for metric, value in json.loads(vals).items()]
+        )
+
+    def _insert(self, records):
+        # Caller holds self._lock and an open transaction
+        self._conn.executemany(
+            "INSERT INTO records (sheet, chat, day, vals, row) VALUES (?, ?, ?, ?, ?)", records
+        )
+        self._add_totals([record[:4] for record in records])
+
+    def append(self, sheet, rows):
+        records = [self._record(sheet, row) for row in rows]
+        with self._lock, self._conn:
+            self._insert(records)
+            # Entry ids make re-sending the append after a failure or restart safe
+            self._queue_mirror("append", sheet, rows, [uuid.uuid4().hex for _ in rows])
+        self._wake_sync()
+
+    def totals(self, sheet, day, chat):
+        totals = {metric: 0.0 for metric in self._schemas[sheet][0]}
+        totals.update(self.daily_totals(sheet, chat, day, day).get(day, {}))
+        return totals
+
+    def daily_totals(self, sheet, chat, first_day, last_day):
+        days = {}
+        with self._lock:
+            for day, metric, total in self._conn.execute(
+                "SELECT day, metric, total FROM daily_totals WHERE sheet = ? AND chat = ? AND day BETWEEN ? AND ?",
+                (sheet, str(chat), first_day, last_day)
+            ):
+                days.setdefault(day, {})[metric] = total
+        return days
+
+    def reset_day(self, sheet, day, chat):
+        with self._lock, self._conn:
+            deleted = self._conn.execute(
+                "DELETE FROM records WHERE sheet = ? AND chat = ? AND day = ?", (sheet, str(chat), day)
+            ).rowcount
+            self._conn.execute(
+                "DELETE FROM daily_totals WHERE sheet = ? AND chat = ? AND day = ?", (sheet, str(chat), day)
+            )
+            self._queue_mirror("reset_day", sheet, day, str(chat))
+        self._wake_sync()
+        return deleted
+
+    def rebuild(self, sheet):
+        """Replace the local rows of `sheet` with what the mirror holds (after manual sheet edits)."""
+        if self.mirror is None:
+            with self._lock:
+                return self._conn.execute("SELECT COUNT(*) FROM records WHERE sheet = ?", (sheet,)).fetchone()[0]
+        if not self.drain(DRAIN_TIMEOUT):
+            raise RuntimeError("Some entries are still waiting to be synced to Google Sheets; try again later.")
+        self.mirror.rebuild(sheet)
+        if self.mirror.writer.pending_count():
+            raise RuntimeError("Some rows are still waiting to be written to Google Sheets; try again later.")
+        rows = [row for row in self.mirror._sheets[sheet]().get_values("A2:Z") if row]
+        records = [self._record(sheet, row) for row in rows]
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM records WHERE sheet = ?", (sheet,))
+            self._conn.execute("DELETE FROM daily_totals WHERE sheet = ?", (sheet,))
+            self._insert(records)
+        return len(rows)
+
+    def _import_history(self, seq, sheet):
+        """Copy the rows already in Sheets into the local store (the queued import_history operation)."""
+        self.mirror.writer.flush(sheet, retry=False)  # rows a previous sheets-backend run left in the journal
+        if self.mirror.writer.pending_count(sheet):
+            raise RuntimeError(f"Rows of {sheet} are still waiting to be written to Google Sheets")
+        rows = [row for row in self.mirror._sheets[sheet]().get_values("A2:Z") if row]
+        records = [self._record(sheet, row) for row in rows]
+        with self._lock, self._conn:
+            # Days reset while the import was waiting are already gone from the local store
+            reset = {tuple(json.loads(args)[1:]) for (args,) in self._conn.execute(
+                "SELECT args FROM outbox WHERE sheet = ? AND operation = 'reset_day' AND seq > ?", (sheet, seq)
+            )}
+            records = [record for record in records if (record[2], record[1]) not in reset]
+            self._insert(records)
+            self._conn.execute("INSERT OR IGNORE INTO imported (sheet) VALUES (?)", (sheet,))
+            self._conn.execute("DELETE FROM outbox WHERE seq = ?", (seq,))
+        logging.info("Imported %d rows of %s from Google Sheets", len(records), sheet)
+
+    def export_parquet(self, sheet, path):
+        """Write every row of `sheet` (day, chat and the summed metrics) to a Parquet file."""
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow).")
+        with self._lock:
+            records = self._conn.execute(
+                "SELECT day, chat, vals FROM records WHERE sheet = ? ORDER BY id", (sheet,)
+            ).fetchall()
+        columns = {"day": [r[0] for r in records], "chat": [r[1] for r in records]}
+        values = [json.loads(r[2]) for r in records]
+        for metric in sorted({m for vals in values for m in vals}):
+            columns[metric] = [vals.get(metric, 0.0) for vals in values]
+        pyarrow.parquet.write_table(pyarrow.table(columns), path)
+        return len(records)
+
+    # --- Mirroring ---
+    # Mirror operations go into the outbox table in the same transaction as the
+    # local change, so they survive a crash or restart. One thread applies them
+    # oldest first, so a reset can never delete a row that was logged after it.
+    # While Sheets is down it retries the oldest operation with backoff.
+    # The two bots can run as separate processes on the same database: each
+    # process only applies the operations of the sheets it registered.
+    def _queue_mirror(self, operation, sheet, *args):
+        # Caller holds self._lock and an open transaction
+        if self.mirror is not None:
+            self._conn.execute("INSERT INTO outbox (operation, args, sheet) VALUES (?, ?, ?)",
+                               (operation, json.dumps((sheet,) + args), sheet))
+
+    def _own_outbox(self, columns, suffix=""):
+        # Caller holds self._lock: this process's outbox rows
+        sheets = list(self._schemas)
+        return self._conn.execute(
+            f"SELECT {columns} FROM outbox WHERE sheet IN ({', '.join('?' * len(sheets))}) {suffix}", sheets
+        )
+
+    def backlog(self):
+        """Mirror operations of this process's sheets not applied yet."""
+        with self._lock:
+            return self._own_outbox("COUNT(*)").fetchone()[0]
+
+    def _wake_sync(self):
+        if self.mirror is None or self._sync_stopped.is_set():
+            return
+        with self._synced:
+            if self._sync_thread is None:
+                self._sync_thread = threading.Thread(target=self._sync, name="sheets-sync", daemon=True)
+                self._sync_thread.start()
+        self._sync_wakeup.set()
+
+    def _sync(self):
+        delay = SYNC_RETRY_SECONDS
+        while True:
+            self._sync_wakeup.clear()
+            with self._lock:
+                item = self._own_outbox("seq, operation, args", "ORDER BY seq LIMIT 1").fetchone()
+            if item is None:
+                with self._synced:
+                    self._synced.notify_all()
+                if self._sync_stopped.is_set():
+                    return
+                self._sync_wakeup.wait()
+                continue
+            seq, operation, args = item
+            try:
+                if operation == "import_history":
+                    self._import_history(seq, *json.loads(args))
+                else:
+                    getattr(self.mirror, operation)(*json.loads(args))
+            except Exception:
+                metrics.increment("storage_sync_errors_total")
+                logging.warning("Syncing %s to Google Sheets failed; retrying in %.0fs", operation, delay, exc_info=True)
+                if self._sync_stopped.wait(delay):
+                    return  # still in the outbox, picked up on the next start
+                delay = min(delay * 2, MAX_SYNC_RETRY_SECONDS)
+                continue
+            delay = SYNC_RETRY_SECONDS
+            with self._lock, self._conn:
+                self._conn.execute("DELETE FROM outbox WHERE seq = ?", (seq,))
+
+    def drain(self, timeout=None):
+        """Wait until every queued mirror operation has been applied; False if that took longer than `timeout`."""
+        if self.mirror is None:
+            return True
+        self._wake_sync()
+        with self._synced:
+            return self._synced.wait_for(lambda: self.backlog() == 0, timeout)
+
+    def start(self):
+        if self.mirror is not None:
+            self.mirror.start()
+            self._wake_sync()  # resume what the last run left in the outbox
+
+    def stop(self):
+        self._sync_stopped.set()
+        self._sync_wakeup.set()
+        if self._sync_thread is not None:
+            self._sync_thread.join()
+            self._sync_thread = None
+        if self.mirror is not None:
+            self.mirror.stop()
+
+
+def create_storage(backend=STORAGE_BACKEND):
+    if backend == "sheets":
+        return SheetsStorage()
+    if backend == "memory":
+        return SheetsStorage(SheetWriter(journal_dir=None), DailyIndex(":memory:"), FakeSpreadsheet())
+    if backend == "local":
+        return LocalStorage(mirror=SheetsStorage() if SHEETS_MIRROR else None)
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+
+# One storage backend per process, shared by every agent running in it
+storage = create_storage()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export logged rows from the local store.")
+    parser.add_argument("command", choices=["export"])
+    parser.add_argument("sheet", help="e.g. Calories or Fitness")
+    parser.add_argument("path", help="Parquet file to write")
+    args = parser.parse_args(argv)
+    count = LocalStorage(mirror=None).export_parquet(args.sheet, args.path)
+    print(f"Exported {count} rows of {args.sheet} to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
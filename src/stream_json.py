@@ -0,0 +1,64 @@
+# === INCREMENTAL JSON PARSING FOR STREAMED REPLIES ===
+# OpenAI streams function-call arguments as small text fragments, e.g.
+#   '{"items": [{"item": "egg", "calo'  'ries": 140, ...}, {"item": ...'
+# ArrayItemParser is fed those fragments and hands back every object inside
+# an array as soon as its closing brace arrives, so the first meal item can
+# be shown (and validated) while the rest is still being generated.
+import json
+
+
+class ArrayItemParser:
+    def __init__(self):
+        self._text = ""
+        self._pos = 0          # next character of _text to scan
+        self._stack = []       # open containers: "{" or "["
+        self._starts = []      # start offsets of objects that sit directly in an array
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, fragment):
+        """Add a fragment; return the list of array-element objects completed by it."""
+        self._text += fragment
+        done = []
+        text = self._text
+        for pos in range(self._pos, len(text)):
+            char = text[pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if char == "{" and self._stack and self._stack[-1] == "[":
+                    self._starts.append((len(self._stack), pos))
+                self._stack.append(char)
+            elif char in "}]" and self._stack:
+                self._stack.pop()
+                if char == "}" and self._starts and self._starts[-1][0] == len(self._stack):
+                    _, start = self._starts.pop()
+                    try:
+                        done.append(json.loads(text[start:pos + 1]))
+                    except ValueError:
+                        pass  # a malformed element; the caller validates what it got
+        self._pos = len(text)
+        return done
+
+    @property
+    def text(self):
+        return self._text
+
+
+def parse_json_reply(text):
+    """Decode the first JSON object in a free-text reply (code fences and prose around it are fine)."""
+    start = text.find("{")
+    if start < 0:
+        raise ValueError("No JSON object found in response.")
+    try:
+        value, _ = json.JSONDecoder().raw_decode(text[start:])
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Failed to parse JSON: {e}")
+    return value
@@ -0,0 +1,68 @@
+# === PER-USER PROFILES ===
+# Daily nutrition targets and body weight used to be hard-coded for everyone
+# (DAILY_TARGETS in Nutrition_agent.py, weight_kg = 80 in Fitness_agent.py).
+#
+# Each chat now has its own profile in a small SQLite table. Fields a user
+# never set fall back to DEFAULT_PROFILE, so a new user gets the old values.
+# Profiles are read on every logged meal/workout and summary, so they are
+# cached in memory after the first read; updates write through.
+import os
+import sqlite3
+import threading
+
+PROFILES_PATH = os.getenv("USER_PROFILES_PATH", "user_profiles.db")
+
+DEFAULT_PROFILE = {
+    "weight_kg": 80.0,
+    "calories": 2130.0,
+    "protein": 160.0,
+    "fat": 60.0,
+    "carbs": 240.0,
+}
+
+# Upper bounds for values users can set; anything above is a typo
+PROFILE_LIMITS = {"weight_kg": 400.0, "calories": 10000.0, "protein": 1000.0, "fat": 1000.0, "carbs": 2000.0}
+
+
+class UserProfiles:
+    def __init__(self, path=PROFILES_PATH):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._cache = {}  # chat id -> full profile dict
+        fields = ", ".join(f"{field} REAL" for field in DEFAULT_PROFILE)
+        with self._conn:
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS profiles (chat TEXT PRIMARY KEY, {fields})")
+
+    def get(self, chat_id):
+        """Return a copy of the chat's profile; unset fields hold the defaults."""
+        chat = str(chat_id)
+        with self._lock:
+            profile = self._cache.get(chat)
+            if profile is None:
+                profile = dict(DEFAULT_PROFILE)
+                row = self._conn.execute(
+                    f"SELECT {', '.join(DEFAULT_PROFILE)} FROM profiles WHERE chat = ?", (chat,)
+                ).fetchone()
+                if row:
+                    profile.update({field: value for field, value in zip(DEFAULT_PROFILE, row) if value is not None})
+                self._cache[chat] = profile
+            return dict(profile)
+
+    def update(self, chat_id, **values):
+        """Set some profile fields, e.g. update(chat_id, weight_kg=72); raises ValueError on bad input."""
+        for field, value in values.items():
+            if field not in DEFAULT_PROFILE:
+                raise ValueError(f"Unknown profile field: {field}")
+            if not 0 < value <= PROFILE_LIMITS[field]:
+                raise ValueError(f"{field} must be between 0 and {PROFILE_LIMITS[field]:g}")
+        chat = str(chat_id)
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO profiles (chat) VALUES (?)", (chat,))
+            for field, value in values.items():
+                self._conn.execute(f"UPDATE profiles SET {field} = ? WHERE chat = ?", (float(value), chat))
+            self._cache.pop(chat, None)  # re-read on next get
+        return self.get(chat_id)
+
+
+# One profile store per process, shared by every agent running in it
+profiles = UserProfiles()
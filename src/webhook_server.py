@@ -0,0 +1,188 @@
+# === WEBHOOK MODE ===
+# Alternative to updater.start_polling(): one embedded HTTP server receives
+# the updates of every agent in the process. Telegram posts to
+# <base url>/<agent name>; the server checks the secret token header, puts
+# the update on a bounded queue and answers 200 right away, so a slow LLM
+# call can never stall ingestion. When the queue is full it answers 503 and
+# Telegram simply redelivers the update later.
+#
+# Worker threads hand the updates to the matching agent's dispatcher. Each
+# worker has its own queue and every chat always goes to the same one, so a
+# chat's messages are dispatched in the order they arrived.
+#
+# Without a WEBHOOK_SECRET anyone who can reach the port could post forged
+# updates for any chat, so the server listens on 127.0.0.1 by default and
+# refuses any other address (WEBHOOK_LISTEN=0.0.0.0 behind no proxy, say)
+# unless a secret is set. Webhooks are only registered with a secret.
+# Latency percentiles (ingest -> dispatched) are available on GET /stats,
+# everything in Prometheus format on GET /metrics (see metrics_server.py).
+#
+# Local testing with a recorded update:
+#   curl -X POST -H "X-Telegram-Bot-Api-Secret-Token: $WEBHOOK_SECRET" \
+#        -d @update.json http://localhost:8080/nutrition
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telegram import Update
+
+import metrics
+import metrics_server
+
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+MAX_BODY_BYTES = 1 << 20
+
+
+class WebhookServer:
+    def __init__(self, updaters, secret=WEBHOOK_SECRET, listen=WEBHOOK_LISTEN, port=WEBHOOK_PORT,
+                 queue_size=WEBHOOK_QUEUE_SIZE, workers=WEBHOOK_WORKERS):
+        if not secret and not _is_loopback(listen):
+            raise RuntimeError(f"Set WEBHOOK_SECRET to accept updates on {listen}; without it anyone could post them.")
+        self.updaters = updaters  # agent name (URL path) -> telegram.ext.Updater
+        self.secret = secret
+        self.queues = [queue.Queue(maxsize=max(1, queue_size // workers)) for _ in range(workers)]
+        self._threads = []
+        self._httpd = ThreadingHTTPServer((listen, port), self._handler_class())
+        metrics.gauge("webhook_queue_depth", self.queue_depth)
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.send_response(server.ingest(self.path, self.headers, self.rfile))
+                self.end_headers()
+
+            def do_GET(self):
+                if self.path == "/stats":
+                    body = json.dumps(server.stats()).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                response = metrics_server.respond(self.path)  # /metrics, /debug/profile...
+                if response is not None:
+                    metrics_server.write_response(self, response)
+                else:
+                    self.send_response(200 if self.path == "/healthz" else 404)
+                    self.end_headers()
+
+            def log_message(self, fmt, *args):
+                logging.debug("webhook: " + fmt, *args)
+
+        return Handler
+
+    # --- Ingestion (HTTP threads) ---
+    def ingest(self, path, headers, body):
+        """Validate and enqueue one update; returns the HTTP status code."""
+        received = time.perf_counter()
+        name = path.strip("/")
+        if name not in self.updaters:
+            return 404
+        if not hmac.compare_digest(headers.get(SECRET_HEADER, ""), self.secret):
+            metrics.increment("webhook_rejected_total")
+            return 403
+        length = int(headers.get("Content-Length") or 0)
+        if length <= 0 or length > MAX_BODY_BYTES:
+            return 400
+        try:
+            data = json.loads(body.read(length))
+        except ValueError:
+            return 400
+        try:
+            self._queue_for(data).put_nowait((name, data, received))
+        except queue.Full:
+            metrics.increment("webhook_dropped_total")
+            return 503  # Telegram retries later
+        metrics.increment("webhook_updates_total")
+        return 200
+
+    def _queue_for(self, data):
+        # Same chat, same worker: its updates are processed one after the other
+        chat_id = _chat_id(data)
+        key = chat_id if chat_id is not None else data.get("update_id", 0)
+        return self.queues[hash(key) % len(self.queues)]
+
+    def queue_depth(self):
+        return sum(q.qsize() for q in self.queues)
+
+    # --- Processing (worker threads) ---
+    def _work(self, updates):
+        while True:
+            item = updates.get()
+            if item is None:
+                return
+            name, data, received = item
+            updater = self.updaters[name]
+            try:
+                update = Update.de_json(data, updater.bot)
+                updater.dispatcher.process_update(update)
+            except Exception:
+                logging.exception("Failed to process webhook update for %s", name)
+            finally:
+                metrics.observe("webhook_dispatch_seconds", time.perf_counter() - received)
+                updates.task_done()
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue_depth(),
+            "dispatch_latency": metrics.percentiles("webhook_dispatch_seconds"),
+            "agent_latency": metrics.percentiles("agent_run_seconds"),
+        }
+
+    # --- Lifecycle ---
+    def set_webhooks(self, base_url):
+        """Point every bot at <base_url>/<agent name>; refuses to without a secret."""
+        if not self.secret:
+            raise RuntimeError("Set WEBHOOK_SECRET before registering a public webhook URL.")
+        for name, updater in self.updaters.items():
+            updater.bot.set_webhook(url=f"{base_url.rstrip('/')}/{name}", api_kwargs={"secret_token": self.secret})
+            logging.info("Webhook for %s set to %s/%s", name, base_url, name)
+
+    def start(self):
+        for i, updates in enumerate(self.queues):
+            thread = threading.Thread(target=self._work, args=(updates,), name=f"webhook-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        threading.Thread(target=self._httpd.serve_forever, name="webhook-http", daemon=True).start()
+        logging.info("Webhook server listening on %s:%s", *self._httpd.server_address[:2])
+
+    def stop(self):
+        self._httpd.shutdown()
+        for updates in self.queues:
+            updates.put(None)
+        for thread in self._threads:
+            thread.join()
+
+
+def _chat_id(data):
+    """Chat id of a raw update (None for updates without a chat)."""
+    for key in ("message", "edited_message", "channel_post", "edited_channel_post"):
+        if key in data:
+            return (data[key].get("chat") or {}).get("id")
+    callback = data.get("callback_query")
+    if callback:
+        return ((callback.get("message") or {}).get("chat") or {}).get("id")
+    return None
+
+
+def _is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
@@ -0,0 +1,18 @@
+# The bots import each other's modules from src/ directly; do the same here
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+# Module-level singletons (storage, index, caches) open their files on import:
+# keep them out of the working tree and away from Google Sheets
+_workdir = tempfile.mkdtemp(prefix="bot-tests-")
+for _name, _filename in [("DAILY_INDEX_PATH", "daily_index.db"), ("SHEET_JOURNAL_DIR", "sheet_journal"),
+                         ("NUTRITION_CACHE_PATH", "nutrition_cache.db"), ("USER_PROFILES_PATH", "user_profiles.db"),
+                         ("STORAGE_PATH", "bot_storage.db")]:
+    os.environ[_name] = os.path.join(_workdir, _filename)
+os.environ["STORAGE_BACKEND"] = "memory"
+# Set before the bots load .env (which doesn't override them): tests never reach Telegram
+os.environ["TELEGRAM_BOT_TOKEN"] = os.environ["TELEGRAM_BOT_TOKEN_NUTRITION"] = "123456:test"
+os.environ.pop("FITNESS_STATE_DB", None)
@@ -0,0 +1,67 @@
+# /week, /month and /trend over 5 years of synthetic history: the reports
+# read per-day sums only, so they stay fast however long the history is.
+import datetime
+import random
+import time
+
+import pytest
+
+import analytics
+from daily_index import DailyIndex
+from fake_sheets import FakeSpreadsheet
+from sheet_writer import SheetWriter
+from storage import LocalStorage, SheetsStorage
+
+TODAY = datetime.date(2025, 6, 30)
+TARGETS = {"calories": 2000, "protein": 120}
+CHAT, OTHER_CHATS = 1, range(2, 6)
+
+
+def five_years(backend):
+    rng = random.Random(3)
+    meals, workouts = [], []
+    for offset in range(5 * 365):
+        day = (TODAY - datetime.timedelta(days=offset)).isoformat()
+        for chat in (CHAT, *OTHER_CHATS):
+            for _ in range(rng.randint(3, 5)):
+                meals.append([day, "meal", "1", str(rng.randint(300, 700)), "10", "50", str(rng.randint(15, 40)), str(chat)])
+            if rng.random() < 0.5:
+                workouts.append([day, "running", "moderate", "30", str(rng.randint(200, 500)), str(chat)])
+    for start in range(0, len(meals), 1000):
+        backend.append(analytics.NUTRITION_SHEET, meals[start:start + 1000])
+    for start in range(0, len(workouts), 1000):
+        backend.append(analytics.FITNESS_SHEET, workouts[start:start + 1000])
+    return len(meals) + len(workouts)
+
+
+@pytest.fixture(scope="module", params=["local", "sheets"])
+def backend(request, tmp_path_factory):
+    if request.param == "local":
+        backend = LocalStorage(str(tmp_path_factory.mktemp("analytics") / "store.db"))
+    else:
+        backend = SheetsStorage(SheetWriter(journal_dir=None, batch_size=100_000), DailyIndex(":memory:"), FakeSpreadsheet())
+    backend.register(analytics.NUTRITION_SHEET, None, {"calories": 3, "fat": 4, "carbs": 5, "protein": 6}, chat_column=7)
+    backend.register(analytics.FITNESS_SHEET, None, {"calories": 4}, chat_column=5)
+    rows = five_years(backend)
+    if request.param == "sheets":
+        backend.writer.flush()
+        backend.daily_totals(analytics.NUTRITION_SHEET, CHAT, TODAY.isoformat(), TODAY.isoformat())  # index synced
+    backend.rows = rows
+    return backend
+
+
+@pytest.mark.parametrize("report", ["week", "month", "trend"])
+def test_report_over_five_years(backend, report):
+    build = {
+        "week": lambda: analytics.period_report(backend, CHAT, 7, TARGETS, "Last 7 days", today=TODAY),
+        "month": lambda: analytics.period_report(backend, CHAT, 30, TARGETS, "Last 30 days", today=TODAY),
+        "trend": lambda: analytics.trend_report(backend, CHAT, TARGETS, today=TODAY),
+    }[report]
+    build()  # warm
+    started = time.perf_counter()
+    for _ in range(10):
+        text = build()
+    seconds = (time.perf_counter() - started) / 10
+    print(f"/{report} over {backend.rows} rows ({type(backend).__name__}): {seconds * 1e3:.2f} ms")
+    assert "nothing logged" not in text and "no meals logged" not in text
+    assert seconds < 0.1
@@ -0,0 +1,44 @@
+# End-to-end benchmark suite (pytest-benchmark): the shipped recording
+# replayed through both bots for thousands of simulated users with the
+# offline fakes. pytest-benchmark times the whole replay; per-handler
+# latency, API calls per message and memory go into each benchmark's
+# extra_info, so `--benchmark-json` / `--benchmark-compare` track them too.
+import json
+import os
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+pytest.importorskip("telegram")
+pytest.importorskip("agents")
+
+import openai_pool  # noqa: E402
+import replay  # noqa: E402
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "data")
+USERS = int(os.getenv("BENCHMARK_USERS", "2000"))
+
+
+@pytest.fixture(scope="module")
+def recording():
+    records = replay.load_recording(os.path.join(DATA, "replay_session.jsonl"))
+    with open(os.path.join(DATA, "replay_completions.json"), encoding="utf-8") as f:
+        return records, json.load(f)
+
+
+def test_replay_session(benchmark, recording, monkeypatch):
+    monkeypatch.setattr(openai_pool, "_client", None)  # restored after replay.setup installs its fake
+    records, completions = recording
+    report = benchmark.pedantic(replay.run, args=(records, completions, USERS), rounds=1, iterations=1)
+
+    benchmark.extra_info.update(
+        users=USERS,
+        messages=report["messages"],
+        messages_per_second=report["messages"] / report["seconds"],
+        handlers={name: {"p50_ms": h["p50_ms"], "p90_ms": h["p90_ms"]} for name, h in report["handlers"].items()},
+        calls_per_message=report["calls_per_message"],
+        max_rss_bytes=report["memory"]["max_rss_bytes"],
+    )
+    assert report["replies_missed"] == 0
+    assert report["calls_per_message"]["openai"] < 0.05  # repeated meals come from the cache
+    assert report["calls_per_message"]["sheets"] < 0.05  # appends are batched
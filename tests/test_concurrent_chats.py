@@ -0,0 +1,44 @@
+# Load test of the shared runtime: hundreds of chats write to both bots at
+# the same moment, through the real dispatchers and the replay fakes, with
+# every OpenAI completion taking LATENCY seconds. All of them must be
+# answered, in about the time of one completion rather than hundreds.
+import time
+
+import pytest
+
+pytest.importorskip("telegram")
+pytest.importorskip("agents")
+
+import openai_pool  # noqa: E402
+import replay  # noqa: E402
+from async_runtime import runtime  # noqa: E402
+
+CHATS = 300
+LATENCY = 0.2
+
+
+def test_hundreds_of_chats_are_served_at_once(monkeypatch):
+    monkeypatch.setattr(openai_pool, "_client", None)  # restored after replay.setup installs its fake
+    bots, openai = replay.setup({}, openai_latency=LATENCY)
+    from telegram import Update
+
+    runtime.start()
+    sent, update_id = time.perf_counter(), 0
+    for n in range(CHATS):
+        chat_id = replay.FIRST_CHAT_ID + n
+        # A meal nobody else sends (one completion each) and free text for the agent
+        for bot, text in (("nutrition", f"a bowl of mystery stew no. {n}"), ("fitness", "hello coach")):
+            update_id += 1
+            data = replay.make_update(update_id, chat_id, text)
+            bots[bot].updater.dispatcher.process_update(Update.de_json(data, bots[bot].telegram))
+    assert runtime.wait_idle(60)
+    seconds = time.perf_counter() - sent
+
+    missed = [(name, n) for name, bot in bots.items() for n in range(CHATS)
+              if bot.telegram.last_reply.get(replay.FIRST_CHAT_ID + n, 0.0) < sent]
+    print(f"{2 * CHATS} messages from {CHATS} chats answered in {seconds:.2f}s "
+          f"({openai.calls} completions of {LATENCY}s: {openai.calls * LATENCY:.0f}s one after another)")
+    assert missed == []
+    assert openai.calls == CHATS
+    assert bots["fitness"].runner.runs == CHATS
+    assert seconds < openai.calls * LATENCY / 10
@@ -0,0 +1,69 @@
+# The per-day index on a synthetic 100k-row sheet: /summary costs the same
+# as on a small sheet and never reads the sheet again, rows typed into the
+# sheet by hand are picked up by reading only the gap, and a rebuild starts over.
+import statistics
+import time
+
+from daily_index import DailyIndex
+from fake_sheets import FakeWorksheet
+
+ROWS = 100_000
+CHATS = 200
+
+
+def synthetic_sheet(rows):
+    worksheet = FakeWorksheet("Calories")
+    for n in range(rows):
+        day = f"2024-{n % 12 + 1:02d}-{n % 28 + 1:02d}"
+        worksheet.rows.append([day, "apple", "1", "95", "0.3", "25", "0.5", str(n % CHATS)])
+    return worksheet
+
+
+def indexed(worksheet):
+    index = DailyIndex(":memory:")
+    index.register("Calories", {"calories": 3, "protein": 6}, chat_column=7)
+    index.ensure_synced("Calories", worksheet)
+    return index
+
+
+def summary_seconds(index, worksheet):
+    samples = []
+    for chat in range(CHATS):
+        started = time.perf_counter()
+        index.ensure_synced("Calories", worksheet)
+        index.totals("Calories", "2024-03-03", str(chat))
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def test_summary_cost_does_not_grow_with_the_sheet():
+    small_sheet, big_sheet = synthetic_sheet(1_000), synthetic_sheet(ROWS)
+    small = summary_seconds(indexed(small_sheet), small_sheet)
+
+    started = time.perf_counter()
+    index = indexed(big_sheet)
+    first_sync = time.perf_counter() - started
+    reads = big_sheet.spreadsheet.api_calls
+    big = summary_seconds(index, big_sheet)
+
+    print(f"{ROWS} rows: indexed once in {first_sync:.2f}s; summary p50 {big * 1e6:.0f} us "
+          f"(1,000 rows: {small * 1e6:.0f} us)")
+    assert big_sheet.spreadsheet.api_calls == reads == 1
+    assert big < 3 * small + 50e-6
+    expected = sum(95.0 for row in big_sheet.rows[1:] if row[0] == "2024-03-03" and row[7] == "7")
+    assert index.totals("Calories", "2024-03-03", "7")["calories"] == expected
+
+
+def test_rows_added_by_hand_are_read_from_the_last_offset():
+    worksheet = synthetic_sheet(ROWS)
+    index = indexed(worksheet)
+    worksheet.rows.append(["2024-03-03", "pear", "1", "100", "0", "0", "0", "7"])  # typed into the sheet
+    before = index.totals("Calories", "2024-03-03", "7")["calories"]
+
+    worksheet.append_rows([["2024-03-03", "kiwi", "1", "40", "0", "0", "0", "7"]])
+    index.add_rows("Calories", len(worksheet.rows), worksheet.rows[-1:])  # doesn't follow the indexed rows
+    assert index.sync("Calories", worksheet) == 2  # only the gap is read
+    assert index.totals("Calories", "2024-03-03", "7")["calories"] == before + 140.0
+
+    assert index.rebuild("Calories", worksheet) == ROWS + 3  # header included
+    assert index.totals("Calories", "2024-03-03", "7")["calories"] == before + 140.0
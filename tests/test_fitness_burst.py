@@ -0,0 +1,138 @@
+# Quick fitness follow-ups through the real handler, coalescer and storage:
+# how many replies and agent (LLM) runs a burst costs, and that every workout
+# in it is logged with the corrections applied.
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+import Fitness_agent  # noqa: E402
+from async_runtime import runtime  # noqa: E402
+from storage import storage  # noqa: E402
+
+WINDOW = 0.3
+
+
+class Chat:
+    """Sends texts through handle_message and records the bot's replies."""
+
+    next_id = 500000
+
+    def __init__(self):
+        Chat.next_id += 1
+        self.chat_id = Chat.next_id
+        self.replies = []
+
+    def send(self, *texts):
+        for text in texts:
+            message = SimpleNamespace(chat_id=self.chat_id, text=text,
+                                      reply_text=lambda reply, **kwargs: self.replies.append(reply))
+            Fitness_agent.handle_message(SimpleNamespace(message=message), None)
+        assert runtime.wait_idle(5)
+
+    def logged(self):
+        storage.writer.flush()
+        rows = storage._spreadsheet.worksheet("Fitness").rows[1:]
+        return [(row[1], int(row[3]), row[2]) for row in rows if row[5] == str(self.chat_id)]
+
+
+@pytest.fixture(autouse=True)
+def bot(monkeypatch):
+    agent_runs = []
+
+    async def run_agent(update, user_input, started):
+        agent_runs.append(user_input)
+        update.message.reply_text("agent reply")
+
+    monkeypatch.setattr(Fitness_agent, "run_agent", run_agent)
+    monkeypatch.setattr(Fitness_agent.incoming, "window", WINDOW)
+    runtime.start()
+    return agent_runs
+
+
+def test_burst_costs_one_reply_and_no_agent_run(bot):
+    chat = Chat()
+    chat.send("swimming", "45 min", "moderate")
+    assert chat.logged() == [("swimming", 45, "moderate")]
+    assert len(chat.replies) == 1  # instead of one per message
+    assert bot == []
+
+
+def test_complete_workouts_in_one_burst_are_all_logged(bot):
+    chat = Chat()
+    chat.send("swimming 45 min moderate", "walking 30 min light")
+    assert chat.logged() == [("swimming", 45, "moderate"), ("walking", 30, "light")]
+    assert len(chat.replies) == 2
+
+
+def test_later_message_corrects_an_earlier_one(bot):
+    chat = Chat()
+    chat.send("swimming 45 min", "actually 60", "moderate")
+    assert chat.logged() == [("swimming", 60, "moderate")]
+
+
+def test_complete_workout_does_not_wait_for_the_window(bot):
+    chat = Chat()
+    started = time.perf_counter()
+    chat.send("cycling 40 min intense")
+    assert time.perf_counter() - started < WINDOW
+    assert chat.logged() == [("cycling", 40, "intense")]
+
+
+def test_partial_burst_asks_once_for_what_is_missing(bot):
+    chat = Chat()
+    chat.send("ran", "30 min")
+    assert chat.logged() == []
+    assert len(chat.replies) == 1 and "intensity" in chat.replies[0]
+    chat.send("intense")
+    assert chat.logged() == [("running", 30, "intense")]
+
+
+def test_unrecognized_burst_is_one_agent_run(bot):
+    chat = Chat()
+    chat.send("hi coach", "what should I train today?")
+    assert bot == ["hi coach what should I train today?"]
+    assert len(chat.replies) == 1
+
+
+def test_implausible_duration_is_confirmed_before_logging(bot):
+    chat = Chat()
+    chat.send("walking 1000 minutes moderate")
+    assert chat.logged() == []
+    assert "yes" in chat.replies[-1]
+    chat.send("yes")
+    assert chat.logged() == [("walking", 1000, "moderate")]
+
+
+def test_corrected_duration_replaces_the_implausible_one(bot):
+    chat = Chat()
+    chat.send("walking 1000 minutes moderate")
+    chat.send("100 min")
+    assert chat.logged() == [("walking", 100, "moderate")]
+
+
+def test_confirmation_expires_with_the_pending_workout(bot, monkeypatch):
+    chat = Chat()
+    chat.send("walking 1000 minutes moderate")
+    monkeypatch.setattr(Fitness_agent.pending_workouts, "ttl", 0)
+    time.sleep(0.01)
+    chat.send("yes")
+    assert chat.logged() == []
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_held_workouts_share_the_chat_limit(backend, tmp_path):
+    from met_catalog import Workout
+    from state_store import MemoryStateStore, SQLiteStateStore
+
+    store = MemoryStateStore(max_chats=10) if backend == "memory" else \
+        SQLiteStateStore(str(tmp_path / "state.db"), max_chats=10)
+    for chat_id in range(25):
+        store.hold(chat_id, Workout("walking", 1000 + chat_id, "moderate"))
+    assert len(store) == 10
+    assert store.confirm(0) is None
+    workout = store.confirm(24)
+    assert (workout.exercise_type, workout.duration, workout.intensity) == ("walking", 1024, "moderate")
+    assert store.confirm(24) is None
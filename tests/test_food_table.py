@@ -0,0 +1,80 @@
+import time
+
+import pytest
+
+from food_table import FoodTable
+from nutrition_cache import parse_query
+
+foods = FoodTable()
+
+
+@pytest.mark.parametrize("text", ["grapes", "butter", "almonds", "2 servings of grapes"])
+def test_portion_of_small_pieces_is_left_to_the_llm(text):
+    assert foods.lookup(parse_query(text)) is None
+
+
+@pytest.mark.parametrize("text, grams", [
+    ("10 grapes", 50), ("a grape", 5), ("1 tbsp butter", 15), ("apple", 182), ("2 eggs", 100),
+])
+def test_counts_and_measures_stay_local(text, grams):
+    entry = foods.lookup(parse_query(text))
+    food_id, _ = foods.match(parse_query(text).name)
+    assert entry["calories"] == round(foods.columns["calories"][food_id] * grams / 100.0, 1)
+
+
+def test_bare_name_is_one_serving():
+    assert parse_query("grapes").unit == "serving"
+    assert parse_query("3 grapes").unit == "piece"
+
+
+@pytest.mark.parametrize("text", ["1 chocolate bar", "1 pizza", "2 slices of pizza", "1 slice of cake"])
+def test_near_misses_are_left_to_the_llm(text):
+    assert foods.lookup(parse_query(text)) is None
+
+
+@pytest.mark.parametrize("text, item", [
+    ("bananas", "banana"), ("200g greek yogurts", "greek yogurt"), ("150 g strawbery", "strawberries"), ("1 protein bar", "protein bar"),
+])
+def test_plurals_and_spelling_still_match(text, item):
+    assert foods.lookup(parse_query(text))["item"] == item
+
+
+def test_lookup_latency_over_10k_foods(tmp_path):
+    styles = ["raw", "boiled", "baked", "fried", "grilled", "steamed", "smoked", "dried", "roasted", "canned"]
+    kinds = ["red", "green", "wild", "sweet", "young", "giant", "baby", "spiced", "organic", "classic",
+             "golden", "black", "white", "mini", "crispy", "creamy", "sour", "salted", "fresh", "frozen"]
+    bases = ["bean", "lentil", "carrot", "pepper", "onion", "cabbage", "noodle", "dumpling", "pancake", "waffle",
+             "salmon", "trout", "turkey", "lamb", "tofu", "tempeh", "quinoa", "barley", "muffin", "bagel",
+             "plum", "apricot", "cherry", "mango", "papaya", "squash", "pumpkin", "radish", "turnip", "leek",
+             "sausage", "meatball", "pasty", "scone", "biscotti", "brownie", "pudding", "custard", "sorbet", "soup",
+             "chowder", "stew", "curry", "risotto", "paella", "burrito", "taco", "falafel", "hummus", "pesto",
+             "omelette", "crepe"]
+    path = tmp_path / "foods.csv"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("name,aliases,piece_g,calories,fat,carbs,protein\n")
+        for style in styles:
+            for kind in kinds:
+                for base in bases:
+                    f.write(f"{style} {kind} {base},,50,150,5.0,20.0,6.0\n")
+    table = FoodTable(str(path))
+    assert len(table) >= 10_000
+
+    queries = []
+    for i in range(10_000):
+        style, kind, base = styles[i % 10], kinds[i // 10 % 20], bases[i * 7 % len(bases)]
+        queries.append([f"2 {style} {kind} {base}s",          # plural
+                        f"100g {style} {kind} {base[:-1]}",    # typo
+                        f"1 {kind} {base}",                    # partial name
+                        f"3 {style} unicorn {base}"][i % 4])   # unknown word
+    latencies = []
+    answered = 0
+    for text in queries:
+        started = time.perf_counter()
+        answered += table.lookup(parse_query(text)) is not None
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    p50, p99 = latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+    print(f"{len(queries)} lookups over {len(table)} foods: p50 {p50 * 1e3:.3f} ms, p99 {p99 * 1e3:.3f} ms, "
+          f"{answered} answered locally")
+    assert answered >= len(queries) // 2
+    assert p50 < 0.005 and p99 < 0.025  # loose enough for a slow CI machine
@@ -0,0 +1,47 @@
+# Memory and startup of both bots in one bot_host process, compared with the
+# two scripts running as separate processes. Each process imports its bots,
+# builds their updaters and agents and creates the OpenAI client (everything
+# a started bot holds before the first message, without touching the network).
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("telegram")
+pytest.importorskip("agents")
+
+SRC = os.path.join(os.path.dirname(__file__), os.pardir, "src")
+
+START = """
+import importlib, json, resource, sys, time
+started = time.perf_counter()
+import openai_pool
+for name in sys.argv[1:]:
+    module = importlib.import_module(name)
+    module.create_updater()
+    module.get_agent()
+    module.get_runner()
+openai_pool.get_client()
+print(json.dumps({"seconds": time.perf_counter() - started,
+                  "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}))
+"""
+
+
+def start(*modules):
+    env = dict(os.environ, OPENAI_API_KEY_HW="sk-test")
+    result = subprocess.run([sys.executable, "-c", START, *modules],
+                            cwd=SRC, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_one_host_is_lighter_than_two_processes():
+    host = start("Nutrition_agent", "Fitness_agent")
+    nutrition, fitness = start("Nutrition_agent"), start("Fitness_agent")
+    separate_rss = nutrition["max_rss_kb"] + fitness["max_rss_kb"]
+    print(f"one host: {host['max_rss_kb'] / 1024:.0f} MiB, {host['seconds']:.2f}s to start; "
+          f"two processes: {separate_rss / 1024:.0f} MiB, "
+          f"{nutrition['seconds'] + fitness['seconds']:.2f}s of startup in total")
+    assert host["max_rss_kb"] < 0.75 * separate_rss
+    assert host["seconds"] < nutrition["seconds"] + fitness["seconds"]
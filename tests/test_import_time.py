@@ -0,0 +1,31 @@
+# Startup benchmark: importing a bot must stay cheap, so the heavy SDKs have
+# to stay lazy (get_agent, get_runner, create_updater, get_openai_client).
+# IMPORT_TIME_BUDGET_MS sets the regression threshold for slower machines.
+import os
+import subprocess
+import sys
+
+import pytest
+
+SRC = os.path.join(os.path.dirname(__file__), os.pardir, "src")
+BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "500"))
+LAZY = {"telegram", "agents", "openai", "gspread"}
+
+
+def import_times(module):
+    """{module: cumulative microseconds} from `python -X importtime -c "import <module>"`."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=SRC, env=os.environ, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line and "cumulative" not in line:
+            _, cumulative, name = line.split("|")
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize("module", ["Nutrition_agent", "Fitness_agent", "bot_host"])
+def test_import_time(module):
+    times = import_times(module)
+    assert not LAZY & set(times), f"{module} imports {sorted(LAZY & set(times))} at startup"
+    assert times[module] / 1000 < BUDGET_MS
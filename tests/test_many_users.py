@@ -0,0 +1,89 @@
+# 1,000 synthetic users on every backend: a /summary, a /reset_day and a
+# profile read cost the same for one user whether the deployment has ten
+# users or a thousand (on the sheets backend a reset is still one request,
+# but re-numbering the rows below it grows with the sheet), and a reset only
+# ever touches that user's rows.
+import statistics
+import time
+
+import pytest
+
+from daily_index import DailyIndex
+from fake_sheets import FakeSpreadsheet
+from sheet_writer import SheetWriter
+from storage import LocalStorage, SheetsStorage
+from user_profiles import UserProfiles
+
+USERS = 1000
+DAYS = 30
+DAY = "2025-01-30"
+
+
+def backend(kind, path):
+    if kind == "sheets":
+        backend = SheetsStorage(SheetWriter(journal_dir=None), DailyIndex(":memory:"), FakeSpreadsheet())
+    else:
+        backend = LocalStorage(path)
+    backend.register("Calories", None, {"calories": 3, "protein": 6}, chat_column=7, id_column=8)
+    return backend
+
+
+def populate(backend, users):
+    for day in range(1, DAYS + 1):
+        backend.append("Calories", [[f"2025-01-{day:02d}", "apple", "1", "95", "0.3", "25", "0.5", str(chat)]
+                                    for chat in range(users)])
+    if isinstance(backend, SheetsStorage):
+        backend.writer.flush()
+    backend.totals("Calories", DAY, 0)  # first summary indexes the sheet
+
+
+def median_seconds(operation, chats):
+    samples = []
+    for chat in chats:
+        started = time.perf_counter()
+        operation(chat)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def costs(backend, users):
+    populate(backend, users)
+    chats = range(0, users, max(users // 10, 1))
+    summary = median_seconds(lambda chat: backend.totals("Calories", DAY, chat), chats)
+    reset = median_seconds(lambda chat: backend.reset_day("Calories", DAY, chat), chats)
+    return summary, reset
+
+
+@pytest.mark.parametrize("kind", ["sheets", "local"])
+def test_one_users_cost_does_not_grow_with_the_deployment(kind, tmp_path):
+    small = costs(backend(kind, str(tmp_path / "small.db")), 10)
+    store = backend(kind, str(tmp_path / "large.db"))
+    summary, reset = costs(store, USERS)
+    print(f"{kind}, {USERS} users x {DAYS} days: summary {summary * 1e6:.0f} us, reset {reset * 1e6:.0f} us "
+          f"(10 users: {small[0] * 1e6:.0f} us, {small[1] * 1e6:.0f} us)")
+    assert summary < 3 * small[0] + 200e-6
+    if kind == "sheets":
+        # Deleting rows renumbers the ones below them, in Sheets and in the index,
+        # so only the request count is independent of the deployment there
+        before = store._spreadsheet.api_calls
+        store.reset_day("Calories", "2025-01-29", 5)
+        assert store._spreadsheet.api_calls - before == 1
+    else:
+        assert reset < 3 * small[1] + 500e-6
+    # Resets removed only the sampled users' day
+    assert store.totals("Calories", DAY, 0)["calories"] == 0.0
+    assert store.totals("Calories", DAY, 1)["calories"] == 95.0
+    assert store.totals("Calories", "2025-01-29", 0)["calories"] == 95.0
+
+
+def test_profiles_are_read_from_memory_after_the_first_time(tmp_path):
+    path = str(tmp_path / "profiles.db")
+    writer = UserProfiles(path)
+    for chat in range(USERS):
+        writer.update(chat, weight_kg=60 + chat % 40)
+    profiles = UserProfiles(path)  # a restarted bot: nothing cached yet
+    cold = median_seconds(profiles.get, range(USERS))
+    warm = median_seconds(profiles.get, range(USERS))
+    print(f"profile of one of {USERS} users: {cold * 1e6:.1f} us first read, {warm * 1e6:.1f} us cached")
+    assert profiles.get(7)["weight_kg"] == 67
+    assert warm <= cold
@@ -0,0 +1,57 @@
+# Five-item meal benchmark: the whole meal in one structured completion
+# against the per-item path (one log_nutrition call, and completion, per
+# item, one after another as the agent used to make them), with every
+# replayed completion taking LATENCY seconds.
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+import Nutrition_agent  # noqa: E402
+import openai_pool  # noqa: E402
+from replay import ReplayOpenAI  # noqa: E402
+
+LATENCY = 0.1
+ITEMS = {
+    "2 quail eggs": {"item": "quail eggs", "quantity": "2", "calories": 28, "fat": 2, "carbs": 0.1, "protein": 2.4},
+    "a slice of sourdough": {"item": "sourdough", "quantity": "1 slice", "calories": 120, "fat": 0.8, "carbs": 24,
+                             "protein": 4.5},
+    "a flat white": {"item": "flat white", "quantity": "1 cup", "calories": 110, "fat": 6, "carbs": 9, "protein": 6},
+    "a dragonfruit": {"item": "dragonfruit", "quantity": "1", "calories": 60, "fat": 0.4, "carbs": 13, "protein": 1.2},
+    "a bowl of poi": {"item": "poi", "quantity": "1 bowl", "calories": 270, "fat": 0.3, "carbs": 65, "protein": 1},
+}
+MEAL = "2 quail eggs, a slice of sourdough, a flat white, a dragonfruit and a bowl of poi"
+
+
+@pytest.fixture(autouse=True)
+def openai(monkeypatch):
+    client = ReplayOpenAI({**ITEMS, MEAL: list(ITEMS.values())}, latency=LATENCY)
+    monkeypatch.setattr(openai_pool, "_client", client)
+    monkeypatch.setattr(Nutrition_agent.cache, "get", lambda query: None)
+    return client
+
+
+def timed(meals, chat_id):
+    ctx = SimpleNamespace(context=SimpleNamespace(chat_id=chat_id))
+
+    async def log_all():
+        return [await Nutrition_agent.log_nutrition(ctx, meal) for meal in meals]
+
+    started = time.perf_counter()
+    answers = asyncio.run(log_all())
+    assert all(answer.startswith("✅") for answer in answers)
+    return time.perf_counter() - started
+
+
+def test_five_item_meal_is_one_completion(openai):
+    one = timed([MEAL], 700101)
+    batched_calls = openai.calls
+    per_item = timed(list(ITEMS), 700102)
+    print(f"five-item meal: {one * 1e3:.0f} ms in one completion, "
+          f"{per_item * 1e3:.0f} ms item by item ({openai.calls - batched_calls} completions)")
+    assert batched_calls == 1
+    assert openai.calls - batched_calls == len(ITEMS)
+    assert one < per_item / 3
@@ -0,0 +1,62 @@
+# Meals are split locally only to look their parts up in the cache and the
+# food table; anything else goes to the model as the whole message.
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+import Nutrition_agent  # noqa: E402
+import openai_pool  # noqa: E402
+from Nutrition_agent import split_meal  # noqa: E402
+from replay import ReplayOpenAI  # noqa: E402
+from storage import storage  # noqa: E402
+
+DISHES = {
+    "mac and cheese": {"item": "mac and cheese", "quantity": "1 bowl", "calories": 480, "fat": 22, "carbs": 52,
+                       "protein": 18},
+    "fish & chips and a banana": [
+        {"item": "fish & chips", "quantity": "1 portion", "calories": 840, "fat": 45, "carbs": 80, "protein": 30},
+        {"item": "banana", "quantity": "1", "calories": 105, "fat": 0.4, "carbs": 27, "protein": 1.3},
+    ],
+}
+
+
+@pytest.fixture(autouse=True)
+def openai(monkeypatch):
+    client = ReplayOpenAI(DISHES)
+    monkeypatch.setattr(openai_pool, "_client", client)
+    monkeypatch.setattr(Nutrition_agent.cache, "get", lambda query: None)
+    return client
+
+
+def log(meal, chat_id=1):
+    return asyncio.run(Nutrition_agent.log_nutrition(SimpleNamespace(context=SimpleNamespace(chat_id=chat_id)), meal))
+
+
+def logged(chat_id):
+    storage.writer.flush()
+    return [row[1] for row in storage._spreadsheet.worksheet("Calories").rows[1:] if row[7] == str(chat_id)]
+
+
+def test_decimal_comma_is_not_a_separator():
+    assert split_meal("1,5 kg potatoes") == ["1,5 kg potatoes"]
+    assert split_meal("2 eggs,toast, 1,5 l milk") == ["2 eggs", "toast", "1,5 l milk"]
+
+
+def test_known_parts_are_answered_locally(openai):
+    answer = log("2 eggs, toast and a banana")
+    assert openai.calls == 0
+    assert answer.count("✅ Logged") == 3
+    assert "Calories: 1155.0 kcal" in log("1,5 kg potatoes")
+
+
+@pytest.mark.parametrize("chat_id, meal, items", [
+    (800001, "mac and cheese", ["mac and cheese"]),
+    (800002, "fish & chips and a banana", ["fish & chips", "banana"]),
+])
+def test_dishes_go_to_the_model_whole(openai, chat_id, meal, items):
+    log(meal, chat_id)
+    assert openai.calls == 1
+    assert logged(chat_id) == items
@@ -0,0 +1,77 @@
+# The one-pass workout matcher: which numbers count as a duration, and a
+# micro-benchmark showing the parse cost stays flat as the catalog grows.
+import csv
+import time
+
+import pytest
+
+from met_catalog import CATALOG_PATH, MetCatalog, Workout, catalog
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("swimming 45 minutes moderate", Workout("swimming", 45, "moderate")),
+    ("ran 1.5 hours hard", Workout("running", 90, "intense")),
+    ("swimming 45 moderate", Workout("swimming", 45, "moderate")),
+    ("walked 10000 steps moderate", Workout("walking", None, "moderate")),
+    ("walked 10,000 steps", Workout("walking", None, None)),
+    ("swam 20 laps light", Workout("swimming", None, "light")),
+    ("ran 5 km in 30", Workout("running", 30, None)),
+    ("3 sets of 12 reps", Workout(None, None, None)),
+    ("cycling 2h30 moderate", Workout("cycling", 150, "moderate")),
+    ("walking 2h30m", Workout("walking", 150, None)),
+    ("I ran for 1 hour and 15 min", Workout("running", 75, None)),
+    ("swim 2 hours 30 minutes", Workout("swimming", 150, None)),
+    ("did 3x10 squats", Workout(None, None, None)),
+    ("weights 4 x 8 for 40 min", Workout("fitness (weights)", 40, None)),
+])
+def test_parse(text, expected):
+    assert catalog.parse(text) == expected
+
+
+MESSAGES = [
+    "swimming 45 minutes moderate", "ran 1.5 hours hard", "cycling 2h30 moderate",
+    "walked for 20 min after lunch, pretty easy pace", "yoga", "45 min", "intense",
+    "I ran for 1 hour and 15 min this morning and it felt hard",
+]
+
+
+def big_catalog(path, activities):
+    """The real catalog plus generated compendium-style activities (with aliases)."""
+    with open(CATALOG_PATH, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    sports = ["rowing", "skating", "climbing", "paddling", "skiing", "dancing", "boxing", "hiking"]
+    styles = ["indoor", "outdoor", "competitive", "recreational", "interval", "uphill", "team", "solo"]
+    n = 0
+    while len(rows) < activities:
+        name = f"{styles[n % 8]} {sports[n // 8 % 8]} variant {n}"
+        rows.append({"activity": name, "aliases": f"{name} session;var{n} training",
+                     "light": "3.0", "moderate": "5.0", "intense": "8.0"})
+        n += 1
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["activity", "aliases", "light", "moderate", "intense"])
+        writer.writeheader()
+        writer.writerows(rows)
+    return MetCatalog(str(path))
+
+
+def parse_seconds(matcher, rounds=200):
+    """Best per-message parse time over a few repeats (the catalog is loaded first)."""
+    len(matcher)
+    best = float("inf")
+    for _ in range(5):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for text in MESSAGES:
+                matcher.parse(text)
+        best = min(best, (time.perf_counter() - started) / (rounds * len(MESSAGES)))
+    return best
+
+
+def test_parse_cost_stays_flat_with_800_activities(tmp_path):
+    small = parse_seconds(MetCatalog())
+    large_catalog = big_catalog(tmp_path / "met_catalog.csv", 850)
+    assert len(large_catalog) >= 800
+    large = parse_seconds(large_catalog)
+    print(f"parse: {small * 1e6:.1f} us/message with {len(catalog)} activities, "
+          f"{large * 1e6:.1f} us/message with {len(large_catalog)}")
+    assert large < 2 * small + 20e-6
@@ -0,0 +1,59 @@
+# Span overhead: the spans a Fitness message goes through (parse, the
+# log_exercise tool on the agent path, storage) must cost under 1% of handling
+# the message. Measured through the real dispatcher with the replay fakes, so
+# the message time has no network in it and is a lower bound.
+import timeit
+
+import pytest
+
+pytest.importorskip("telegram")
+pytest.importorskip("agents")
+
+import Fitness_agent  # noqa: E402
+import metrics  # noqa: E402
+import openai_pool  # noqa: E402
+import replay  # noqa: E402
+from async_runtime import runtime  # noqa: E402
+
+MESSAGES = 600
+TEXTS = ("swimming 45 minutes moderate", "hello coach")  # fast path, agent run
+
+
+def span_seconds():
+    number = 20000
+    return min(timeit.repeat('with metrics.span("probe"): pass', globals={"metrics": metrics},
+                             number=number, repeat=5)) / number
+
+
+def test_span_overhead_is_under_one_percent_of_a_message(monkeypatch):
+    monkeypatch.setattr(openai_pool, "_client", None)  # restored after replay.setup installs its fake
+    bots, _ = replay.setup({}, openai_latency=0.0)
+    monkeypatch.setattr(Fitness_agent.incoming, "window", 0)
+    from telegram import Update
+
+    spans = []
+
+    class counted(metrics.span):
+        __slots__ = ()
+
+        def __enter__(self):
+            spans.append(self.name)
+            return super().__enter__()
+
+    monkeypatch.setattr(metrics, "span", counted)
+    bot = bots["fitness"]
+    runtime.start()
+    started = timeit.default_timer()
+    for n in range(MESSAGES):
+        data = replay.make_update(n + 1, replay.FIRST_CHAT_ID + n, TEXTS[n % 2])
+        bot.updater.dispatcher.process_update(Update.de_json(data, bot.telegram))
+        assert runtime.wait_idle(5)
+    per_message = (timeit.default_timer() - started) / MESSAGES
+    monkeypatch.undo()
+
+    assert "fitness_log_tool" in spans
+    per_span = span_seconds()
+    overhead = len(spans) / MESSAGES * per_span
+    print(f"{len(spans) / MESSAGES:.1f} spans of {per_span * 1e6:.2f} us per message: "
+          f"{overhead * 1e6:.1f} us of {per_message * 1e6:.0f} us ({overhead / per_message:.2%})")
+    assert overhead < 0.01 * per_message
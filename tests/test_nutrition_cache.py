@@ -0,0 +1,80 @@
+# The lookup cache: hot entries survive eviction, and a month of typical meal
+# logs is mostly served locally (hit rate, token savings, hit latency).
+import random
+import time
+
+import nutrition_cache
+from nutrition_cache import NutritionCache, parse_query
+
+LLM_TOKENS = 350  # a typical structured nutrition completion
+
+
+def entry(calories):
+    return {"item": "x", "calories": calories, "fat": 1.0, "carbs": 2.0, "protein": 3.0}
+
+
+def test_memory_hits_keep_entries_from_being_evicted(tmp_path, monkeypatch):
+    clock = iter(range(1_000_000))
+    monkeypatch.setattr(nutrition_cache.time, "time", lambda: float(next(clock)))
+    cache = NutritionCache(str(tmp_path / "cache.db"), max_entries=3)
+    for food in ("1 apple", "1 banana", "1 pear"):
+        cache.put(parse_query(food), entry(100))
+    for _ in range(5):
+        assert cache.get(parse_query("1 apple")) is not None  # served from memory every time
+
+    cache.put(parse_query("1 kiwi"), entry(40))  # over the limit: the least recently used goes
+    assert cache.get(parse_query("1 apple")) is not None
+    cache._memory.clear()  # what survived in SQLite
+    assert cache.get(parse_query("1 banana")) is None
+    assert cache.get(parse_query("1 apple")) is not None
+
+
+MEALS = {
+    "breakfast": ["2 eggs", "1 slice of toast", "200g greek yogurt", "1 banana", "40g oats", "250ml milk",
+                  "1 cup of coffee", "1 croissant", "1 tbsp honey"],
+    "lunch": ["1 chicken sandwich", "150g chicken breast", "200g rice", "1 apple", "1 salad", "300ml tomato soup",
+              "1 tuna wrap", "100g hummus"],
+    "dinner": ["200g salmon", "250g pasta", "150g broccoli", "200g potatoes", "1 steak", "2 slices of pizza",
+               "300g lasagna", "150g tofu", "1 glass of red wine"],
+    "snack": ["1 protein bar", "30g almonds", "1 orange", "2 cookies", "1 yogurt", "20g dark chocolate"],
+}
+
+
+def month_of_logs(seed=7):
+    """30 days of meals: a small personal repertoire, with varying amounts and the odd new food."""
+    rng = random.Random(seed)
+    logs = []
+    for day in range(30):
+        for meal, foods in MEALS.items():
+            for food in rng.sample(foods, rng.randint(1, 3)):
+                if rng.random() < 0.2:  # a different amount of the same food
+                    food = food.replace("1 ", f"{rng.randint(2, 3)} ", 1).replace("200g", f"{rng.choice([150, 250])}g")
+                if rng.random() < 0.05:  # something new
+                    food = f"1 serving of dish {day}-{meal}"
+                logs.append(food)
+    return logs
+
+
+def test_month_replay_hit_rate(tmp_path):
+    cache = NutritionCache(str(tmp_path / "cache.db"))
+    logs = month_of_logs()
+    llm_calls, hit_latencies = 0, []
+    for text in logs:
+        query = parse_query(text)
+        started = time.perf_counter()
+        cached = cache.get(query)
+        if cached is not None:
+            hit_latencies.append(time.perf_counter() - started)
+            continue
+        llm_calls += 1
+        cache.put(query, entry(100 * query.quantity), tokens=LLM_TOKENS)
+
+    stats = cache.stats()
+    hit_latencies.sort()
+    p50 = hit_latencies[len(hit_latencies) // 2]
+    print(f"{len(logs)} logged foods in a month: hit rate {stats['hit_rate']:.0%}, {llm_calls} completions, "
+          f"{stats['tokens_saved']} tokens saved, hit p50 {p50 * 1e6:.0f} us")
+    assert stats["hits"] + llm_calls == len(logs)
+    assert stats["hit_rate"] > 0.7
+    assert stats["tokens_saved"] == stats["hits"] * LLM_TOKENS
+    assert p50 < 200e-6
@@ -0,0 +1,76 @@
+# The early "⏳ ... logging..." reply is best effort: a Telegram error while
+# sending it must neither lose the meal nor fail the OpenAI request that
+# other chats asking for the same food are waiting on. It is only sent while
+# the model runs: meals answered locally get just the final reply.
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+import Nutrition_agent  # noqa: E402
+import openai_pool  # noqa: E402
+from replay import ReplayOpenAI  # noqa: E402
+from storage import storage  # noqa: E402
+
+RECORDED = {"1 dragonfruit": {"item": "dragonfruit", "quantity": "1", "calories": 60,
+                              "fat": 0.4, "carbs": 13, "protein": 1.2}}
+
+
+@pytest.fixture(autouse=True)
+def openai(monkeypatch):
+    client = ReplayOpenAI(RECORDED, latency=0.05)
+    monkeypatch.setattr(openai_pool, "_client", client)
+    # Every meal goes to the (fake) model, not to the cache of an earlier test
+    monkeypatch.setattr(Nutrition_agent.cache, "get", lambda query: None)
+    return client
+
+
+def broken_telegram_reply(chat_id):
+    def reply_text(text, **kwargs):
+        raise ConnectionError("Telegram is unreachable")
+    return Nutrition_agent.MealReply(SimpleNamespace(message=SimpleNamespace(chat_id=chat_id, reply_text=reply_text)))
+
+
+def logged(chat_id):
+    storage.writer.flush()
+    return [row[1] for row in storage._spreadsheet.worksheet("Calories").rows[1:] if row[7] == str(chat_id)]
+
+
+def test_meal_is_stored_when_the_progress_message_fails(openai):
+    reply = broken_telegram_reply(700001)
+    answer = asyncio.run(Nutrition_agent.log_nutrition(SimpleNamespace(context=reply), "1 dragonfruit"))
+    assert answer.startswith("✅ Logged: 1 dragonfruit")
+    assert logged(700001) == ["dragonfruit"]
+
+
+def test_failing_callback_does_not_fail_the_shared_request(openai):
+    async def both():
+        return await asyncio.gather(
+            Nutrition_agent.log_nutrition(SimpleNamespace(context=broken_telegram_reply(700002)), "1 dragonfruit"),
+            Nutrition_agent.log_nutrition(SimpleNamespace(context=broken_telegram_reply(700003)), "1 dragonfruit"),
+        )
+
+    answers = asyncio.run(both())
+    assert all(answer.startswith("✅") for answer in answers)
+    assert openai.calls == 1
+    assert logged(700002) == logged(700003) == ["dragonfruit"]
+
+
+def recording_reply(chat_id):
+    sent = []
+    message = SimpleNamespace(chat_id=chat_id, reply_text=lambda text, **kwargs: sent.append(text))
+    return Nutrition_agent.MealReply(SimpleNamespace(message=message)), sent
+
+
+def test_progress_message_only_while_the_model_runs(openai):
+    local, local_sent = recording_reply(700004)
+    answer = asyncio.run(Nutrition_agent.log_nutrition(SimpleNamespace(context=local), "1 banana"))
+    assert answer.startswith("✅ Logged:") and openai.calls == 0
+    assert local_sent == []  # from the food table: only the final reply will be sent
+
+    remote, remote_sent = recording_reply(700005)
+    asyncio.run(Nutrition_agent.log_nutrition(SimpleNamespace(context=remote), "1 dragonfruit"))
+    assert openai.calls == 1
+    assert [text.startswith("⏳") for text in remote_sent] == [True]
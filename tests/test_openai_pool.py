@@ -0,0 +1,95 @@
+# Load test of the shared OpenAI client against a local mock of the Chat
+# Completions API (real SDK, real HTTP, streamed tool calls): identical meals
+# asked for at once cost one request, the rate limiter paces the rest, and it
+# keeps working when each run brings its own event loop.
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+import Nutrition_agent  # noqa: E402
+import openai_pool  # noqa: E402
+
+LATENCY = 0.05
+
+
+class MockOpenAI(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like api.openai.com
+    hits = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        meal = body["messages"][-1]["content"].rsplit("Meal: ", 1)[1]
+        MockOpenAI.hits.append(meal)
+        time.sleep(LATENCY)
+        arguments = json.dumps({"items": [{"item": meal, "quantity": "1", "calories": 100,
+                                           "fat": 1, "carbs": 20, "protein": 2}]})
+        events = [self._chunk([{"index": 0, "delta": {"tool_calls": [{
+            "index": 0, "id": "call_1", "type": "function",
+            "function": {"name": "record_meal", "arguments": arguments[i:i + 24]}}]}}])
+            for i in range(0, len(arguments), 24)]
+        events.append(self._chunk([], usage={"prompt_tokens": 80, "completion_tokens": 40, "total_tokens": 120}))
+        payload = "".join(f"data: {event}\n\n" for event in events + ["[DONE]"]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    @staticmethod
+    def _chunk(choices, usage=None):
+        return json.dumps({"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": 0,
+                           "model": "gpt-3.5-turbo", "choices": choices, "usage": usage})
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    MockOpenAI.hits = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), MockOpenAI)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{httpd.server_address[1]}/v1")
+    monkeypatch.setenv("OPENAI_API_KEY_HW", "sk-test")
+    monkeypatch.setattr(openai_pool, "_client", None)  # a new client for the mock's URL
+    monkeypatch.setattr(openai_pool, "limiter", openai_pool.RateLimiter())
+    yield MockOpenAI.hits
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def run(meals):
+    async def burst():
+        results = await asyncio.gather(*(Nutrition_agent.stream_items(meal) for meal in meals))
+        await openai_pool.get_client().close()  # its connections belong to this loop
+        return results
+    return asyncio.run(burst())
+
+
+def test_identical_meals_share_one_request(server):
+    meals = ["1 apple"] * 50 + [f"{n} g rice" for n in range(50)]
+    results = run(meals)
+    assert [items[0]["item"] for items, _ in results] == meals
+    assert sorted(server) == sorted(set(meals))
+
+
+def test_limiter_paces_requests_across_event_loops(server, monkeypatch):
+    # 100 requests per second, starting from an empty bucket
+    limiter = openai_pool.RateLimiter(rpm=6000)
+    limiter._requests.level = 0
+    monkeypatch.setattr(openai_pool, "limiter", limiter)
+
+    started = time.perf_counter()
+    for burst in range(2):  # a new loop per run, as the runtime and the tests each start their own
+        monkeypatch.setattr(openai_pool, "_client", None)
+        run([f"{n} g pasta {burst}" for n in range(40)])
+    seconds = time.perf_counter() - started
+    print(f"80 distinct requests at 100/s against the mock: {80 / seconds:.0f} requests/s")
+    assert len(server) == 80
+    assert seconds >= 0.7
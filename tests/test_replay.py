@@ -0,0 +1,33 @@
+# The shipped sample recording, replayed through the real dispatchers of both
+# bots (python-telegram-bot, the handlers, storage) with the offline fakes.
+import json
+import os
+
+import pytest
+
+pytest.importorskip("telegram")
+pytest.importorskip("agents")
+
+import replay  # noqa: E402
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "data")
+
+
+@pytest.fixture(scope="module")
+def report():
+    records = replay.load_recording(os.path.join(DATA, "replay_session.jsonl"))
+    with open(os.path.join(DATA, "replay_completions.json"), encoding="utf-8") as f:
+        completions = json.load(f)
+    return replay.run(records, completions, users=3)
+
+
+def test_every_message_gets_a_reply(report):
+    assert report["replies_missed"] == 0
+    # At least one Telegram call per update (a coalesced burst gets one reply for all of it)
+    replies_expected = sum(handler["count"] for handler in report["handlers"].values())
+    assert report["calls_per_message"]["telegram"] * report["messages"] >= replies_expected
+
+
+def test_every_recorded_handler_is_measured(report):
+    assert {"fitness:message", "fitness:burst", "nutrition:message", "nutrition:/summary"} <= set(report["handlers"])
+    assert not report["unrecorded_items"]
@@ -0,0 +1,88 @@
+# /reset_day against fake worksheets that count API requests: one batchUpdate
+# per reset, all or nothing, and concurrent resets never hit each other's rows.
+import threading
+import time
+
+import pytest
+
+from daily_index import DailyIndex
+from fake_sheets import FakeSpreadsheet
+from sheet_writer import SheetWriter
+from storage import SheetsStorage
+
+DAY, OTHER_DAY = "2025-01-02", "2025-01-01"
+
+
+def make_storage():
+    backend = SheetsStorage(SheetWriter(journal_dir=None), DailyIndex(":memory:"), FakeSpreadsheet())
+    backend.register("Fitness", None, {"calories": 4}, chat_column=5, id_column=6)
+    return backend
+
+
+def log(backend, day, chat, calories):
+    backend.append("Fitness", [[day, "walking", "30", "light", str(calories), str(chat)]])
+
+
+def rows(backend):
+    return [row[:6] for row in backend._sheets["Fitness"]().rows[1:]]
+
+
+def test_reset_is_one_request_without_reading_the_sheet():
+    backend = make_storage()
+    for i in range(20):
+        log(backend, DAY, 1, 100)
+        log(backend, OTHER_DAY if i % 3 else DAY, 2, 50)
+    backend.writer.flush()
+    backend.totals("Fitness", DAY, 1)  # index synced
+    spreadsheet = backend._spreadsheet
+
+    before = spreadsheet.api_calls
+    assert backend.reset_day("Fitness", DAY, 1) == 20
+    assert spreadsheet.api_calls - before == 1
+    assert all(row[5] == "2" for row in rows(backend))
+    assert backend.totals("Fitness", DAY, 1)["calories"] == 0.0
+    assert backend.totals("Fitness", DAY, 2)["calories"] == 7 * 50.0
+
+
+def test_failed_reset_deletes_nothing():
+    backend = make_storage()
+    for _ in range(5):
+        log(backend, DAY, 1, 100)
+    backend.writer.flush()
+
+    def quota_exceeded(body):
+        raise ConnectionError("batchUpdate failed")
+
+    backend._spreadsheet.batch_update = quota_exceeded
+    with pytest.raises(ConnectionError):
+        backend.reset_day("Fitness", DAY, 1)
+    assert len(rows(backend)) == 5
+    assert backend.totals("Fitness", DAY, 1)["calories"] == 500.0
+
+
+def test_concurrent_resets_of_different_chats():
+    backend = make_storage()
+    chats = range(1, 9)
+    for _ in range(3):
+        for chat in chats:
+            log(backend, DAY, chat, 10)
+    backend.writer.flush()
+    backend.totals("Fitness", DAY, 1)
+
+    spreadsheet = backend._spreadsheet
+    batch_update = spreadsheet.batch_update
+
+    def slow_batch_update(body):
+        time.sleep(0.01)  # widen the window between looking up rows and deleting them
+        return batch_update(body)
+
+    spreadsheet.batch_update = slow_batch_update
+    resets = [threading.Thread(target=backend.reset_day, args=("Fitness", DAY, chat)) for chat in chats if chat % 2]
+    for thread in resets:
+        thread.start()
+    for thread in resets:
+        thread.join()
+
+    assert sorted(row[5] for row in rows(backend)) == sorted(str(chat) for chat in chats if not chat % 2 for _ in range(3))
+    for chat in chats:
+        assert backend.totals("Fitness", DAY, chat)["calories"] == (0.0 if chat % 2 else 30.0)
@@ -0,0 +1,30 @@
+import asyncio
+import time
+
+from async_runtime import AsyncRuntime, Coalescer
+
+
+def test_stop_hands_over_waiting_batches_and_finishes_runs():
+    runtime = AsyncRuntime()
+    handled = []
+
+    async def on_batch(chat_id, items):
+        await asyncio.sleep(0.2)
+        handled.append((chat_id, items))
+
+    incoming = Coalescer(runtime, on_batch, window=60, max_wait=60)
+    runtime.start()
+    incoming.add(1, "swimming")
+    incoming.add(1, "45 min")
+    incoming.add(2, "yoga")
+    runtime.stop(timeout=5)
+    assert sorted(handled) == [(1, ["swimming", "45 min"]), (2, ["yoga"])]
+
+
+def test_stop_gives_up_after_the_timeout():
+    runtime = AsyncRuntime()
+    runtime.start()
+    runtime.submit(1, lambda: asyncio.sleep(30))
+    started = time.perf_counter()
+    runtime.stop(timeout=0.2)
+    assert time.perf_counter() - started < 5
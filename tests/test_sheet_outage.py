@@ -0,0 +1,151 @@
+# Fault injection for the write path: Sheets goes down (and comes back) while
+# both bots keep logging as separate processes on one database and journal
+# directory. Nothing may be lost or appended twice, and logging must stay a
+# local write the whole time.
+import threading
+import time
+
+import pytest
+
+import storage
+from daily_index import DailyIndex
+from fake_sheets import FakeSpreadsheet
+from sheet_writer import SheetWriter
+from storage import LocalStorage, SheetsStorage
+
+ROWS_PER_BOT = 200
+SHEETS = {"Calories": ({"calories": 3}, 7, 8), "Fitness": ({"calories": 4}, 5, 6)}
+
+
+class Outage:
+    """Switch for the fake Sheets API: down, or answering but losing every other confirmation."""
+
+    def __init__(self):
+        self.down = False
+        self.flaky = False
+        self._calls = 0
+
+    def wrap(self, worksheet):
+        append_rows = worksheet.append_rows
+
+        def flaky_append_rows(values, **kwargs):
+            if self.down:
+                raise ConnectionError("Sheets is down")
+            response = append_rows(values, **kwargs)
+            self._calls += 1
+            if self.flaky and self._calls % 2:
+                raise TimeoutError("append landed, but the response was lost")
+            return response
+
+        worksheet.append_rows = flaky_append_rows
+        return worksheet
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(storage, "SYNC_RETRY_SECONDS", 0.01)
+    monkeypatch.setattr(storage, "MAX_SYNC_RETRY_SECONDS", 0.05)
+
+
+def start_bot(sheet, tmp_path, spreadsheet, outage):
+    """One bot process: its own connection and writer on the shared database and journal directory."""
+    writer = SheetWriter(journal_dir=str(tmp_path / "journal"), flush_interval=0.01)
+    mirror = SheetsStorage(writer, DailyIndex(str(tmp_path / f"index-{sheet}.db")))
+    local = LocalStorage(str(tmp_path / "bot_storage.db"), mirror)
+    metric, chat_column, id_column = SHEETS[sheet]
+    worksheet = outage.wrap(spreadsheet.worksheet(sheet))
+    local.register(sheet, lambda: worksheet, metric, chat_column=chat_column, id_column=id_column)
+    local.start()
+    return local
+
+
+def log_rows(local, sheet, count, latencies):
+    for i in range(count):
+        row = ["2025-01-01", "item", "", "10", "10", "1", "1", "42"] if sheet == "Calories" else \
+            ["2025-01-01", "walking", "30", "light", "10", "42"]
+        started = time.perf_counter()
+        local.append(sheet, [row])
+        latencies.append(time.perf_counter() - started)
+
+
+def test_two_processes_lose_nothing_through_an_outage(tmp_path):
+    spreadsheet, outage = FakeSpreadsheet(), Outage()
+    outage.down = True
+    bots = {sheet: start_bot(sheet, tmp_path, spreadsheet, outage) for sheet in SHEETS}
+
+    latencies = []
+    threads = [threading.Thread(target=log_rows, args=(bots[sheet], sheet, ROWS_PER_BOT // 2, latencies))
+               for sheet in SHEETS]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Summaries keep working from the local store
+    for sheet, local in bots.items():
+        assert local.totals(sheet, "2025-01-01", 42)["calories"] == 10 * (ROWS_PER_BOT // 2)
+
+    # Both processes restart in the middle of the outage
+    for local in bots.values():
+        local.stop()
+    bots = {sheet: start_bot(sheet, tmp_path, spreadsheet, outage) for sheet in SHEETS}
+    threads = [threading.Thread(target=log_rows, args=(bots[sheet], sheet, ROWS_PER_BOT // 2, latencies))
+               for sheet in SHEETS]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Sheets comes back, but drops half of the confirmations at first
+    outage.down, outage.flaky = False, True
+    for local in bots.values():
+        assert local.drain(10)
+    time.sleep(0.1)
+    outage.flaky = False
+    for local in bots.values():
+        local.stop()
+
+    for sheet, (_, _, id_column) in SHEETS.items():
+        rows = spreadsheet.worksheet(sheet).rows[1:]
+        ids = [row[id_column] for row in rows]
+        assert len(rows) == ROWS_PER_BOT, sheet
+        assert len(set(ids)) == ROWS_PER_BOT, sheet
+    # Logging never waited on Sheets
+    latencies.sort()
+    assert latencies[int(len(latencies) * 0.99)] < 0.05
+
+
+def test_reset_of_another_process_does_not_block_the_outbox(tmp_path):
+    spreadsheet, outage = FakeSpreadsheet(), Outage()
+    fitness = start_bot("Fitness", tmp_path, spreadsheet, outage)
+    nutrition = start_bot("Calories", tmp_path, spreadsheet, outage)
+    nutrition.append("Calories", [["2025-01-01", "apple", "", "50", "0", "1", "0", "42"]])
+    nutrition.reset_day("Calories", "2025-01-01", 42)
+    fitness.append("Fitness", [["2025-01-01", "walking", "30", "light", "120", "42"]])
+
+    assert fitness.drain(5)
+    assert nutrition.drain(5)
+    fitness.stop()
+    nutrition.stop()
+    assert [row[:6] for row in spreadsheet.worksheet("Fitness").rows[1:]] == \
+        [["2025-01-01", "walking", "30", "light", "120", "42"]]
+    assert spreadsheet.worksheet("Calories").rows[1:] == []
+
+
+def test_reset_fails_fast_while_sheets_is_down(monkeypatch):
+    class QuotaError(Exception):
+        response = type("Response", (), {"status_code": 429})()
+
+    def over_quota(values, **kwargs):
+        raise QuotaError()
+
+    monkeypatch.setattr("sheet_writer._api_error", lambda: QuotaError)
+    backend = SheetsStorage(SheetWriter(journal_dir=None), DailyIndex(":memory:"), FakeSpreadsheet())
+    backend.register("Fitness", None, {"calories": 4}, chat_column=5, id_column=6)
+    backend._sheets["Fitness"]().append_rows = over_quota
+    backend.append("Fitness", [["2025-01-01", "walking", "30", "light", "120", "42"]])
+
+    started = time.perf_counter()
+    with pytest.raises(RuntimeError):
+        backend.reset_day("Fitness", "2025-01-01", 42)
+    assert backend.totals("Fitness", "2025-01-01", 42)["calories"] == 120.0
+    assert time.perf_counter() - started < 0.5
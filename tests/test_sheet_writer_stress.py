@@ -0,0 +1,46 @@
+# Stress test of the write-behind queue: eight threads (the dispatcher
+# workers of both bots) log thousands of rows through the durable journal
+# while the background thread flushes them. Reports how fast a log returns
+# and how many Sheets API calls the whole replay cost.
+import threading
+import time
+
+from fake_sheets import FakeSpreadsheet
+from sheet_writer import SheetWriter
+
+THREADS = 8
+EVENTS = 4000
+SHEETS = ("Calories", "Fitness")
+BATCH = 20
+
+
+def test_thousands_of_logs_cost_one_append_per_batch(tmp_path):
+    spreadsheet = FakeSpreadsheet()
+    writer = SheetWriter(journal_dir=str(tmp_path / "journal"), batch_size=BATCH, flush_interval=60)
+    for sheet in SHEETS:
+        worksheet = spreadsheet.worksheet(sheet)
+        writer.register(sheet, lambda worksheet=worksheet: worksheet, id_column=2)
+    writer.start()
+
+    def bot_worker(worker):
+        for n in range(EVENTS // THREADS):
+            writer.enqueue(SHEETS[n % 2], ["2025-01-02", f"{worker}-{n}"])
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=bot_worker, args=(worker,)) for worker in range(THREADS)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    enqueued = time.perf_counter() - started
+    writer.stop()
+    flushed = time.perf_counter() - started
+
+    print(f"{EVENTS} logs from {THREADS} threads: {EVENTS / enqueued:.0f} logs/s into the journal, "
+          f"all in Sheets after {flushed:.2f}s with {spreadsheet.api_calls} API calls "
+          f"({EVENTS / spreadsheet.api_calls:.0f} rows per call)")
+    written = [row[1] for sheet in SHEETS for row in spreadsheet.worksheet(sheet).rows[1:]]
+    assert sorted(written) == sorted(f"{worker}-{n}" for worker in range(THREADS) for n in range(EVENTS // THREADS))
+    assert writer.pending_count() == 0
+    # Every flush but the last sends at least BATCH rows, spread over both sheets
+    assert spreadsheet.api_calls <= len(SHEETS) * (EVENTS // BATCH + 1)
@@ -0,0 +1,75 @@
+# Google Sheets round trips per operation, counted on fake worksheets: the
+# shared client authorizes and opens the spreadsheet once, and after that a
+# log is one append, a summary no request at all and a reset one batchUpdate.
+import time
+
+import pytest
+
+import sheets_client
+from daily_index import DailyIndex
+from fake_sheets import FakeSpreadsheet
+from sheet_writer import SheetWriter
+from storage import SheetsStorage
+
+OPERATIONS = 200
+DAY = "2025-01-02"
+
+
+class CountingGoogle:
+    """gspread.authorize / client.open over a FakeSpreadsheet, counting each as an API request."""
+
+    def __init__(self):
+        self.spreadsheet = FakeSpreadsheet()
+        self.spreadsheet.sheet1 = self.spreadsheet.worksheet("Sheet1")
+
+    def authorize(self, creds):
+        self.spreadsheet.api_calls += 1  # token exchange
+        return self
+
+    def open(self, title):
+        self.spreadsheet.api_calls += 2  # file lookup by name + spreadsheet metadata
+        return self.spreadsheet
+
+
+def test_client_is_authorized_and_opened_once(monkeypatch, tmp_path):
+    gspread = pytest.importorskip("gspread")
+    service_account = pytest.importorskip("oauth2client.service_account")
+    google = CountingGoogle()
+    monkeypatch.setattr(gspread, "authorize", google.authorize)
+    monkeypatch.setattr(service_account.ServiceAccountCredentials, "from_json_keyfile_name",
+                        lambda keyfile, scope: object())
+    monkeypatch.setattr(sheets_client, "_clients", {})
+    monkeypatch.setattr(sheets_client, "_worksheets", {})
+    keyfile = str(tmp_path / "key.json")
+
+    for _ in range(OPERATIONS):
+        sheets_client.get_worksheet(keyfile, "Calories_log").append_rows([[DAY, "apple"]])
+    calls = google.spreadsheet.api_calls
+    print(f"{OPERATIONS} logs: {calls / OPERATIONS:.3f} round trips each (4 when every log authorized and opened)")
+    assert calls == OPERATIONS + 3
+
+
+def test_round_trips_per_operation():
+    backend = SheetsStorage(SheetWriter(journal_dir=None), DailyIndex(":memory:"), FakeSpreadsheet())
+    backend.register("Calories", None, {"calories": 3}, chat_column=7, id_column=8)
+    spreadsheet = backend._spreadsheet
+    backend.totals("Calories", DAY, 1)  # first summary indexes the sheet once
+
+    calls = {}
+
+    def measure(name, operation):
+        before, started = spreadsheet.api_calls, time.perf_counter()
+        for chat in range(OPERATIONS):
+            operation(chat)
+        seconds = time.perf_counter() - started
+        calls[name] = (spreadsheet.api_calls - before) / OPERATIONS
+        print(f"{name}: {calls[name]:.2f} round trips, {seconds / OPERATIONS * 1e3:.2f} ms per operation")
+
+    def log(chat):
+        backend.append("Calories", [[DAY, "apple", "1", "95", "0.3", "25", "0.5", str(chat)]])
+        backend.writer.flush()
+
+    measure("log", log)
+    measure("summary", lambda chat: backend.totals("Calories", DAY, chat))
+    measure("reset", lambda chat: backend.reset_day("Calories", DAY, chat))
+    assert calls == {"log": 1.0, "summary": 0.0, "reset": 1.0}
@@ -0,0 +1,49 @@
+# Pending-workout stores: the SQLite row count stays right without a COUNT(*)
+# per merge, and a million chats passing through keep memory at the chat limit.
+import time
+import tracemalloc
+
+from met_catalog import Workout
+from state_store import MemoryStateStore, SQLiteStateStore
+
+CHATS = 1_000_000
+STEADY = 50_000
+
+
+def test_sqlite_count_follows_every_write(tmp_path):
+    path = str(tmp_path / "state.db")
+    store = SQLiteStateStore(path, max_chats=50)
+    for chat_id in range(80):
+        store.merge(chat_id, Workout("swimming", None, None))
+    store.merge(79, Workout(None, 45, "moderate"))  # completes: removed
+    store.hold(78, Workout("walking", 1000, "moderate"))
+    store.confirm(78)
+    store.clear(77)
+    store.hold(200, Workout("walking", 1000, "moderate"))
+    assert len(store) == store._conn.execute("SELECT COUNT(*) FROM pending_workouts").fetchone()[0] == 48
+    assert len(SQLiteStateStore(path, max_chats=50)) == 48
+
+    store.ttl = 0
+    time.sleep(0.01)
+    store.merge(300, Workout("yoga", None, None))  # everything else has expired
+    assert len(store) == 1
+
+
+def test_a_million_chats_stay_within_the_limit():
+    store = MemoryStateStore(max_chats=10_000)
+    started = time.perf_counter()
+    for chat_id in range(CHATS - STEADY):
+        store.merge(chat_id, Workout("swimming", None, None))
+    seconds = time.perf_counter() - started
+
+    # At the limit every new chat evicts one: of everything the last chats
+    # allocated, only the entries still held (max_chats of them) remain
+    tracemalloc.start()
+    for chat_id in range(CHATS - STEADY, CHATS):
+        store.merge(chat_id, Workout("swimming", None, None))
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{CHATS} chats, limit {store.max_chats}: {seconds / (CHATS - STEADY) * 1e6:.1f} us per merge, "
+          f"{held / store.max_chats:.0f} bytes held per chat")
+    assert len(store) == store.max_chats
+    assert held < 300 * store.max_chats
@@ -0,0 +1,116 @@
+# Every backend answers the same calls the same way: logging, totals,
+# per-day sums, resets and rebuilds. LocalStorage runs alone and with a
+# mirror on fake worksheets, whose rows are checked too.
+import pytest
+
+from daily_index import DailyIndex
+from fake_sheets import FakeSpreadsheet
+from sheet_writer import SheetWriter
+from storage import LocalStorage, SheetsStorage
+
+DAY, OTHER_DAY = "2025-01-02", "2025-01-01"
+
+
+def fake_sheets_storage(spreadsheet=None):
+    return SheetsStorage(SheetWriter(journal_dir=None), DailyIndex(":memory:"), spreadsheet or FakeSpreadsheet())
+
+
+def register(backend):
+    backend.register("Calories", None, {"calories": 3, "protein": 6}, chat_column=7, id_column=8)
+    return backend
+
+
+@pytest.fixture(params=["sheets", "local", "local+mirror"])
+def backend(request, tmp_path):
+    if request.param == "sheets":
+        backend = fake_sheets_storage()
+    else:
+        mirror = fake_sheets_storage() if request.param == "local+mirror" else None
+        backend = LocalStorage(str(tmp_path / "store.db"), mirror=mirror)
+    register(backend)
+    backend.start()
+    yield backend
+    backend.stop()
+
+
+def log(backend, day, chat, calories, protein=0):
+    backend.append("Calories", [[day, "apple", "1", str(calories), "0", "0", str(protein), str(chat)]])
+
+
+def sheet_rows(backend):
+    sheets = backend if isinstance(backend, SheetsStorage) else backend.mirror
+    if isinstance(backend, LocalStorage):
+        assert backend.drain(5)
+    sheets.writer.flush()
+    return [row[:8] for row in sheets._sheets["Calories"]().rows[1:]]
+
+
+def test_totals(backend):
+    log(backend, DAY, 1, 100, 5)
+    log(backend, DAY, 1, 50)
+    log(backend, DAY, 2, 70)
+    assert backend.totals("Calories", DAY, 1) == {"calories": 150.0, "protein": 5.0}
+    assert backend.totals("Calories", DAY, 3) == {"calories": 0.0, "protein": 0.0}
+
+
+def test_daily_totals(backend):
+    log(backend, OTHER_DAY, 1, 10)
+    log(backend, DAY, 1, 20)
+    log(backend, "2025-01-03", 1, 40)
+    assert backend.daily_totals("Calories", 1, OTHER_DAY, DAY) == {
+        OTHER_DAY: {"calories": 10.0, "protein": 0.0},
+        DAY: {"calories": 20.0, "protein": 0.0},
+    }
+
+
+def test_reset_day_only_removes_that_chat_and_day(backend):
+    log(backend, DAY, 1, 100)
+    log(backend, DAY, 1, 100)
+    log(backend, OTHER_DAY, 1, 30)
+    log(backend, DAY, 2, 70)
+    assert backend.reset_day("Calories", DAY, 1) == 2
+    assert backend.totals("Calories", DAY, 1)["calories"] == 0.0
+    assert backend.totals("Calories", OTHER_DAY, 1)["calories"] == 30.0
+    assert backend.totals("Calories", DAY, 2)["calories"] == 70.0
+    if isinstance(backend, SheetsStorage) or backend.mirror is not None:
+        assert sorted(row[0] + "/" + row[7] for row in sheet_rows(backend)) == [OTHER_DAY + "/1", DAY + "/2"]
+
+
+def test_rebuild_keeps_totals(backend):
+    for calories in (10, 20, 30):
+        log(backend, DAY, 1, calories)
+    assert backend.rebuild("Calories") == 3
+    assert backend.totals("Calories", DAY, 1)["calories"] == 60.0
+
+
+def test_first_local_start_imports_the_sheets_history(tmp_path):
+    spreadsheet = FakeSpreadsheet()
+    old = register(fake_sheets_storage(spreadsheet))
+    log(old, OTHER_DAY, 1, 400)
+    log(old, DAY, 1, 300)
+    log(old, DAY, 2, 200)
+    old.writer.flush()
+
+    store = register(LocalStorage(str(tmp_path / "store.db"), mirror=fake_sheets_storage(spreadsheet)))
+    # Logging wakes the sync thread, so these may land before or after the
+    # import: either way the new row is kept and the reset day stays empty
+    log(store, DAY, 1, 50)
+    store.reset_day("Calories", DAY, 2)
+    store.start()
+    try:
+        assert store.drain(5)
+        assert store.totals("Calories", OTHER_DAY, 1)["calories"] == 400.0
+        assert store.totals("Calories", DAY, 1)["calories"] == 350.0
+        assert store.totals("Calories", DAY, 2)["calories"] == 0.0
+        assert len(sheet_rows(store)) == 3
+    finally:
+        store.stop()
+
+    # Only once: a second start doesn't import the same rows again
+    again = register(LocalStorage(str(tmp_path / "store.db"), mirror=fake_sheets_storage(spreadsheet)))
+    again.start()
+    try:
+        assert again.drain(5)
+        assert again.totals("Calories", DAY, 1)["calories"] == 350.0
+    finally:
+        again.stop()
@@ -0,0 +1,90 @@
+import io
+import json
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("telegram")
+
+from webhook_server import WebhookServer  # noqa: E402
+
+
+class Dispatcher:
+    def __init__(self):
+        self.seen = []
+        self._lock = threading.Lock()
+
+    def process_update(self, update):
+        time.sleep(random.random() / 1000)  # workers finish at different speeds
+        with self._lock:
+            self.seen.append((update.effective_chat.id, int(update.message.text)))
+
+
+def post(server, data, secret="s3cret"):
+    body = json.dumps(data).encode()
+    headers = {"Content-Length": str(len(body)), "X-Telegram-Bot-Api-Secret-Token": secret}
+    return server.ingest("/fitness", headers, io.BytesIO(body))
+
+
+def message(update_id, chat_id, text):
+    return {"update_id": update_id, "message": {
+        "message_id": update_id, "date": 0, "text": text,
+        "chat": {"id": chat_id, "type": "private"}, "from": {"id": chat_id, "is_bot": False, "first_name": "u"},
+    }}
+
+
+def test_messages_of_one_chat_stay_in_order():
+    dispatcher = Dispatcher()
+    server = WebhookServer({"fitness": SimpleNamespace(bot=None, dispatcher=dispatcher)},
+                           secret="s3cret", port=0, workers=4)
+    server.start()
+    try:
+        update_id = 0
+        for n in range(50):
+            for chat_id in range(1, 9):
+                update_id += 1
+                assert post(server, message(update_id, chat_id, str(n))) == 200
+        for updates in server.queues:
+            updates.join()
+    finally:
+        server.stop()
+    for chat_id in range(1, 9):
+        assert [n for chat, n in dispatcher.seen if chat == chat_id] == list(range(50))
+
+
+def test_wrong_secret_is_rejected():
+    server = WebhookServer({"fitness": SimpleNamespace(bot=None, dispatcher=Dispatcher())}, secret="s3cret", port=0)
+    try:
+        assert post(server, message(1, 1, "1"), secret="guess") == 403
+        assert server.queue_depth() == 0
+    finally:
+        server._httpd.server_close()
+
+
+def test_set_webhooks_refuses_without_secret():
+    bot = SimpleNamespace(set_webhook=lambda **kwargs: pytest.fail("webhook registered without a secret"))
+    server = WebhookServer({"fitness": SimpleNamespace(bot=bot, dispatcher=Dispatcher())}, secret="", port=0)
+    try:
+        with pytest.raises(RuntimeError):
+            server.set_webhooks("https://example.org")
+    finally:
+        server._httpd.server_close()
+
+
+@pytest.mark.parametrize("listen", ["0.0.0.0", "::"])
+def test_public_bind_needs_a_secret(listen):
+    with pytest.raises(RuntimeError):
+        WebhookServer({"fitness": SimpleNamespace(bot=None, dispatcher=Dispatcher())}, secret="", listen=listen, port=0)
+
+
+def test_loopback_without_secret_still_checks_the_header():
+    server = WebhookServer({"fitness": SimpleNamespace(bot=None, dispatcher=Dispatcher())}, secret="", port=0)
+    try:
+        assert server._httpd.server_address[0] == "127.0.0.1"
+        assert post(server, message(1, 1, "1"), secret="anything") == 403
+        assert post(server, message(2, 1, "1"), secret="") == 200
+    finally:
+        server._httpd.server_close()